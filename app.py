@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-from fuzzywuzzy import fuzz, process
 from openpyxl import load_workbook
 from openpyxl.styles import Font
 from openpyxl.utils.dataframe import dataframe_to_rows
@@ -8,10 +7,33 @@ import time
 import os
 from datetime import datetime
 import io
-import tempfile
+import math
+import shutil
+import glob
 import sys
 from components.analytics_dashboard import show_analytics_widget, show_detailed_analytics, track_page_visit, track_feature_usage
 from streamlit_option_menu import option_menu
+from utils.pipeline_state import PIPELINE_STAGES, PipelineManifest
+from utils.pipeline import ReconciliationPipeline
+from utils.matching import (build_candidates, assign_matches, suggest_alternatives, engine_scorer,
+                            scorers_for, MATCH_ENGINES, DEFAULT_ENGINE)
+from utils.scorers import SCORERS, DEFAULT_SCORER, get_scorer
+from utils.match_table import (build_match_table, high_score_mask, set_confirmations,
+                               merge_uploaded_confirmations, confirmation_counts,
+                               export_match_sheet, match_table_to_excel, apply_suggestion,
+                               HIGH_SCORE_CUTOFF)
+from utils.schema import get_column, enforce_schema
+from utils.reconciliation import clean_invoice_frame, reconcile_combined, DEFAULT_TOLERANCE
+from utils.multi_period import load_gstr_periods, reconcile_periods, DEFAULT_PARTITIONS
+from utils import out_of_core
+from utils import pivot
+from utils.result_cache import result_cache, cache_key
+from utils.upload_store import upload_store, UploadQuotaExceeded
+from utils.analytics import analytics_manager
+from utils.jobs import job_runner, DONE, FAILED
+from utils.admission import admission, block_cells, workbook_memory, frames_memory, JOB_MEMORY_BUDGET
+from utils.excel_export import (EXPORT_BACKENDS, DEFAULT_BACKEND, save_sheets, replace_sheets, copy_workbook,
+                                save_workbook, snapshot_workbook)
 # Serve ads.txt manually
 if st.query_params.get("ads") == "true":
     ads_path = "ads.txt"
@@ -631,23 +653,12 @@ def create_animated_progress_bar():
     return progress_bar, status_text
 
 # --- Utility Functions (keeping original functionality) ---
-def get_column(df, colname):
-    """FIXED: Handle integer column names properly"""
-    for col in df.columns:
-        col_str = str(col).strip().lower()
-        colname_str = str(colname).strip().lower()
-        if col_str == colname_str:
-            return col
-    raise KeyError(f"Column '{colname}' not found. Available columns: {df.columns.tolist()}")
-
 def get_raw_unique_names(series):
     return pd.Series(series).dropna().drop_duplicates().tolist()
 
 def fix_tally_columns(df_tally):
     """Fix Tally sheet column structure when headers are wrong"""
-    expected_cols = ['GSTIN of supplier', 'Supplier', 'Invoice number', 'Invoice Date',
-                    'Invoice Value', 'Rate', 'Taxable Value', 'Integrated Tax',
-                    'Central Tax', 'State/UT tax', 'Cess']
+    expected_cols = TEMPLATE_COLUMNS
     
     if (len(df_tally.columns) >= 2 and
         str(df_tally.columns[0]).startswith('Unnamed') and
@@ -663,10 +674,16 @@ def fix_tally_columns(df_tally):
     
     return df_tally
 
-def create_default_format():
-    """Create default Excel format for users"""
+# --- Template Schema ---
+# Column layout of the 'Tally' and 'GSTR-2A' sheets; the cached template
+# workbook is rebuilt only when this schema or the sample data changes
+TEMPLATE_COLUMNS = ('GSTIN of supplier', 'Supplier', 'Invoice number', 'Invoice Date',
+                    'Invoice Value', 'Rate', 'Taxable Value', 'Integrated Tax',
+                    'Central Tax', 'State/UT tax', 'Cess')
+
+TEMPLATE_SAMPLE_DATA = {
     # Sample data for Tally sheet
-    tally_data = {
+    'Tally': {
         'GSTIN of supplier': ['27AABCU9603R1ZX', '27AABCU9603R1ZY', ''],
         'Supplier': ['ABC Private Ltd', 'XYZ Industries', 'GHI Enterprises'], 
         'Invoice number': ['INV-0001', 'INV-0002', 'INV-0003'],
@@ -678,10 +695,9 @@ def create_default_format():
         'Central Tax': [9000, 0, 6000],
         'State/UT tax': [9000, 0, 6000],
         'Cess': [0, 0, 0]
-    }
-    
+    },
     # Sample data for GSTR-2A sheet
-    gstr_data = {
+    'GSTR-2A': {
         'GSTIN of supplier': ['27AABCU9603R1ZX', '27AABCU9603R1ZZ', ''],
         'Supplier': ['ABC Private Limited', 'DEF Corporation', 'GHI Enterprises'],
         'Invoice number': ['INV-0001', 'INV-0004', 'INV-0003'],
@@ -694,21 +710,24 @@ def create_default_format():
         'State/UT tax': [9000, 4800, 6000],
         'Cess': [0, 0, 0]
     }
-    
-    df_tally = pd.DataFrame(tally_data)
-    df_gstr = pd.DataFrame(gstr_data)
-    
+}
+
+def create_default_format():
+    """Create default Excel format for users"""
+    return build_template_workbook(TEMPLATE_COLUMNS, TEMPLATE_SAMPLE_DATA)
+
+@st.cache_data(show_spinner=False)
+def build_template_workbook(columns, sample_data):
+    """Build the template workbook bytes once per process for a given schema"""
     # Create Excel in memory
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Add empty row for header space
-        empty_row = pd.DataFrame([[''] * len(df_tally.columns)], columns=df_tally.columns)
-        empty_row.to_excel(writer, sheet_name='Tally', index=False, header=False)
-        df_tally.to_excel(writer, sheet_name='Tally', index=False, startrow=1)
-        
-        empty_row_gstr = pd.DataFrame([[''] * len(df_gstr.columns)], columns=df_gstr.columns)
-        empty_row_gstr.to_excel(writer, sheet_name='GSTR-2A', index=False, header=False)
-        df_gstr.to_excel(writer, sheet_name='GSTR-2A', index=False, startrow=1)
+        for sheet_name, data in sample_data.items():
+            df_sheet = pd.DataFrame(data, columns=list(columns))
+            # Add empty row for header space
+            empty_row = pd.DataFrame([[''] * len(df_sheet.columns)], columns=df_sheet.columns)
+            empty_row.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+            df_sheet.to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
     
     output.seek(0)
     return output.getvalue()
@@ -770,55 +789,52 @@ def show_help_instructions():
     """, unsafe_allow_html=True)
 
 # --- Enhanced Fuzzy Matching Logic ---
-def two_way_match(tally_list, gstr_list, threshold):
-    match_map, used_tally, used_gstr = {}, set(), set()
-    tally_upper = {name.upper(): name for name in tally_list}
-    gstr_upper = {name.upper(): name for name in gstr_list}
-    tally_keys, gstr_keys = list(tally_upper.keys()), list(gstr_upper.keys())
+def two_way_match(threshold, scorer_name=DEFAULT_SCORER, phonetic_prefilter=False, engine=DEFAULT_ENGINE):
+    candidates = get_match_candidates(scorer_name, phonetic_prefilter, engine)
+    return assign_matches(candidates, threshold)
+
+def read_supplier_names(workbook_path):
+    """Unique raw supplier names of the Tally and GSTR-2A sheets, and their total row count"""
+    df_tally = pd.read_excel(workbook_path, sheet_name='Tally', header=1)
+    df_gstr = pd.read_excel(workbook_path, sheet_name='GSTR-2A', header=1)
+    tally_parties = get_raw_unique_names(df_tally[get_column(df_tally, 'Supplier')])
+    gstr_parties = get_raw_unique_names(df_gstr[get_column(df_gstr, 'Supplier')])
+    return tally_parties, gstr_parties, len(df_tally) + len(df_gstr)
+
+def match_candidates_key(scorer_name=DEFAULT_SCORER, phonetic_prefilter=False, engine=DEFAULT_ENGINE):
+    """Key of the candidates scored for the current upload.
+
+    Stages never rewrite the Tally and GSTR-2A sheets, so the upload digest
+    identifies the supplier names without reading the workbook.
+    """
+    scorer = engine_scorer(get_scorer(scorer_name, phonetic_prefilter), engine)
+    upload = st.session_state.get('input_digest') or st.session_state.temp_file_path
+    return cache_key("match_candidates", upload, scorer.name, engine)
+
+def cached_match_candidates(candidates_key):
+    """The session's cached candidates entry for a key, if any"""
+    cached = st.session_state.get('match_candidates')
+    if cached is not None and cached['key'] == candidates_key:
+        return cached
+    return None
+
+def get_match_candidates(scorer_name=DEFAULT_SCORER, phonetic_prefilter=False, engine=DEFAULT_ENGINE):
+    """Score candidates once per upload; threshold changes reuse the cached scores without reading the workbook"""
+    candidates_key = match_candidates_key(scorer_name, phonetic_prefilter, engine)
+    cached = cached_match_candidates(candidates_key)
+    if cached is not None:
+        return cached['candidates']
     
-    total_steps = len(gstr_keys) + len(tally_keys)
+    tally_list, gstr_list, records = read_supplier_names(st.session_state.temp_file_path)
+    scorer = engine_scorer(get_scorer(scorer_name, phonetic_prefilter, block_cells()), engine)
     progress_bar, status_text = create_animated_progress_bar()
     
-    # GSTR to Tally matching
-    for i, gstr_name in enumerate(gstr_keys):
-        best_match, score = process.extractOne(gstr_name, tally_keys, scorer=fuzz.ratio)
-        gstr_real = gstr_upper[gstr_name]
-        
-        if best_match and score >= threshold and best_match not in used_tally:
-            tally_real = tally_upper[best_match]
-            match_map[(gstr_real, tally_real)] = (gstr_real, tally_real, score)
-            used_gstr.add(gstr_name)
-            used_tally.add(best_match)
-        else:
-            match_map[(gstr_real, '')] = (gstr_real, '', 0)
-            used_gstr.add(gstr_name)
-        
-        progress = (i + 1) / total_steps
-        progress_bar.progress(progress)
-        status_text.markdown(f'<div class="info-message">🔍 GSTR → Tally: {i+1}/{len(gstr_keys)}</div>', unsafe_allow_html=True)
-        time.sleep(0.01)
-    
-    # Tally to GSTR matching
-    for i, tally_name in enumerate(tally_keys):
-        if tally_name in used_tally:
-            continue
-            
-        best_match, score = process.extractOne(tally_name, gstr_keys, scorer=fuzz.ratio)
-        tally_real = tally_upper[tally_name]
-        
-        if best_match and score >= threshold and best_match not in used_gstr:
-            gstr_real = gstr_upper[best_match]
-            match_map[(gstr_real, tally_real)] = (gstr_real, tally_real, score)
-            used_tally.add(tally_name)
-            used_gstr.add(best_match)
-        else:
-            match_map[('', tally_real)] = ('', tally_real, 0)
-            used_tally.add(tally_name)
-        
-        progress = (len(gstr_keys) + i + 1) / total_steps
-        progress_bar.progress(progress)
-        status_text.markdown(f'<div class="info-message">🔍 Tally → GSTR: {i+1}/{len(tally_keys)}</div>', unsafe_allow_html=True)
-        time.sleep(0.01)
+    def report_progress(done, total):
+        progress_bar.progress(done / total)
+        status_text.markdown(f'<div class="info-message">🔍 GSTR ↔ Tally: {done}/{total}</div>', unsafe_allow_html=True)
+    
+    candidates = run_admitted(lambda: build_candidates(tally_list, gstr_list, engine, progress=report_progress,
+                                                       scorer=scorer, max_block_cells=block_cells()))
     
     # Complete progress
     progress_bar.progress(1.0)
@@ -827,16 +843,666 @@ def two_way_match(tally_list, gstr_list, threshold):
     progress_bar.empty()
     status_text.empty()
     
-    results = []
-    for gstr_name, tally_name, score in match_map.values():
-        # Set default confirmation based on match quality
-        if gstr_name and tally_name and score >= 80:
-            confirm = "Yes"
+    st.session_state.match_candidates = {"key": candidates_key, "candidates": candidates, "records": records}
+    return candidates
+
+# --- Admission Control ---
+def run_admitted(compute, memory=JOB_MEMORY_BUDGET):
+    """Run a CPU-heavy computation once the server-wide queue admits it, showing the queue position meanwhile"""
+    queue_status = st.empty()
+    
+    def show_position(position):
+        queue_status.markdown(f'<div class="info-message">⏳ Server busy: waiting in queue, position {position}</div>',
+                              unsafe_allow_html=True)
+    
+    try:
+        with admission.slot(memory, show_position):
+            queue_status.empty()
+            return compute()
+    finally:
+        queue_status.empty()
+
+def job_queue_wait(job):
+    """Queue callback for a background job: publish its position and honour cancellation"""
+    def wait(position):
+        job.check()
+        job.message = f"Waiting in queue, position {position}"
+    return wait
+
+# --- Background Jobs ---
+def start_background_job(stage_key, name, task, *args, context=None):
+    """Run a stage on the shared job runner; the session keeps the job id across reruns"""
+    jobs = st.session_state.setdefault('background_jobs', {})
+    if stage_key in jobs:
+        job_runner.cancel(jobs[stage_key])
+    jobs[stage_key] = job_runner.submit(name, task, *args, owner=st.session_state.get('user_id'), context=context)
+
+def collect_background_job(stage_key):
+    """Return this session's finished job for a stage once, so its result is applied in the script thread"""
+    jobs = st.session_state.get('background_jobs', {})
+    job_id = jobs.get(stage_key)
+    if job_id is None:
+        return None
+    job = job_runner.collect(job_id)
+    if job is not None or job_runner.get(job_id) is None:
+        jobs.pop(stage_key, None)
+    return job
+
+@st.fragment(run_every=1.0)
+def poll_background_job(stage_key):
+    """Progress and cancel button of a running job; reruns the app when it finishes"""
+    job_id = st.session_state.get('background_jobs', {}).get(stage_key)
+    job = job_runner.get(job_id) if job_id else None
+    if job is None:
+        return
+    if job.finished:
+        st.rerun()
+    st.progress(job.fraction, text=f"⏳ {job.name}: {job.message or job.status}")
+    if st.button("⏹️ Cancel", key=f"{stage_key}_job_cancel"):
+        job_runner.cancel(job_id)
+
+def show_background_job(stage_key):
+    """Poll a stage's background job while one is pending"""
+    if stage_key in st.session_state.get('background_jobs', {}):
+        poll_background_job(stage_key)
+
+def matching_job(job, workbook_path, candidates_key, scorer_name, phonetic_prefilter, engine):
+    """Background task: score match candidates between the workbook's supplier names"""
+    job.report(0, 1, "Reading supplier names")
+    tally_parties, gstr_parties, records = read_supplier_names(workbook_path)
+    
+    scorer = engine_scorer(get_scorer(scorer_name, phonetic_prefilter, block_cells()), engine)
+    with admission.slot(JOB_MEMORY_BUDGET, job_queue_wait(job)):
+        job.message = "Scoring GSTR ↔ Tally names"
+        candidates = build_candidates(tally_parties, gstr_parties, engine, progress=job.report, scorer=scorer,
+                                      max_block_cells=block_cells())
+    return {"key": candidates_key, "candidates": candidates, "records": records}
+
+def apply_matching_result(candidates, threshold):
+    """Build the review table from scored candidates"""
+    st.session_state.match_table = build_match_table(assign_matches(candidates, threshold))
+    st.session_state.matching_completed = True
+    reset_review_grid()
+
+# --- Final Report Payload ---
+def get_pipeline_manifest():
+    """Return the pipeline manifest for the current working workbook"""
+    workbook_path = st.session_state.get('temp_file_path')
+    if not workbook_path:
+        return None
+    manifest = st.session_state.get('pipeline_manifest')
+    if manifest is None or manifest.workbook_path != workbook_path:
+        manifest = PipelineManifest.load(workbook_path)
+        st.session_state.pipeline_manifest = manifest
+    return manifest
+
+def get_pipeline():
+    """Return the stage artifacts kept for incremental updates of the working workbook"""
+    workbook_path = st.session_state.get('temp_file_path')
+    pipeline = st.session_state.get('reconciliation_pipeline')
+    if pipeline is None or pipeline.workbook_path != workbook_path:
+        pipeline = ReconciliationPipeline(workbook_path)
+        st.session_state.reconciliation_pipeline = pipeline
+    return pipeline
+
+def record_stage_output(stage_key, outputs, inputs=None):
+    """Record a stage's output sheets so status and downloads see the new version"""
+    manifest = get_pipeline_manifest()
+    if manifest is not None:
+        manifest.record_stage(stage_key, outputs, inputs)
+
+def get_export_backend():
+    """Excel writer chosen for stage saves and the final report"""
+    return st.session_state.get('export_backend', DEFAULT_BACKEND)
+
+def save_stage_sheets(stage_key, sheets):
+    """Write a stage's result sheets into the working workbook and record them"""
+    manifest = get_pipeline_manifest()
+    if manifest is not None and manifest.has_outputs(stage_key, sheets):
+        # The workbook already holds these exact results; only the upstream versions they match move on
+        manifest.refresh_inputs(stage_key)
+        return
+    save_sheets(st.session_state.temp_file_path, sheets, get_export_backend())
+    record_stage_output(stage_key, sheets)
+
+def stage_cache_key(stage_key, params):
+    """Content address of a stage run: input file, replaced Tally, confirmations and parameters"""
+    input_digest = st.session_state.get('input_digest')
+    if not input_digest:
+        return None
+    manifest = get_pipeline_manifest()
+    _, _, tally_sheet_used = get_stage_sources()
+    return cache_key(
+        stage_key,
+        input_digest,
+        tally_sheet_used,
+        manifest.output_hash('name_replacement', 'Tally_Replaced'),
+        manifest.output_hash('matching', 'GSTR_Tally_Match'),
+        params
+    )
+
+def run_cached_stage(stage_key, params, compute):
+    """Return (results, cached), reusing results for unchanged inputs and parameters"""
+    memory = workbook_memory(st.session_state.temp_file_path)
+    
+    def admitted():
+        return run_admitted(compute, memory)
+    
+    key = stage_cache_key(stage_key, params)
+    if key is None:
+        return admitted(), False
+    return result_cache.get_or_compute(key, admitted)
+
+def read_file_bytes(path):
+    """Contents of a file, read inside a with block so the handle is closed"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def build_final_report(source_path, version, backend=DEFAULT_BACKEND):
+    """Report bytes for a pipeline version, built only when the download is requested"""
+    track_feature_usage("export_excel")
+    if backend == "streaming":
+        # One streamed pass with styled headers and amount formats, kept until the version changes
+        report_path = f"{source_path}.report_v{version}_{backend}.xlsx"
+        if not os.path.exists(report_path):
+            for stale_report in glob.glob(f"{glob.escape(source_path)}.report_v*.xlsx"):
+                os.remove(stale_report)
+            copy_workbook(source_path, report_path)
+        return read_file_bytes(report_path)
+    # The working workbook is the report; its bytes are cached until the version
+    # changes, and the file stamp guards against a workbook rewritten from the upload
+    stat = os.stat(source_path)
+    key = cache_key("final_report", source_path, version, backend, stat.st_mtime_ns, stat.st_size)
+    report, _ = result_cache.get_or_compute(key, lambda: read_file_bytes(source_path))
+    return report
+
+# --- Reconciliation Settings ---
+def show_precision_settings(stage_key):
+    """Arithmetic and tolerance options for a reconciliation stage; returns (fixed_point, tolerance)"""
+    col1, col2 = st.columns(2)
+    with col1:
+        fixed_point = st.checkbox(
+            "🔢 Exact paise arithmetic",
+            value=False,
+            key=f"{stage_key}_fixed_point",
+            help="Sum amounts and compute variances as whole paise, avoiding tiny floating-point variances"
+        )
+    with col2:
+        tolerance = st.number_input(
+            "Variance Tolerance (₹)",
+            min_value=0.0,
+            value=DEFAULT_TOLERANCE,
+            step=0.5,
+            key=f"{stage_key}_tolerance",
+            help="Variances up to this amount per tax head are flagged as a match"
+        )
+    return fixed_point, tolerance
+
+def read_stage_frames(workbook_path, tally_sheet_used):
+    """Read and normalize the Tally and GSTR-2A sheets of a workbook; returns (df_gstr, df_tally)"""
+    header = 0 if tally_sheet_used == 'Tally_Replaced' else 1
+    df_tally = pd.read_excel(workbook_path, sheet_name=tally_sheet_used, header=header)
+    df_gstr = pd.read_excel(workbook_path, sheet_name='GSTR-2A', header=1)
+    return enforce_schema(df_gstr), enforce_schema(fix_tally_columns(df_tally))
+
+def load_stage_frames():
+    """Load and normalize the Tally and GSTR-2A sheets once; returns (df_gstr, df_tally, tally_sheet_used)"""
+    _, _, tally_sheet_used = get_stage_sources()
+    df_gstr, df_tally = read_stage_frames(st.session_state.temp_file_path, tally_sheet_used)
+    return df_gstr, df_tally, tally_sheet_used
+
+def combined_reconciliation_job(job, snapshot_path, tally_sheet_used, fixed_point, tolerance):
+    """Background task: single-pass GST and invoice reconciliation of a workbook snapshot, removed when done"""
+    try:
+        with admission.slot(workbook_memory(snapshot_path), job_queue_wait(job)):
+            job.report(0, 2, "Loading Tally and GSTR-2A data")
+            df_gstr, df_tally = read_stage_frames(snapshot_path, tally_sheet_used)
+            job.report(1, 2, "Reconciling")
+            results = reconcile_combined(df_gstr, df_tally, tally_sheet_used, fixed_point, tolerance)
+            job.report(2, 2, "Done")
+        return results
+    finally:
+        remove_snapshot(snapshot_path)
+
+def remove_snapshot(snapshot_path):
+    """Delete a background job's workbook snapshot if it is still there"""
+    try:
+        os.remove(snapshot_path)
+    except FileNotFoundError:
+        pass
+
+def save_combined_results(results, inputs=None):
+    """Save single-pass results as the GST and invoice stages, unless already saved.
+
+    inputs are the upstream output hashes the results were computed from,
+    when they came from a snapshot taken earlier.
+    """
+    gst_sheets = {name: df for name, df in results.items() if name != 'Invoice_Recon'}
+    invoice_sheets = {'Invoice_Recon': results['Invoice_Recon']}
+    manifest = get_pipeline_manifest()
+    if not (manifest.has_outputs('gst_reconciliation', gst_sheets) and
+            manifest.has_outputs('invoice_reconciliation', invoice_sheets)):
+        save_sheets(st.session_state.temp_file_path, results, get_export_backend())
+        record_stage_output('gst_reconciliation', gst_sheets, inputs)
+        record_stage_output('invoice_reconciliation', invoice_sheets, inputs)
+    else:
+        manifest.refresh_inputs('gst_reconciliation', inputs)
+        manifest.refresh_inputs('invoice_reconciliation', inputs)
+    st.session_state.gst_reconciliation_done = True
+    st.session_state.invoice_reconciliation_done = True
+    st.session_state.all_processes_completed = True
+
+def show_combined_results(results, tally_sheet_used):
+    """Display the main single-pass result sheets"""
+    show_success_message(f"GST and invoice-wise reconciliation completed using {tally_sheet_used}!")
+    display_dataframe_with_title(results['GST_Input_Summary'], "📊 GST Input Summary",
+                               "Overall comparison between GSTR-2A and Tally data")
+    display_dataframe_with_title(results['T_vs_G-2A'], "📋 Detailed Comparison (T_vs_G-2A)",
+                               "Party-wise detailed variance analysis")
+    display_dataframe_with_title(results['Invoice_Recon'], "📋 Invoice-wise Reconciliation Results",
+                               "Detailed invoice-wise comparison with variances")
+
+def show_combined_reconciliation(fixed_point, tolerance):
+    """Run GST and invoice reconciliation together in a single pass"""
+    job = collect_background_job('combined_reconciliation')
+    if job is not None:
+        # A job cancelled before it started never removed its snapshot
+        remove_snapshot(job.context["snapshot"])
+        if job.status == DONE:
+            try:
+                if job.context["key"] is not None:
+                    result_cache.put(job.context["key"], job.result)
+                save_combined_results(job.result, job.context["inputs"])
+                show_combined_results(job.result, job.context["tally_sheet_used"])
+            except Exception as e:
+                show_error_message(f"Error saving combined reconciliation: {e}")
+        elif job.status == FAILED:
+            show_error_message(f"Error during combined reconciliation: {job.error}")
         else:
-            confirm = "No"
-        results.append([gstr_name, tally_name, score, confirm])
+            show_info_message("Combined reconciliation was cancelled")
     
-    return results
+    background = st.checkbox(
+        "🧵 Run in background",
+        key="combined_reconciliation_background",
+        help="Keep reviewing matches or switching tabs while the reconciliation runs"
+    )
+    if st.button("⚡ Run GST + Invoice Reconciliation (single pass)", use_container_width=True):
+        try:
+            start_time = time.time()
+            _, _, tally_sheet_used = get_stage_sources()
+            params = [fixed_point, tolerance]
+            
+            if background:
+                key = stage_cache_key('combined_reconciliation', params)
+                cached_results = result_cache.get(key) if key else None
+                if cached_results is None:
+                    # The job reads a snapshot taken together with the cache key and upstream hashes,
+                    # so saves made while it runs cannot mismatch its results and their key
+                    snapshot_path = snapshot_workbook(st.session_state.temp_file_path)
+                    context = {
+                        "key": key,
+                        "tally_sheet_used": tally_sheet_used,
+                        "snapshot": snapshot_path,
+                        "inputs": get_pipeline_manifest().input_hashes('gst_reconciliation')
+                    }
+                    start_background_job('combined_reconciliation', "GST + invoice reconciliation",
+                                         combined_reconciliation_job, snapshot_path,
+                                         tally_sheet_used, fixed_point, tolerance, context=context)
+                    show_info_message("Reconciliation started in the background; you can keep working meanwhile")
+                else:
+                    save_combined_results(cached_results)
+                    show_info_message("⚡ Inputs and settings unchanged; reusing the previous results")
+                    show_combined_results(cached_results, tally_sheet_used)
+            else:
+                with st.spinner("⚡ Loading both sheets once and reconciling..."):
+                    def compute_combined():
+                        df_gstr, df_tally, _ = load_stage_frames()
+                        return reconcile_combined(df_gstr, df_tally, tally_sheet_used, fixed_point, tolerance)
+                    
+                    results, cached = run_cached_stage('combined_reconciliation', params, compute_combined)
+                    save_combined_results(results)
+                
+                track_feature_usage("reconciliation", {"processing_time": time.time() - start_time})
+                if cached:
+                    show_info_message("⚡ Inputs and settings unchanged; reusing the previous results")
+                show_combined_results(results, tally_sheet_used)
+        except Exception as e:
+            show_error_message(f"Error during combined reconciliation: {e}")
+    
+    show_background_job('combined_reconciliation')
+
+def show_pivot_panel(fixed_point, tolerance):
+    """Reconcile GST input by rate, month and other key breakdowns"""
+    with st.expander("🧮 Rate-wise & multi-key breakdowns"):
+        show_info_message("Reconciles every tax head by the chosen keys, e.g. supplier × rate × month. "
+                          "All breakdowns are rolled up from one grouped table.")
+        dims = st.multiselect(
+            "Break down by",
+            list(pivot.DIMENSIONS),
+            default=pivot.DEFAULT_DIMENSIONS,
+            key="pivot_dimensions",
+            help="Place of Supply is used when both sheets carry a 'Place of supply' column"
+        )
+        mode = st.radio(
+            "Breakdowns",
+            list(pivot.GROUPING_MODES),
+            format_func=lambda key: pivot.GROUPING_MODES[key],
+            horizontal=True,
+            key="pivot_mode"
+        )
+        
+        if st.button("🧮 Run Breakdown Reconciliation", key="pivot_run", use_container_width=True):
+            try:
+                _, _, tally_sheet_used = get_stage_sources()
+                
+                def compute_views():
+                    df_gstr, df_tally, _ = load_stage_frames()
+                    df_gstr, df_tally = clean_invoice_frame(df_gstr), clean_invoice_frame(df_tally)
+                    available = pivot.available_dimensions(df_gstr, df_tally)
+                    used = [label for label in dims if label in available]
+                    return pivot.pivot_reconcile(df_gstr, df_tally, used, mode, fixed_point, tolerance), used
+                
+                (views, used), cached = run_cached_stage('pivot_reconciliation', [dims, mode, fixed_point, tolerance],
+                                                         compute_views)
+                missing = [label for label in dims if label not in used]
+                if missing:
+                    show_warning_message(f"Columns for {', '.join(missing)} are missing and were skipped")
+                if cached:
+                    show_info_message("⚡ Inputs and settings unchanged; reusing the previous results")
+                save_stage_sheets('pivot_reconciliation', views)
+                show_success_message(f"Breakdown reconciliation completed using {tally_sheet_used}!")
+                for name, df_view in views.items():
+                    display_dataframe_with_title(df_view, f"🧮 {name}", f"{len(df_view)} rows")
+            except Exception as e:
+                show_error_message(f"Error during breakdown reconciliation: {e}")
+
+# --- Incremental Pipeline Updates ---
+def load_match_results():
+    """Saved confirmations from the workbook, or the session backup"""
+    try:
+        return pd.read_excel(st.session_state.temp_file_path, sheet_name='GSTR_Tally_Match')
+    except Exception:
+        return st.session_state.get('saved_match_results')
+
+def stage_settings(stage_key):
+    """Precision settings last chosen for a stage; returns (fixed_point, tolerance)"""
+    return (st.session_state.get(f"{stage_key}_fixed_point", False),
+            st.session_state.get(f"{stage_key}_tolerance", DEFAULT_TOLERANCE))
+
+def update_stale_stages():
+    """Recompute only the stages downstream of a change, incrementally where artifacts allow.
+
+    A changed confirmation set is applied as a diff: only the Tally rows
+    whose names change are rewritten, and only the parties and GSTINs they
+    touch are regrouped. Stages without usable artifacts are rerun in full.
+    Returns {stage_key: how it was updated}.
+    """
+    manifest = get_pipeline_manifest()
+    pipeline = get_pipeline()
+    stale = manifest.stale_stages()
+    updates, sheets, modes = {}, {}, {}
+    diff = None
+    
+    if 'name_replacement' in stale:
+        df_matches = load_match_results()
+        if df_matches is None or len(df_matches) == 0:
+            raise ValueError("No saved match results found")
+        diff = pipeline.update_names(manifest, df_matches)
+        if diff is None:
+            df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally', header=1)
+            df_new, _ = pipeline.replace_names(df_tally, df_matches)
+            modes['name_replacement'] = "full"
+        else:
+            df_new = diff[0]
+            modes['name_replacement'] = f"incremental ({int(diff[1].sum())} rows renamed)"
+        updates['name_replacement'] = {'Tally_Replaced': df_new}
+    
+    frames = None
+    for stage_key in ('gst_reconciliation', 'invoice_reconciliation'):
+        if stage_key not in stale:
+            continue
+        result = None
+        if diff is not None:
+            update = pipeline.update_gst if stage_key == 'gst_reconciliation' else pipeline.update_invoices
+            result = update(manifest, diff[1], diff[2])
+        if result is not None:
+            modes[stage_key] = "incremental"
+        else:
+            if frames is None:
+                if 'name_replacement' in updates:
+                    df_tally = enforce_schema(fix_tally_columns(updates['name_replacement']['Tally_Replaced'].copy()))
+                    df_gstr = enforce_schema(pd.read_excel(st.session_state.temp_file_path, sheet_name='GSTR-2A', header=1))
+                    frames = (df_gstr, df_tally, 'Tally_Replaced')
+                else:
+                    frames = load_stage_frames()
+            df_gstr, df_tally, tally_sheet_used = frames
+            fixed_point, tolerance = stage_settings(stage_key)
+            if stage_key == 'gst_reconciliation':
+                result = pipeline.reconcile_gst(df_gstr, df_tally, tally_sheet_used, fixed_point, tolerance)
+            else:
+                result = pipeline.reconcile_invoices(df_gstr.copy(), df_tally.copy(), tally_sheet_used,
+                                                     fixed_point, tolerance)
+            modes[stage_key] = "full"
+        updates[stage_key] = result if stage_key == 'gst_reconciliation' else {'Invoice_Recon': result}
+    
+    # One workbook write for every updated sheet, then record the stages in pipeline order
+    for outputs in updates.values():
+        sheets.update(outputs)
+    if sheets:
+        save_sheets(st.session_state.temp_file_path, sheets, get_export_backend())
+        for stage_key, outputs in updates.items():
+            record_stage_output(stage_key, outputs)
+    return modes
+
+def show_stale_stages_panel(manifest):
+    """Flag stages computed from outdated inputs and offer to update only those"""
+    modes = st.session_state.pop('stale_update_modes', None)
+    if modes:
+        show_success_message("Updated " + ", ".join(f"{key} ({mode})" for key, mode in modes.items()))
+    stale = manifest.stale_stages()
+    if not stale:
+        return
+    names = [stage["name"] for stage in PIPELINE_STAGES if stage["key"] in stale]
+    show_warning_message(f"Out of date after upstream changes: {', '.join(names)}")
+    if st.button("🔄 Update Downstream Stages", key="update_stale_stages", use_container_width=True):
+        try:
+            with st.spinner("🔄 Updating stale stages..."):
+                st.session_state.stale_update_modes = run_admitted(
+                    update_stale_stages, workbook_memory(st.session_state.temp_file_path))
+        except Exception as e:
+            show_error_message(f"Error updating stages: {e}")
+            return
+        # Redraw the status cards from the updated manifest
+        st.rerun()
+
+# --- Out-of-Core Reconciliation ---
+def get_stage_sources():
+    """Workbook sources (path, sheet, header row) of the Tally and GSTR-2A inputs"""
+    path = st.session_state.temp_file_path
+    if 'Tally_Replaced' in get_pipeline_manifest().sheets:
+        return (path, 'Tally_Replaced', 0), (path, 'GSTR-2A', 1), 'Tally_Replaced'
+    return (path, 'Tally', 1), (path, 'GSTR-2A', 1), 'Tally'
+
+def show_out_of_core_panel(stage_key):
+    """Run a reconciliation stage with bounded memory for very large workbooks"""
+    with st.expander("💾 Large files: out-of-core mode"):
+        show_info_message("Streams both sheets from disk, spills them in GSTIN partitions and reconciles "
+                          "one partition at a time, so memory stays bounded by the partition size. "
+                          "Results are written to a separate workbook.")
+        partitions = st.number_input(
+            "Partitions",
+            min_value=1,
+            max_value=1024,
+            value=out_of_core.DEFAULT_PARTITIONS,
+            key=f"{stage_key}_out_of_core_partitions",
+            help="More partitions use less memory per step"
+        )
+        
+        if st.button("💾 Run Out-of-Core", key=f"{stage_key}_out_of_core_run", use_container_width=True):
+            try:
+                start_time = time.time()
+                tally_source, gstr_source, tally_sheet_used = get_stage_sources()
+                output_path = f"{st.session_state.temp_file_path}.{stage_key}.xlsx"
+                progress_bar, status_text = create_animated_progress_bar()
+                
+                def report_progress(done, total):
+                    progress_bar.progress(done / total)
+                    status_text.markdown(f'<div class="info-message">🧮 Partition {done}/{total}</div>', unsafe_allow_html=True)
+                
+                status_text.markdown('<div class="info-message">📖 Streaming and spilling sheets...</div>', unsafe_allow_html=True)
+                # Same precision settings as the in-memory run on this tab
+                fixed_point, tolerance = stage_settings(stage_key)
+                if stage_key == 'gst_reconciliation':
+                    counts = run_admitted(lambda: out_of_core.reconcile_gst_out_of_core(
+                        tally_source, gstr_source, output_path, tally_sheet_used,
+                        int(partitions), prepare_tally=fix_tally_columns, progress=report_progress,
+                        fixed_point=fixed_point, tolerance=tolerance
+                    ))
+                else:
+                    rows = run_admitted(lambda: out_of_core.reconcile_invoices_out_of_core(
+                        tally_source, gstr_source, output_path,
+                        int(partitions), prepare_tally=fix_tally_columns, progress=report_progress,
+                        fixed_point=fixed_point, tolerance=tolerance
+                    ))
+                    counts = {'Invoice_Recon': rows}
+                progress_bar.empty()
+                status_text.empty()
+                
+                st.session_state[f"{stage_key}_out_of_core"] = {"path": output_path, "counts": counts}
+                track_feature_usage("reconciliation", {"processing_time": time.time() - start_time})
+                show_success_message(f"Out-of-core reconciliation completed using {tally_sheet_used}!")
+            except Exception as e:
+                show_error_message(f"Error during out-of-core reconciliation: {e}")
+        
+        result = st.session_state.get(f"{stage_key}_out_of_core")
+        if result and os.path.exists(result["path"]):
+            st.dataframe(pd.DataFrame({'Sheet': list(result["counts"]), 'Rows': list(result["counts"].values())}),
+                         hide_index=True)
+            result_path = result["path"]
+            st.download_button(
+                label="📥 Download Out-of-Core Results",
+                data=lambda: read_file_bytes(result_path),
+                file_name=f"{stage_key}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"{stage_key}_out_of_core_download",
+                use_container_width=True
+            )
+
+# --- Match Review Grid ---
+REVIEW_PAGE_SIZES = [50, 100, 250, 500]
+
+# Score bands offered as filters in the review grid
+SCORE_BANDS = {
+    "All": lambda df: df['Score'] >= 0,
+    "High (≥ 80%)": lambda df: high_score_mask(df),
+    "Medium (50-79%)": lambda df: (df['Score'] >= 50) & (df['Score'] < 80),
+    "Low (< 50%)": lambda df: (df['Score'] < 50) & (df['GSTR-2A Party'] != '') & (df['Tally Party'] != ''),
+    "Unmatched": lambda df: (df['GSTR-2A Party'] == '') | (df['Tally Party'] == '')
+}
+
+REVIEW_SORT_OPTIONS = {
+    "Original order": None,
+    "Score (high → low)": (['Score'], False),
+    "Score (low → high)": (['Score'], True),
+    "GSTR-2A Party": (['GSTR-2A Party'], True),
+    "Tally Party": (['Tally Party'], True)
+}
+
+def reset_review_grid():
+    """Discard pending grid edits after confirmations are changed in bulk"""
+    st.session_state.review_grid_version = st.session_state.get('review_grid_version', 0) + 1
+
+def show_confirmation_grid():
+    """Render one page of match results as an editable grid and apply edits as a diff"""
+    df_review = st.session_state.match_table
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        band = st.selectbox("Score band", list(SCORE_BANDS), key="review_band")
+    with col2:
+        sort_option = st.selectbox("Sort by", list(REVIEW_SORT_OPTIONS), key="review_sort")
+    with col3:
+        page_size = st.selectbox("Rows per page", REVIEW_PAGE_SIZES, key="review_page_size")
+    
+    df_view = df_review[SCORE_BANDS[band](df_review)]
+    if REVIEW_SORT_OPTIONS[sort_option]:
+        sort_cols, ascending = REVIEW_SORT_OPTIONS[sort_option]
+        df_view = df_view.sort_values(by=sort_cols, ascending=ascending, kind='stable')
+    
+    total_pages = max(1, math.ceil(len(df_view) / page_size))
+    if st.session_state.get('review_page', 1) > total_pages:
+        st.session_state.review_page = total_pages
+    page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, step=1, key="review_page")
+    df_page = df_view.iloc[(page - 1) * page_size: page * page_size]
+    
+    st.caption(f"Showing {len(df_page)} of {len(df_view)} filtered matches ({len(df_review)} total)")
+    
+    # Alternatives come from the cached candidates, computed for the visible page only
+    candidates = (st.session_state.get('match_candidates') or {}).get('candidates')
+    df_grid = df_page[['GSTR-2A Party', 'Tally Party', 'Score', 'Manual Confirmation']].copy()
+    page_suggestions = {}
+    if candidates is not None:
+        for i, gstr_name, tally_name in df_page[['GSTR-2A Party', 'Tally Party']].itertuples():
+            page_suggestions[i] = suggest_alternatives(candidates, gstr_name, tally_name)
+        df_grid['Alternatives'] = [
+            [f"{name} ({score}%)" for name, score in page_suggestions[i]] for i in df_grid.index
+        ]
+    
+    edited = st.data_editor(
+        df_grid,
+        column_config={
+            "Score": st.column_config.NumberColumn("Score", format="%d%%"),
+            "Manual Confirmation": st.column_config.SelectboxColumn(
+                "Confirmation", options=["Yes", "No"], required=True
+            ),
+            "Alternatives": st.column_config.ListColumn("Alternatives")
+        },
+        disabled=['GSTR-2A Party', 'Tally Party', 'Score', 'Alternatives'],
+        hide_index=True,
+        use_container_width=True,
+        key=f"review_grid_{st.session_state.get('review_grid_version', 0)}_{band}_{sort_option}_{page_size}_{page}"
+    )
+    
+    # Apply only the rows whose confirmation changed on this page
+    changed = edited['Manual Confirmation'].astype(str) != df_page['Manual Confirmation'].astype(str)
+    if changed.any():
+        df_review.loc[changed[changed].index, 'Manual Confirmation'] = edited.loc[changed, 'Manual Confirmation']
+    
+    if page_suggestions:
+        show_alternative_picker(df_page, page_suggestions)
+
+def show_alternative_picker(df_page, page_suggestions):
+    """Let reviewers pair a name on the current page with one of its suggestions"""
+    rows_with_suggestions = [i for i in df_page.index if page_suggestions[i]]
+    if not rows_with_suggestions:
+        return
+    
+    with st.expander("🔎 Pick an Alternative Match"):
+        def describe_row(i):
+            gstr_name, tally_name = df_page.at[i, 'GSTR-2A Party'], df_page.at[i, 'Tally Party']
+            return f"{gstr_name or '—'} ↔ {tally_name or '—'}"
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            row = st.selectbox("Match row", rows_with_suggestions, format_func=describe_row, key="alternative_row")
+        with col2:
+            choice = st.selectbox(
+                "Suggested partner",
+                range(len(page_suggestions[row])),
+                format_func=lambda j: f"{page_suggestions[row][j][0]} ({page_suggestions[row][j][1]}%)",
+                key=f"alternative_choice_{row}"
+            )
+        
+        if st.button("✅ Use Selected Alternative"):
+            partner, score = page_suggestions[row][choice]
+            gstr_name = df_page.at[row, 'GSTR-2A Party']
+            if gstr_name:
+                pair = (gstr_name, partner)
+            else:
+                pair = (partner, df_page.at[row, 'Tally Party'])
+            st.session_state.match_table = apply_suggestion(st.session_state.match_table, pair[0], pair[1], score)
+            reset_review_grid()
+            st.rerun()
 
 # --- Enhanced Display Functions ---
 def display_dataframe_with_title(df, title, description=""):
@@ -849,6 +1515,107 @@ def display_dataframe_with_title(df, title, description=""):
     """, unsafe_allow_html=True)
     st.dataframe(df, use_container_width=True)
 
+# --- Multi-Period Reconciliation ---
+def load_tally_book(content):
+    """Load the Tally sheet of a full-year workbook, preferring Tally_Replaced"""
+    sheets = pd.ExcelFile(io.BytesIO(content)).sheet_names
+    if 'Tally_Replaced' in sheets:
+        df_tally = pd.read_excel(io.BytesIO(content), sheet_name='Tally_Replaced', header=0)
+    else:
+        df_tally = pd.read_excel(io.BytesIO(content), sheet_name='Tally', header=1)
+    return clean_invoice_frame(enforce_schema(fix_tally_columns(df_tally)))
+
+def multi_period_report(df_recon, df_periods):
+    """Consolidated multi-period workbook bytes"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df_recon.to_excel(writer, sheet_name='Invoice_Recon', index=False)
+        df_periods.to_excel(writer, sheet_name='Periods', index=False)
+    return output.getvalue()
+
+def show_multi_period_tool():
+    """Reconcile a full-year Tally book against monthly GSTR-2A files"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown('<h3 class="column-header">📒 Full-Year Tally Book</h3>', unsafe_allow_html=True)
+        tally_file = st.file_uploader(
+            "Excel file with a 'Tally' (or 'Tally_Replaced') sheet",
+            type=['xlsx', 'xls'],
+            key="multi_period_tally"
+        )
+    
+    with col2:
+        st.markdown('<h3 class="column-header">📅 Monthly GSTR-2A Files</h3>', unsafe_allow_html=True)
+        gstr_files = st.file_uploader(
+            "One Excel file per return period, each with a 'GSTR-2A' sheet",
+            type=['xlsx', 'xls'],
+            accept_multiple_files=True,
+            key="multi_period_gstr"
+        )
+    
+    if tally_file is None or not gstr_files:
+        show_info_message("👆 Upload the Tally book and the monthly GSTR-2A files to continue")
+        return
+    
+    partitions = st.number_input(
+        "GSTIN Partitions",
+        min_value=1,
+        max_value=256,
+        value=DEFAULT_PARTITIONS,
+        help="Invoices are split by GSTIN into this many partitions and reconciled in parallel"
+    )
+    
+    if st.button("📅 Run Multi-Period Reconciliation", use_container_width=True):
+        try:
+            start_time = time.time()
+            progress_bar, status_text = create_animated_progress_bar()
+            
+            status_text.markdown(f'<div class="info-message">📖 Loading {len(gstr_files)} GSTR-2A files...</div>', unsafe_allow_html=True)
+            df_gstr, df_periods = load_gstr_periods([(f.name, f.getvalue()) for f in gstr_files])
+            df_tally = load_tally_book(tally_file.getvalue())
+            progress_bar.progress(0.3)
+            
+            def report_progress(done, total):
+                progress_bar.progress(0.3 + 0.7 * done / total)
+                status_text.markdown(f'<div class="info-message">🧮 Reconciling GSTIN partitions: {done}/{total}</div>', unsafe_allow_html=True)
+            
+            df_recon = run_admitted(lambda: reconcile_periods(df_gstr, df_tally, int(partitions), progress=report_progress),
+                                    frames_memory(df_gstr, df_tally))
+            progress_bar.empty()
+            status_text.empty()
+            
+            st.session_state.multi_period_result = {"recon": df_recon, "periods": df_periods}
+            track_feature_usage("reconciliation", {
+                "processing_time": time.time() - start_time,
+                "records_processed": len(df_gstr) + len(df_tally)
+            })
+            show_success_message(f"Reconciled {len(df_periods)} return periods against the Tally book!")
+        except Exception as e:
+            show_error_message(f"Error during multi-period reconciliation: {e}")
+    
+    result = st.session_state.get('multi_period_result')
+    if result is None:
+        return
+    
+    df_recon, df_periods = result["recon"], result["periods"]
+    cross_period_count = int((df_recon['Cross Period'] == 'Yes').sum())
+    if cross_period_count:
+        show_warning_message(f"{cross_period_count} invoices were reported in a different period than they were booked")
+    
+    display_dataframe_with_title(df_periods, "📅 Return Periods Loaded", "Period detected for each uploaded GSTR-2A file")
+    display_dataframe_with_title(df_recon, "📋 Consolidated Invoice Reconciliation",
+                                 "Invoice-wise comparison across all periods; 'Cross Period' marks invoices that moved between months")
+    
+    st.download_button(
+        label="📥 Download Multi-Period Report",
+        data=lambda: multi_period_report(df_recon, df_periods),
+        file_name=f"Multi_Period_Reconciliation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        use_container_width=True,
+        type="primary"
+    )
+
 # --- Enhanced Streamlit App ---
 def show_reconciliation_tool():
     # Apply custom CSS first
@@ -869,14 +1636,12 @@ def show_reconciliation_tool():
     # Initialize session state
     if 'uploaded_file' not in st.session_state:
         st.session_state.uploaded_file = None
-    if 'match_results' not in st.session_state:
-        st.session_state.match_results = None
+    if 'match_table' not in st.session_state:
+        st.session_state.match_table = None
     if 'temp_file_path' not in st.session_state:
         st.session_state.temp_file_path = None
     if 'matching_completed' not in st.session_state:
         st.session_state.matching_completed = False
-    if 'manual_confirmations' not in st.session_state:
-        st.session_state.manual_confirmations = {}
     if 'all_processes_completed' not in st.session_state:
         st.session_state.all_processes_completed = False
     if 'saved_match_results' not in st.session_state:
@@ -888,6 +1653,19 @@ def show_reconciliation_tool():
     if 'invoice_reconciliation_done' not in st.session_state:
         st.session_state.invoice_reconciliation_done = False
 
+    # Every interaction keeps the session, and so its working workbook, alive
+    analytics_manager.update_active_sessions()
+
+    mode = st.radio(
+        "Reconciliation Mode",
+        ["📄 Single Workbook", "📅 Multi-Period (Financial Year)"],
+        horizontal=True,
+        help="Multi-period mode reconciles monthly GSTR-2A files against a full-year Tally book"
+    )
+    if mode.startswith("📅"):
+        show_multi_period_tool()
+        return
+
     # Top section with file upload and help
     col1, col2, col3 = st.columns([2, 1, 1])
     
@@ -923,19 +1701,34 @@ def show_reconciliation_tool():
     if uploaded_file is not None:
         st.session_state.uploaded_file = uploaded_file
         
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            st.session_state.temp_file_path = tmp_file.name
+        # Written once per session; reruns reuse the working workbook and its stage results
+        try:
+            workbook_path, input_digest, written = upload_store.store(
+                analytics_manager.get_user_id(), uploaded_file.file_id, uploaded_file.getvalue)
+        except UploadQuotaExceeded as e:
+            show_error_message(str(e))
+            return
+        st.session_state.temp_file_path, st.session_state.input_digest = workbook_path, input_digest
+        if written:
+            # A fresh copy of the upload holds no stage results, whatever this session kept for it
+            st.session_state.pop('pipeline_manifest', None)
+            st.session_state.pop('reconciliation_pipeline', None)
+            for stage in PIPELINE_STAGES:
+                st.session_state[stage["session_var"]] = False
         track_feature_usage("file_upload")
         show_success_message(f"File uploaded: {uploaded_file.name}")
         
-        # Validate sheets
+        # Validate sheets; the workbook is only opened when it was just written
+        # or the manifest has not seen its sheets yet
         try:
-            excel_file = pd.ExcelFile(st.session_state.temp_file_path)
-            sheets = excel_file.sheet_names
+            manifest = get_pipeline_manifest()
+            sheets = manifest.sheets
+            if written or 'Tally' not in sheets or 'GSTR-2A' not in sheets:
+                with pd.ExcelFile(st.session_state.temp_file_path) as excel_file:
+                    sheets = excel_file.sheet_names
             
             if 'Tally' in sheets and 'GSTR-2A' in sheets:
+                manifest.record_sheets(sheets)
                 show_success_message("Required sheets 'Tally' and 'GSTR-2A' found!")
             else:
                 show_error_message(f"Required sheets not found. Available sheets: {sheets}")
@@ -971,35 +1764,75 @@ def show_reconciliation_tool():
                 help="Minimum similarity score for matching names"
             )
         
-        if st.button("🚀 Start Matching", use_container_width=True):
+        with col2:
+            engine = st.selectbox(
+                "Matching Engine",
+                options=list(MATCH_ENGINES),
+                index=list(MATCH_ENGINES).index(DEFAULT_ENGINE),
+                format_func=lambda name: MATCH_ENGINES[name],
+                help="Nearest neighbours shortlists names by TF-IDF similarity before scoring; use it for very large supplier lists"
+            )
+            scorer_options = scorers_for(engine)
+            scorer_name = st.selectbox(
+                "Scorer",
+                options=scorer_options,
+                index=scorer_options.index(DEFAULT_SCORER),
+                format_func=lambda name: SCORERS[name].label,
+                help="Token scorers ignore word order; TF-IDF cosine is fastest on large supplier lists with the exhaustive engine"
+            )
+            phonetic_prefilter = st.checkbox(
+                "Phonetic prefilter",
+                value=False,
+                disabled=engine != "exhaustive",
+                help="Only score names sharing a sound-alike word (Soundex); faster, may miss misspelt first letters"
+            ) and engine == "exhaustive"
+        
+        job = collect_background_job('matching')
+        if job is not None:
+            if job.status == DONE:
+                st.session_state.match_candidates = job.result
+                apply_matching_result(job.result["candidates"], threshold)
+                track_feature_usage("reconciliation", {
+                    "processing_time": job.finished_at - job.created_at,
+                    "records_processed": job.result["records"]
+                })
+                show_success_message("Matching completed successfully!")
+            elif job.status == FAILED:
+                show_error_message(f"Error during matching: {job.error}")
+            else:
+                show_info_message("Matching was cancelled")
+        
+        background = st.checkbox(
+            "🧵 Run in background",
+            key="matching_background",
+            help="Score names on a background worker; the page stays usable and progress updates live"
+        )
+        
+        if background and st.button("🚀 Start Matching", use_container_width=True):
+            candidates_key = match_candidates_key(scorer_name, phonetic_prefilter, engine)
+            cached = cached_match_candidates(candidates_key)
+            if cached is not None:
+                # Scores for this upload and scorer are cached; only the assignment reruns
+                apply_matching_result(cached['candidates'], threshold)
+                show_success_message("Matching completed successfully!")
+            else:
+                start_background_job('matching', "Fuzzy matching", matching_job, st.session_state.temp_file_path,
+                                     candidates_key, scorer_name, phonetic_prefilter, engine)
+                show_info_message("Matching started in the background")
+        elif not background and st.button("🚀 Start Matching", use_container_width=True):
             try:
                 start_time = time.time()  # ADD this line
                 with st.spinner("🔄 Processing fuzzy matching..."):
-                    # Read data
-                    df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally', header=1)
-                    df_gstr = pd.read_excel(st.session_state.temp_file_path, sheet_name='GSTR-2A', header=1)
-                    
-                    # Get supplier columns
-                    col_supplier_tally = get_column(df_tally, 'Supplier')
-                    col_supplier_gstr = get_column(df_gstr, 'Supplier')
-                    
-                    # Get unique names
-                    tally_parties = get_raw_unique_names(df_tally[col_supplier_tally])
-                    gstr_parties = get_raw_unique_names(df_gstr[col_supplier_gstr])
-                    
-                    # Perform matching with animation
-                    matches = two_way_match(tally_parties, gstr_parties, threshold)
+                    # Perform matching with animation; the workbook is only read on a cache miss
+                    matches = two_way_match(threshold, scorer_name, phonetic_prefilter, engine)
                     
-                    st.session_state.match_results = matches
+                    # Confirmations start from each match's default
+                    st.session_state.match_table = build_match_table(matches)
                     st.session_state.matching_completed = True
-                    
-                    # Initialize manual confirmations
-                    st.session_state.manual_confirmations = {}
-                    for i, match in enumerate(matches):
-                        st.session_state.manual_confirmations[i] = match[3]  # Default confirmation
+                    reset_review_grid()
                     # ADD THESE LINES for tracking
                     processing_time = time.time() - start_time
-                    total_records = len(df_tally) + len(df_gstr)
+                    total_records = st.session_state.match_candidates['records']
 
                     track_feature_usage("reconciliation", {
                         "processing_time": processing_time,
@@ -1010,9 +1843,11 @@ def show_reconciliation_tool():
                 
             except Exception as e:
                 show_error_message(f"Error during matching: {e}")
+        
+        show_background_job('matching')
 
         # Enhanced results display with animations
-        if st.session_state.matching_completed and st.session_state.match_results:
+        if st.session_state.matching_completed and st.session_state.match_table is not None:
             st.subheader("📋 Matching Results - Manual Confirmation")
             
             # Bulk operations with animated buttons
@@ -1020,86 +1855,45 @@ def show_reconciliation_tool():
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                if st.button("✅ Set All High Scores to Yes", help="Auto-confirm all matches with score ≥ 80%"):
-                    for i, (gstr_name, tally_name, score, _) in enumerate(st.session_state.match_results):
-                        if score >= 80 and gstr_name and tally_name:
-                            st.session_state.manual_confirmations[i] = "Yes"
-                        else:
-                            st.session_state.manual_confirmations[i] = "No"
+                if st.button("✅ Set All High Scores to Yes", help=f"Auto-confirm all matches with score ≥ {HIGH_SCORE_CUTOFF}%"):
+                    match_table = st.session_state.match_table
+                    high_scores = high_score_mask(match_table)
+                    set_confirmations(match_table, high_scores, "Yes")
+                    set_confirmations(match_table, ~high_scores, "No")
+                    reset_review_grid()
                     show_success_message("All high-score matches set to Yes!")
                     st.rerun()
             
             with col2:
                 if st.button("❌ Set All to No"):
-                    for i in range(len(st.session_state.match_results)):
-                        st.session_state.manual_confirmations[i] = "No"
+                    set_confirmations(st.session_state.match_table, slice(None), "No")
+                    reset_review_grid()
                     show_info_message("All matches set to No")
                     st.rerun()
             
             with col3:
                 if st.button("🔄 Reset to Default"):
-                    for i, match in enumerate(st.session_state.match_results):
-                        st.session_state.manual_confirmations[i] = match[3]
+                    match_table = st.session_state.match_table
+                    match_table['Manual Confirmation'] = match_table['Default Confirmation'].copy()
+                    reset_review_grid()
                     show_info_message("Reset to default confirmations")
                     st.rerun()
 
             st.write("**Review and confirm matches below:**")
             
-            # Create interactive confirmation interface with enhanced animations
-            with st.form("confirmation_form"):
-                cols = st.columns([3, 3, 1, 1.5])
-                cols[0].write("**GSTR-2A Party**")
-                cols[1].write("**Tally Party**")
-                cols[2].write("**Score**")
-                cols[3].write("**Confirmation**")
-                
-                for i, (gstr_name, tally_name, score, default_confirm) in enumerate(st.session_state.match_results):
-                    cols = st.columns([3, 3, 1, 1.5])
-                    
-                    # Display names and score
-                    cols[0].write(str(gstr_name) if gstr_name else "")
-                    cols[1].write(str(tally_name) if tally_name else "")
-                    cols[2].write(f"{score:.0f}%")
-                    
-                    # Dropdown for confirmation
-                    current_value = st.session_state.manual_confirmations.get(i, default_confirm)
-                    confirmation = cols[3].selectbox(
-                        f"Confirm {i}",
-                        options=["Yes", "No"],
-                        index=0 if current_value == "Yes" else 1,
-                        key=f"confirm_{i}",
-                        label_visibility="collapsed"
-                    )
-                    st.session_state.manual_confirmations[i] = confirmation
-                
-                # Enhanced form submit button
-                submitted = st.form_submit_button("🔄 Update All Confirmations", use_container_width=True)
-                if submitted:
-                    show_success_message("Confirmations updated!")
+            # Paginated review grid; only the visible page is sent to the browser
+            show_confirmation_grid()
 
             # Excel Download/Upload functionality with enhanced styling
             st.subheader("📥📤 Excel Download/Upload for Bulk Editing")
             col1, col2 = st.columns(2)
             
             with col1:
-                # Prepare current data for download
-                current_results = []
-                for i, (gstr_name, tally_name, score, _) in enumerate(st.session_state.match_results):
-                    current_confirmation = st.session_state.manual_confirmations.get(i, "No")
-                    current_results.append([gstr_name, tally_name, score, current_confirmation])
-                
-                df_download = pd.DataFrame(current_results,
-                                         columns=['GSTR-2A Party', 'Tally Party', 'Score', 'Manual Confirmation'])
-                
-                # Create Excel file in memory
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df_download.to_excel(writer, sheet_name='Matching_Results', index=False)
-                output.seek(0)
-                
+                # The match table is serialized only when the download is requested
+                df_download = st.session_state.match_table
                 st.download_button(
                     label="📥 Download for Offline Editing",
-                    data=output.getvalue(),
+                    data=lambda: match_table_to_excel(df_download),
                     file_name=f"matching_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
@@ -1112,26 +1906,37 @@ def show_reconciliation_tool():
                     help="Upload the Excel file with your edited confirmations"
                 )
                 
-                if uploaded_confirmations is not None:
+                # Each uploaded file is applied once; reruns keep the same upload
+                if (uploaded_confirmations is not None and
+                    uploaded_confirmations.file_id != st.session_state.get('applied_confirmations_file_id')):
                     try:
                         df_uploaded = pd.read_excel(uploaded_confirmations)
                         # Validate columns
                         required_cols = ['GSTR-2A Party', 'Tally Party', 'Score', 'Manual Confirmation']
                         if all(col in df_uploaded.columns for col in required_cols):
-                            # Update confirmations
-                            for i, row in df_uploaded.iterrows():
-                                if i < len(st.session_state.match_results):
-                                    confirmation = str(row['Manual Confirmation']).strip()
-                                    if confirmation.upper() in ['YES', 'Y', '1', 'TRUE']:
-                                        st.session_state.manual_confirmations[i] = "Yes"
-                                    else:
-                                        st.session_state.manual_confirmations[i] = "No"
-                            show_success_message("Confirmations updated from uploaded file!")
+                            # Update confirmations by party-name key
+                            applied_count, unmatched = merge_uploaded_confirmations(
+                                st.session_state.match_table, df_uploaded
+                            )
+                            st.session_state.applied_confirmations_file_id = uploaded_confirmations.file_id
+                            st.session_state.confirmation_upload_report = {
+                                "applied": applied_count,
+                                "unmatched": unmatched
+                            }
+                            reset_review_grid()
                             st.rerun()
                         else:
                             show_error_message("Invalid file format. Required columns: " + ", ".join(required_cols))
                     except Exception as e:
                         show_error_message(f"Error reading uploaded file: {e}")
+                
+                upload_report = st.session_state.get('confirmation_upload_report')
+                if uploaded_confirmations is not None and upload_report:
+                    show_success_message(f"Confirmations updated from uploaded file for {upload_report['applied']} matches!")
+                    if len(upload_report['unmatched']) > 0:
+                        show_warning_message(f"{len(upload_report['unmatched'])} uploaded rows did not match any current GSTR-2A/Tally pair")
+                        with st.expander("🔍 Unmatched uploaded rows"):
+                            st.dataframe(upload_report['unmatched'], use_container_width=True)
 
             # Enhanced continue button
             st.subheader("▶️ Continue to Next Step")
@@ -1139,39 +1944,37 @@ def show_reconciliation_tool():
                 try:
                     # Create final results with progress animation
                     with st.spinner("💾 Saving confirmations..."):
-                        final_results = []
-                        for i, (gstr_name, tally_name, score, _) in enumerate(st.session_state.match_results):
-                            final_confirmation = st.session_state.manual_confirmations.get(i, "No")
-                            final_results.append([gstr_name, tally_name, score, final_confirmation])
-                        
                         # Create results dataframe
-                        df_result = pd.DataFrame(final_results,
-                                               columns=['GSTR-2A Party', 'Tally Party', 'Score', 'Manual Confirmation'])
+                        df_result = export_match_sheet(st.session_state.match_table)
                         df_result.sort_values(by=['Manual Confirmation', 'GSTR-2A Party', 'Tally Party'],
                                             ascending=[False, False, False], inplace=True)
                         
                         # Save to Excel with enhanced error handling
                         try:
-                            book = load_workbook(st.session_state.temp_file_path)
-                            if 'GSTR_Tally_Match' in book.sheetnames:
-                                book.remove(book['GSTR_Tally_Match'])
-                            
-                            ws = book.create_sheet('GSTR_Tally_Match')
-                            for r in dataframe_to_rows(df_result, index=False, header=True):
-                                ws.append(r)
-                            
-                            for cell in ws[1]:
-                                cell.font = Font(bold=True)
-                            
-                            book.save(st.session_state.temp_file_path)
-                            book.close()
+                            if get_export_backend() == "streaming":
+                                replace_sheets(st.session_state.temp_file_path, {'GSTR_Tally_Match': df_result})
+                            else:
+                                book = load_workbook(st.session_state.temp_file_path)
+                                if 'GSTR_Tally_Match' in book.sheetnames:
+                                    book.remove(book['GSTR_Tally_Match'])
+                                
+                                ws = book.create_sheet('GSTR_Tally_Match')
+                                for r in dataframe_to_rows(df_result, index=False, header=True):
+                                    ws.append(r)
+                                
+                                for cell in ws[1]:
+                                    cell.font = Font(bold=True)
+                                
+                                save_workbook(book, st.session_state.temp_file_path)
+                                book.close()
+                            record_stage_output('matching', {'GSTR_Tally_Match': df_result})
                             
                             show_success_message("Final confirmations saved successfully!")
                             
                         except Exception as e1:
                             try:
-                                with pd.ExcelWriter(st.session_state.temp_file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                                    df_result.to_excel(writer, sheet_name='GSTR_Tally_Match', index=False)
+                                save_sheets(st.session_state.temp_file_path, {'GSTR_Tally_Match': df_result}, "openpyxl")
+                                record_stage_output('matching', {'GSTR_Tally_Match': df_result})
                                 show_success_message("Final confirmations saved successfully!")
                             except Exception as e2:
                                 show_error_message(f"Save failed: {e1}, {e2}")
@@ -1179,8 +1982,7 @@ def show_reconciliation_tool():
                         
                         # Verify and show summary with celebration animation
                         st.session_state.saved_match_results = df_result
-                        yes_count = sum(1 for conf in st.session_state.manual_confirmations.values() if conf == "Yes")
-                        total_count = len(st.session_state.manual_confirmations)
+                        yes_count, total_count = confirmation_counts(st.session_state.match_table)
                         
                         st.markdown('<div class="celebration">', unsafe_allow_html=True)
                         show_info_message(f"📊 Summary: {yes_count} out of {total_count} matches confirmed for replacement")
@@ -1227,39 +2029,12 @@ def show_reconciliation_tool():
                         show_error_message("No match results found. Please complete fuzzy matching first.")
                         return
 
-                    # Read Tally data
+                    # Read Tally data and apply the confirmed names
                     df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally', header=1)
-                    col_supplier = get_column(df_tally, 'Supplier')
-
-                    # Create name mapping
-                    name_map = {}
-                    replacement_count = 0
-                    for _, row in df_matches.iterrows():
-                        gstr_name = row['GSTR-2A Party']
-                        tally_name = row['Tally Party']
-                        confirmation = str(row['Manual Confirmation']).strip().upper()
-                        
-                        if confirmation == "YES" and pd.notna(gstr_name) and pd.notna(tally_name):
-                            if gstr_name != '' and tally_name != '':
-                                name_map[tally_name] = gstr_name
-                                replacement_count += 1
-
-                    # Apply replacements
-                    df_new = df_tally.copy()
-                    def replace_name(name):
-                        if pd.isna(name):
-                            return name
-                        return name_map.get(name, name)
-
-                    df_new[col_supplier] = df_new[col_supplier].apply(replace_name)
-
-                    # Format Invoice Date
-                    if 'Invoice Date' in df_new.columns:
-                        df_new['Invoice Date'] = pd.to_datetime(df_new['Invoice Date'], errors='coerce').dt.strftime('%d-%m-%Y')
+                    df_new, replacement_count = get_pipeline().replace_names(df_tally, df_matches)
 
                     # Save updated data
-                    with pd.ExcelWriter(st.session_state.temp_file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                        df_new.to_excel(writer, sheet_name='Tally_Replaced', index=False, header=True)
+                    save_stage_sheets('name_replacement', {'Tally_Replaced': df_new})
 
                     st.session_state.name_replacement_done = True
                     show_success_message(f"Replaced {replacement_count} supplier names successfully!")
@@ -1276,6 +2051,8 @@ def show_reconciliation_tool():
     with tab3:
         st.markdown('<div class="results-container">', unsafe_allow_html=True)
         st.header("📊 GST Reconciliation")
+        show_out_of_core_panel('gst_reconciliation')
+        gst_fixed_point, gst_tolerance = show_precision_settings('gst_reconciliation')
         
         if st.button("📊 Run GST Reconciliation", use_container_width=True):
             try:
@@ -1285,147 +2062,30 @@ def show_reconciliation_tool():
                     status = st.empty()
                     
                     # Check which Tally sheet to use
-                    try:
-                        df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally_Replaced', header=0)
-                        tally_sheet_used = "Tally_Replaced"
-                        show_info_message("Using Tally_Replaced sheet for reconciliation")
-                    except:
-                        df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally', header=1)
-                        tally_sheet_used = "Tally"
-                        show_info_message("Using original Tally sheet for reconciliation")
-                    
-                    progress_bar.progress(20)
-                    status.markdown('<div class="info-message">📖 Loading GSTR-2A data...</div>', unsafe_allow_html=True)
-                    
-                    df_gstr = pd.read_excel(st.session_state.temp_file_path, sheet_name='GSTR-2A', header=1)
-                    
-                    progress_bar.progress(40)
-                    status.markdown('<div class="info-message">🔧 Processing data...</div>', unsafe_allow_html=True)
+                    _, _, tally_sheet_used = get_stage_sources()
+                    show_info_message(f"Using {tally_sheet_used} sheet for reconciliation")
                     
-                    # Fix columns
-                    df_tally = fix_tally_columns(df_tally)
-                    
-                    # Add Cess column if missing
-                    for df in [df_tally, df_gstr]:
-                        if 'Cess' not in df.columns:
-                            df['Cess'] = 0
-                    
-                    progress_bar.progress(60)
-                    status.markdown('<div class="info-message">🧮 Calculating reconciliation...</div>', unsafe_allow_html=True)
-                    
-                    # Get column mappings
-                    col_name = get_column(df_tally, 'Supplier')
-                    col_itax = get_column(df_tally, 'Integrated Tax')
-                    col_ctax = get_column(df_tally, 'Central Tax')
-                    col_stax = get_column(df_tally, 'State/UT tax')
-
-                    # Check for GSTIN columns
-                    try:
-                        col_gstin_tally = get_column(df_tally, 'GSTIN of supplier')
-                        col_gstin_gstr = get_column(df_gstr, 'GSTIN of supplier')
-                        has_gstin = True
-                    except KeyError:
-                        has_gstin = False
-
-                    # Process data
-                    df_tally_processed = df_tally.copy()
-                    df_gstr_processed = df_gstr.copy()
+                    def compute_gst():
+                        status.markdown('<div class="info-message">📖 Loading Tally and GSTR-2A data...</div>', unsafe_allow_html=True)
+                        df_gstr, df_tally, _ = load_stage_frames()
+                        
+                        progress_bar.progress(60)
+                        status.markdown('<div class="info-message">🧮 Calculating reconciliation...</div>', unsafe_allow_html=True)
+                        return get_pipeline().reconcile_gst(df_gstr, df_tally, tally_sheet_used, gst_fixed_point, gst_tolerance)
                     
-                    progress_bar.progress(80)
-                    status.markdown('<div class="info-message">📊 Creating comparisons...</div>', unsafe_allow_html=True)
-
-                    if has_gstin:
-                        # GSTIN-based grouping
-                        df_tally_processed[col_gstin_tally] = df_tally_processed[col_gstin_tally].fillna('NO_GSTIN').astype(str)
-                        df_gstr_processed[col_gstin_gstr] = df_gstr_processed[col_gstin_gstr].fillna('NO_GSTIN').astype(str)
-
-                        def create_group_key(row, gstin_col, supplier_col):
-                            gstin_val = str(row[gstin_col]).strip() if pd.notna(row[gstin_col]) else ''
-                            supplier_val = str(row[supplier_col]).strip() if pd.notna(row[supplier_col]) else ''
-                            if not gstin_val or gstin_val == 'NO_GSTIN' or gstin_val == 'nan':
-                                return f"SUPPLIER_{supplier_val}"
-                            else:
-                                return f"GSTIN_{gstin_val}"
-
-                        df_tally_processed['Group_Key'] = df_tally_processed.apply(
-                            lambda row: create_group_key(row, col_gstin_tally, col_name), axis=1
-                        )
-                        df_gstr_processed['Group_Key'] = df_gstr_processed.apply(
-                            lambda row: create_group_key(row, col_gstin_gstr, col_name), axis=1
-                        )
-                    else:
-                        # Supplier-based grouping only
-                        df_tally_processed['Group_Key'] = df_tally_processed[col_name].fillna('UNKNOWN')
-                        df_gstr_processed['Group_Key'] = df_gstr_processed[col_name].fillna('UNKNOWN')
-
-                    # Group and aggregate
-                    group_cols = ['Group_Key']
-                    df_tally_grp = df_tally_processed.groupby(group_cols).agg({
-                        col_name: 'first',
-                        col_itax: 'sum',
-                        col_ctax: 'sum',
-                        col_stax: 'sum',
-                        'Cess': 'sum'
-                    }).reset_index()
-
-                    df_gstr_grp = df_gstr_processed.groupby(group_cols).agg({
-                        col_name: 'first',
-                        col_itax: 'sum',
-                        col_ctax: 'sum',
-                        col_stax: 'sum',
-                        'Cess': 'sum'
-                    }).reset_index()
-
-                    # Create comparisons
-                    df_combined = pd.merge(df_gstr_grp, df_tally_grp, on=group_cols, how='inner', suffixes=('_GSTR', '_Tally'))
-                    df_combined['Integrated Tax Variance'] = df_combined[col_itax + '_GSTR'] - df_combined[col_itax + '_Tally']
-                    df_combined['Central Tax Variance'] = df_combined[col_ctax + '_GSTR'] - df_combined[col_ctax + '_Tally']
-                    df_combined['State/UT Tax Variance'] = df_combined[col_stax + '_GSTR'] - df_combined[col_stax + '_Tally']
-                    df_combined['Cess Variance'] = df_combined['Cess_GSTR'] - df_combined['Cess_Tally']
-
-                    # Find missing entries
-                    df_combined_outer = pd.merge(df_gstr_grp, df_tally_grp, on=group_cols, how='outer', suffixes=('_GSTR', '_Tally'))
-                    not_in_tally = df_combined_outer[df_combined_outer[col_itax + '_Tally'].isna()]
-                    not_in_gstr = df_combined_outer[df_combined_outer[col_itax + '_GSTR'].isna()]
-
-                    # Create summary
-                    df_summary = pd.DataFrame({
-                        'Particulars': [
-                            'GST Input as per GSTR-2A Sheet',
-                            f'GST Input as per {tally_sheet_used}',
-                            'Variance (1-2)'
-                        ],
-                        'Integrated Tax': [
-                            df_gstr_grp[col_itax].sum(),
-                            df_tally_grp[col_itax].sum(),
-                            df_gstr_grp[col_itax].sum() - df_tally_grp[col_itax].sum()
-                        ],
-                        'Central Tax': [
-                            df_gstr_grp[col_ctax].sum(),
-                            df_tally_grp[col_ctax].sum(),
-                            df_gstr_grp[col_ctax].sum() - df_tally_grp[col_ctax].sum()
-                        ],
-                        'State/UT Tax': [
-                            df_gstr_grp[col_stax].sum(),
-                            df_tally_grp[col_stax].sum(),
-                            df_gstr_grp[col_stax].sum() - df_tally_grp[col_stax].sum()
-                        ],
-                        'Cess': [
-                            df_gstr_grp['Cess'].sum(),
-                            df_tally_grp['Cess'].sum(),
-                            df_gstr_grp['Cess'].sum() - df_tally_grp['Cess'].sum()
-                        ]
-                    })
+                    gst_results, cached = run_cached_stage('gst_reconciliation', [gst_fixed_point, gst_tolerance], compute_gst)
+                    if cached:
+                        show_info_message("⚡ Inputs and settings unchanged; reusing the previous results")
+                    df_summary = gst_results['GST_Input_Summary']
+                    df_combined = gst_results['T_vs_G-2A']
+                    not_in_tally = gst_results['N_I_T_B_I_G']
+                    not_in_gstr = gst_results['N_I_G_B_I_T']
 
                     progress_bar.progress(100)
                     status.markdown('<div class="success-message">💾 Saving results...</div>', unsafe_allow_html=True)
 
                     # Save results
-                    with pd.ExcelWriter(st.session_state.temp_file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                        df_summary.to_excel(writer, sheet_name='GST_Input_Summary', index=False)
-                        df_combined.to_excel(writer, sheet_name='T_vs_G-2A', index=False)
-                        not_in_tally.to_excel(writer, sheet_name='N_I_T_B_I_G', index=False)
-                        not_in_gstr.to_excel(writer, sheet_name='N_I_G_B_I_T', index=False)
+                    save_stage_sheets('gst_reconciliation', gst_results)
 
                     progress_bar.empty()
                     status.empty()
@@ -1449,11 +2109,16 @@ def show_reconciliation_tool():
             except Exception as e:
                 show_error_message(f"Error during reconciliation: {e}")
         
+        show_combined_reconciliation(gst_fixed_point, gst_tolerance)
+        show_pivot_panel(gst_fixed_point, gst_tolerance)
+        
         st.markdown('</div>', unsafe_allow_html=True)
 
     with tab4:
         st.markdown('<div class="results-container">', unsafe_allow_html=True)
         st.header("🧾 Invoice-wise Reconciliation")
+        show_out_of_core_panel('invoice_reconciliation')
+        invoice_fixed_point, invoice_tolerance = show_precision_settings('invoice_reconciliation')
         
         if st.button("🧾 Run Invoice Reconciliation", use_container_width=True):
             try:
@@ -1463,63 +2128,29 @@ def show_reconciliation_tool():
                     status = st.empty()
                     
                     # Check which Tally sheet to use
-                    try:
-                        df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally_Replaced', header=0)
-                        tally_sheet_used = "Tally_Replaced"
-                        df_tally = fix_tally_columns(df_tally)
-                    except:
-                        df_tally = pd.read_excel(st.session_state.temp_file_path, sheet_name='Tally', header=1)
-                        tally_sheet_used = "Tally"
-                    
-                    progress_bar.progress(30)
-                    status.markdown('<div class="info-message">📖 Loading GSTR-2A data...</div>', unsafe_allow_html=True)
-                    
-                    df_gstr = pd.read_excel(st.session_state.temp_file_path, sheet_name='GSTR-2A', header=1)
-
-                    progress_bar.progress(50)
-                    status.markdown('<div class="info-message">🔧 Cleaning data...</div>', unsafe_allow_html=True)
-                    
-                    # Clean columns
-                    for df in [df_tally, df_gstr]:
-                        df.columns = df.columns.str.strip()
-                        if 'Cess' not in df.columns:
-                            df['Cess'] = 0
-                        df['GSTIN of supplier'] = df['GSTIN of supplier'].fillna('No GSTIN')
-
-                    progress_bar.progress(70)
-                    status.markdown('<div class="info-message">📊 Grouping invoices...</div>', unsafe_allow_html=True)
+                    _, _, tally_sheet_used = get_stage_sources()
                     
-                    # Group by invoice
-                    group_columns = ['GSTIN of supplier', 'Supplier', 'Invoice number']
-                    def consolidate(df):
-                        return df.groupby(group_columns).agg({
-                            'Taxable Value': 'sum',
-                            'Integrated Tax': 'sum',
-                            'Central Tax': 'sum',
-                            'State/UT tax': 'sum',
-                            'Cess': 'sum'
-                        }).reset_index()
-
-                    tally_grouped = consolidate(df_tally)
-                    gstr_grouped = consolidate(df_gstr)
-
-                    progress_bar.progress(90)
-                    status.markdown('<div class="info-message">🧮 Calculating variances...</div>', unsafe_allow_html=True)
+                    def compute_invoices():
+                        status.markdown('<div class="info-message">📖 Loading Tally and GSTR-2A data...</div>', unsafe_allow_html=True)
+                        df_gstr, df_tally, _ = load_stage_frames()
+                        
+                        progress_bar.progress(50)
+                        status.markdown('<div class="info-message">🧮 Grouping invoices and calculating variances...</div>', unsafe_allow_html=True)
+                        df_result = get_pipeline().reconcile_invoices(df_gstr, df_tally, tally_sheet_used,
+                                                                      invoice_fixed_point, invoice_tolerance)
+                        return {'Invoice_Recon': df_result}
                     
-                    # Combine and calculate variances
-                    df_combined = pd.merge(gstr_grouped, tally_grouped, on=group_columns, how='outer', suffixes=('_GSTR', '_Tally')).fillna(0)
-                    df_combined['Taxable Value Variance'] = df_combined['Taxable Value_GSTR'] - df_combined['Taxable Value_Tally']
-                    df_combined['Integrated Tax Variance'] = df_combined['Integrated Tax_GSTR'] - df_combined['Integrated Tax_Tally']
-                    df_combined['Central Tax Variance'] = df_combined['Central Tax_GSTR'] - df_combined['Central Tax_Tally']
-                    df_combined['State/UT Tax Variance'] = df_combined['State/UT tax_GSTR'] - df_combined['State/UT tax_Tally']
-                    df_combined['Cess Variance'] = df_combined['Cess_GSTR'] - df_combined['Cess_Tally']
+                    invoice_results, cached = run_cached_stage('invoice_reconciliation', [invoice_fixed_point, invoice_tolerance],
+                                                               compute_invoices)
+                    if cached:
+                        show_info_message("⚡ Inputs and settings unchanged; reusing the previous results")
+                    df_combined = invoice_results['Invoice_Recon']
 
                     progress_bar.progress(100)
                     status.markdown('<div class="success-message">💾 Saving results...</div>', unsafe_allow_html=True)
                     
                     # Save to Excel
-                    with pd.ExcelWriter(st.session_state.temp_file_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                        df_combined.to_excel(writer, sheet_name='Invoice_Recon', index=False)
+                    save_stage_sheets('invoice_reconciliation', invoice_results)
 
                     progress_bar.empty()
                     status.empty()
@@ -1540,9 +2171,8 @@ def show_reconciliation_tool():
         st.markdown('</div>', unsafe_allow_html=True)
 
     # Enhanced Final Download Section with Process Status
-    if (st.session_state.matching_completed or
-        st.session_state.get('temp_file_path') and
-        os.path.exists(st.session_state.temp_file_path)):
+    manifest = get_pipeline_manifest()
+    if manifest is not None and manifest.sheets:
         
         st.markdown("---")
         st.markdown('<div class="results-container">', unsafe_allow_html=True)
@@ -1554,105 +2184,83 @@ def show_reconciliation_tool():
             st.markdown('<h3 class="column-header">📥 Complete Reconciliation Report</h3>', unsafe_allow_html=True)
             show_info_message("📋 Download the complete Excel file with all sheets and analysis results")
             
-            try:
-                with open(st.session_state.temp_file_path, 'rb') as file:
-                    st.download_button(
-                        label="📥 Download Complete Excel Report",
-                        data=file.read(),
-                        file_name=f"Complete_GST_Reconciliation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        
-                        use_container_width=True,
-                        type="primary"
-                    )
-                    track_feature_usage("export_excel")
-            except:
-                show_warning_message("⚠️ Complete file not available. Please run at least one process first.")
+            st.selectbox(
+                "📝 Excel Writer",
+                options=list(EXPORT_BACKENDS),
+                format_func=lambda name: EXPORT_BACKENDS[name],
+                key="export_backend",
+                help="Streaming writes sheets in one constant-memory pass with styled headers; "
+                     "use it for very large results. Applies to stage saves and the final report."
+            )
+            
+            report_source = manifest.workbook_path
+            report_version = manifest.version
+            report_backend = get_export_backend()
+            # The payload is only built when the button is clicked
+            st.download_button(
+                label="📥 Download Complete Excel Report",
+                data=lambda: build_final_report(report_source, report_version, report_backend),
+                file_name=f"Complete_GST_Reconciliation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                
+                use_container_width=True,
+                type="primary"
+            )
         
         with col2:
             st.markdown('<h3 class="column-header">📊 Process Status</h3>', unsafe_allow_html=True)
             
-            try:
-                excel_file = pd.ExcelFile(st.session_state.temp_file_path)
-                available_sheets = excel_file.sheet_names
-                
-                # Enhanced process status with persistent tracking
-                process_status = [
-                    {
-                        "name": "🚀 Fuzzy Matching",
-                        "sheet": "GSTR_Tally_Match",
-                        "session_var": "matching_completed",
-                        "description": "Supplier name matching completed"
-                    },
-                    {
-                        "name": "🔁 Name Replacement", 
-                        "sheet": "Tally_Replaced",
-                        "session_var": "name_replacement_done",
-                        "description": "Tally names replaced with GSTR names"
-                    },
-                    {
-                        "name": "📊 GST Reconciliation",
-                        "sheet": "GST_Input_Summary",
-                        "session_var": "gst_reconciliation_done", 
-                        "description": "GST amounts reconciled and analyzed"
-                    },
-                    {
-                        "name": "🧾 Invoice Reconciliation",
-                        "sheet": "Invoice_Recon",
-                        "session_var": "invoice_reconciliation_done",
-                        "description": "Invoice-wise comparison completed"
-                    }
-                ]
-                
-                completed_count = 0
-                
-                for process in process_status:
-                    sheet_exists = process["sheet"] in available_sheets
-                    session_completed = st.session_state.get(process["session_var"], False)
-                    
-                    if sheet_exists or session_completed:
-                        st.markdown(f'''
-                        <div class="status-card">
-                            <strong>{process["name"]}: ✅ Completed</strong><br>
-                            <small style="color: #64748b;">{process["description"]}</small>
-                        </div>
-                        ''', unsafe_allow_html=True)
-                        completed_count += 1
-                        
-                        # Update session state based on sheet existence
-                        if sheet_exists:
-                            st.session_state[process["session_var"]] = True
-                    else:
-                        st.markdown(f'''
-                        <div style="background: rgba(239, 68, 68, 0.1); border-left: 4px solid #ef4444; padding: 1rem; margin: 0.5rem 0; border-radius: 8px;">
-                            <strong>{process["name"]}: ❌ Not Done</strong><br>
-                            <small style="color: #64748b;">{process["description"]}</small>
-                        </div>
-                        ''', unsafe_allow_html=True)
-                
-                # Show completion percentage
-                completion_percentage = (completed_count / len(process_status)) * 100
-                st.markdown(f'''
-                <div style="background: linear-gradient(135deg, #06b6d4 0%, #3b82f6 100%); color: white; padding: 1rem; border-radius: 12px; text-align: center; margin: 1rem 0;">
-                    <strong>Overall Progress: {completion_percentage:.0f}% Complete</strong><br>
-                    <small>{completed_count} out of {len(process_status)} processes completed</small>
-                </div>
-                ''', unsafe_allow_html=True)
-                
-                # Show available sheets
-                st.markdown('<h4 style="margin-top: 2rem;">📂 Available Sheets in Excel:</h4>', unsafe_allow_html=True)
-                for i, sheet in enumerate(available_sheets, 1):
+            # Status comes from the pipeline manifest, so the workbook is never re-parsed
+            completed_count = 0
+            show_stale_stages_panel(manifest)
+            
+            for process in PIPELINE_STAGES:
+                if manifest.is_stale(process["key"]):
                     st.markdown(f'''
-                    <div style="background: rgba(255, 255, 255, 0.9); padding: 0.5rem 1rem; margin: 0.25rem 0; border-radius: 8px; border-left: 3px solid #10b981;">
-                        <strong>{i}. {sheet}</strong>
+                    <div style="background: rgba(245, 158, 11, 0.1); border-left: 4px solid #f59e0b; padding: 1rem; margin: 0.5rem 0; border-radius: 8px;">
+                        <strong>{process["name"]}: ⚠️ Out of Date</strong><br>
+                        <small style="color: #64748b;">Upstream results changed since this stage ran</small>
                     </div>
                     ''', unsafe_allow_html=True)
+                elif manifest.is_done(process["key"]) or st.session_state.get(process["session_var"], False):
+                    st.markdown(f'''
+                    <div class="status-card">
+                        <strong>{process["name"]}: ✅ Completed</strong><br>
+                        <small style="color: #64748b;">{process["description"]}</small>
+                    </div>
+                    ''', unsafe_allow_html=True)
+                    completed_count += 1
                     
-            except Exception as e:
-                show_error_message(f"Error checking file status: {e}")
+                    # Update session state based on the manifest
+                    st.session_state[process["session_var"]] = True
+                else:
+                    st.markdown(f'''
+                    <div style="background: rgba(239, 68, 68, 0.1); border-left: 4px solid #ef4444; padding: 1rem; margin: 0.5rem 0; border-radius: 8px;">
+                        <strong>{process["name"]}: ❌ Not Done</strong><br>
+                        <small style="color: #64748b;">{process["description"]}</small>
+                    </div>
+                    ''', unsafe_allow_html=True)
+            
+            # Show completion percentage
+            completion_percentage = (completed_count / len(PIPELINE_STAGES)) * 100
+            st.markdown(f'''
+            <div style="background: linear-gradient(135deg, #06b6d4 0%, #3b82f6 100%); color: white; padding: 1rem; border-radius: 12px; text-align: center; margin: 1rem 0;">
+                <strong>Overall Progress: {completion_percentage:.0f}% Complete</strong><br>
+                <small>{completed_count} out of {len(PIPELINE_STAGES)} processes completed</small>
+            </div>
+            ''', unsafe_allow_html=True)
+            
+            # Show available sheets
+            st.markdown('<h4 style="margin-top: 2rem;">📂 Available Sheets in Excel:</h4>', unsafe_allow_html=True)
+            for i, sheet in enumerate(manifest.sheets, 1):
+                st.markdown(f'''
+                <div style="background: rgba(255, 255, 255, 0.9); padding: 0.5rem 1rem; margin: 0.25rem 0; border-radius: 8px; border-left: 3px solid #10b981;">
+                    <strong>{i}. {sheet}</strong>
+                </div>
+                ''', unsafe_allow_html=True)
 
         # Celebration animation if all processes completed
-        if completed_count == 4:  # All 4 processes completed
+        if completed_count == len(PIPELINE_STAGES):
             st.session_state.all_processes_completed = True
             st.markdown('''
             <div class="celebration" style="text-align: center; margin: 2rem 0;">
@@ -3,6 +3,9 @@ from utils.analytics import analytics_manager
 from datetime import datetime, timedelta
 import pandas as pd
 
+# Interval for the dashboard's timer-driven stats refresh
+AUTO_REFRESH_SECONDS = 30
+
 def show_analytics_widget():
     """Display compact analytics widget in top-right corner with enhanced animations"""
     
@@ -473,6 +476,22 @@ def show_detailed_analytics():
         </div>
         """, unsafe_allow_html=True)
         
+        # Auto-refresh re-runs only the stats panel fragment on a timer,
+        # so the script thread is never parked in a sleep
+        auto_refresh = st.checkbox(f"🔄 Auto-refresh every {AUTO_REFRESH_SECONDS} seconds")
+        if auto_refresh:
+            st.markdown('<button class="refresh-button">🔄 Auto-Refreshing...</button>', unsafe_allow_html=True)
+
+        st.fragment(show_live_stats_panel, run_every=AUTO_REFRESH_SECONDS if auto_refresh else None)()
+    
+    except Exception as e:
+        st.error(f"Analytics dashboard error: {str(e)}")
+        st.info("Please check if all required files are properly created.")
+
+def show_live_stats_panel():
+    """Render the live metrics, charts and session info for the dashboard"""
+    
+    try:
         stats = analytics_manager.get_real_time_stats()
         
         # Calculate enhanced metrics
@@ -622,16 +641,6 @@ def show_detailed_analytics():
             st.info(f"**Current Time:** {datetime.now().strftime('%H:%M:%S')}")
             st.info(f"**Page Views This Session:** {st.session_state.get('page_views', 0)}")
         
-        # Auto-refresh option with animated button
-        st.markdown("---")
-        auto_refresh = st.checkbox("🔄 Auto-refresh every 30 seconds")
-        
-        if auto_refresh:
-            st.markdown('<button class="refresh-button">🔄 Auto-Refreshing...</button>', unsafe_allow_html=True)
-            import time
-            time.sleep(30)
-            st.experimental_rerun()
-    
     except Exception as e:
         st.error(f"Analytics dashboard error: {str(e)}")
         st.info("Please check if all required files are properly created.")
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from utils.admission import AdmissionController
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+def start_waiter(controller, memory, admitted):
+    def run():
+        ticket = controller.acquire(memory, poll_seconds=0.01)
+        admitted.append(memory)
+        controller.release(ticket)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_running_stages_are_capped():
+    controller = AdmissionController(max_running=1, memory_limit=1000)
+    ticket = controller.acquire(10)
+    admitted = []
+    thread = start_waiter(controller, 10, admitted)
+    wait_until(lambda: controller.stats()["queued"] == 1)
+    assert admitted == []
+
+    controller.release(ticket)
+    thread.join(5)
+    assert admitted == [10]
+    assert controller.stats()["running"] == 0
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    controller = AdmissionController(max_running=2, memory_limit=100)
+    ticket = controller.acquire(60)
+    admitted = []
+    # The large stage arrives first; the small one would fit now but must not overtake it
+    large = start_waiter(controller, 80, admitted)
+    wait_until(lambda: controller.stats()["queued"] == 1)
+    small = start_waiter(controller, 10, admitted)
+    wait_until(lambda: controller.stats()["queued"] == 2)
+    time.sleep(0.05)
+    assert admitted == []
+
+    controller.release(ticket)
+    large.join(5)
+    small.join(5)
+    assert admitted == [80, 10]
+
+
+def test_stage_over_the_memory_limit_runs_alone():
+    controller = AdmissionController(max_running=4, memory_limit=100)
+    ticket = controller.acquire(500)
+    assert controller.stats()["reserved_bytes"] == 500
+    controller.release(ticket)
+
+
+def test_failing_wait_callback_leaves_the_queue():
+    controller = AdmissionController(max_running=1, memory_limit=100)
+    ticket = controller.acquire(10)
+    positions = []
+
+    def cancel(position):
+        positions.append(position)
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        controller.acquire(10, wait=cancel)
+    assert positions == [1]
+    assert controller.stats()["queued"] == 0
+
+    controller.release(ticket)
+    with controller.slot(10):
+        assert controller.stats()["running"] == 1
+    assert controller.stats()["running"] == 0
@@ -0,0 +1,33 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from utils.match_table import (build_match_table, match_table_to_excel, merge_uploaded_confirmations,
+                               normalize_confirmations, score_column)
+
+
+def test_confirmation_answers_are_normalized():
+    answers = [1, 1.0, np.float64(1), "1", " yes", "y", True, 0, 0.0, np.nan, "No", 1.5, None]
+    assert list(normalize_confirmations(answers)) == ["Yes"] * 7 + ["No"] * 6
+
+
+def test_score_column_keeps_fractional_scores():
+    assert score_column(pd.Series([100, 85, None])).dtype == np.int16
+    fractional = score_column(pd.Series([99.5, 80]))
+    assert fractional.dtype == np.float32
+    assert fractional.iloc[0] == 99.5
+
+
+def test_excel_round_trip_applies_numeric_confirmations():
+    df = build_match_table([["ABC TRADERS", "Abc Traders", 100, "Yes"], ["SHREE STEEL", "Shree Steels", 70, "No"]])
+    uploaded = pd.read_excel(io.BytesIO(match_table_to_excel(df)))
+    # A blank cell makes pandas read the column back as floats (1.0)
+    uploaded['Manual Confirmation'] = [np.nan, 1]
+    buffer = io.BytesIO()
+    uploaded.to_excel(buffer, index=False)
+    buffer.seek(0)
+
+    applied, unmatched = merge_uploaded_confirmations(df, pd.read_excel(buffer))
+    assert applied == 2 and unmatched.empty
+    assert list(df['Manual Confirmation']) == ["No", "Yes"]
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from utils import tfidf
+from utils.match_table import HIGH_SCORE_CUTOFF
+from utils.matching import assign_matches, score_candidates
+from utils.scorers import TfidfCosineScorer, get_scorer
+
+WORDS = ["SHREE", "GANESH", "TRADERS", "AGENCIES", "INDIA", "STEEL", "PVT", "LTD", "KRISHNA", "MOTORS"]
+
+
+def random_names(count, seed):
+    rng = random.Random(seed)
+    names = {" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) + f" {rng.randint(0, 9)}"
+             for _ in range(count * 3)}
+    return sorted(names)[:count]
+
+
+def exhaustive_top(queries, choices, scorer, k):
+    """Reference top-k: every score, best first, earliest choice winning ties"""
+    scores = [row for _, block in scorer.score_blocks(queries, choices) for row in block.tolist()]
+    top = {}
+    for q_index, query in enumerate(queries):
+        ranked = sorted(range(len(choices)), key=lambda c_index: (-scores[q_index][c_index], c_index))[:k]
+        top[query] = [(choices[c_index], scores[q_index][c_index]) for c_index in ranked]
+    columns = {}
+    for c_index, choice in enumerate(choices):
+        ranked = sorted(range(len(queries)), key=lambda q_index: (-scores[q_index][c_index], q_index))[:k]
+        columns[choice] = [(queries[q_index], scores[q_index][c_index]) for q_index in ranked]
+    return top, columns
+
+
+@pytest.mark.parametrize("scorer_name", ["ratio", "token_set"])
+def test_top_k_matches_exhaustive_ranking(scorer_name):
+    # More GSTR names than one scoring block, with plenty of tied scores
+    gstr, tally = random_names(70, seed=1), random_names(45, seed=2)
+    scorer = get_scorer(scorer_name)
+    candidates = score_candidates(tally, gstr, k=5, scorer=scorer)
+    gstr_top, tally_top = exhaustive_top(candidates.gstr_keys, candidates.tally_keys, scorer, 5)
+    assert candidates.gstr_top == gstr_top
+    assert candidates.tally_top == tally_top
+
+
+@pytest.mark.skipif(not tfidf.tfidf_available(), reason="TF-IDF needs scipy")
+def test_top_k_across_tfidf_blocks():
+    gstr, tally = random_names(60, seed=3), random_names(40, seed=4)
+    scorer = TfidfCosineScorer(max_block_cells=200)
+    candidates = score_candidates(tally, gstr, k=3, scorer=scorer)
+    gstr_top, tally_top = exhaustive_top(candidates.gstr_keys, candidates.tally_keys, scorer, 3)
+    assert candidates.gstr_top == gstr_top
+    assert candidates.tally_top == tally_top
+
+
+def test_fewer_choices_than_k():
+    candidates = score_candidates(["ABC TRADERS"], ["ABC TRADERS", "XYZ LTD"], k=5)
+    assert [name for name, _ in candidates.gstr_top["ABC TRADERS"]] == ["ABC TRADERS"]
+    assert len(candidates.tally_top["ABC TRADERS"]) == 2
+
+
+def test_assignment_confirms_only_high_scores():
+    candidates = score_candidates(["ABC TRADERS", "SHREE STEEL"], ["ABC TRADERS", "SHREE STEEL INDUSTRIES"], k=5)
+    rows = {(gstr, tally): (score, confirm) for gstr, tally, score, confirm in assign_matches(candidates, 50)}
+    assert rows[("ABC TRADERS", "ABC TRADERS")] == (100, "Yes")
+    score, confirm = rows[("SHREE STEEL INDUSTRIES", "SHREE STEEL")]
+    assert 50 <= score < HIGH_SCORE_CUTOFF and confirm == "No"
+
+
+def test_threshold_leaves_names_unmatched():
+    candidates = score_candidates(["ABC TRADERS"], ["XYZ MOTORS"], k=5)
+    rows = assign_matches(candidates, 90)
+    assert sorted(rows) == [["", "ABC TRADERS", 0, "No"], ["XYZ MOTORS", "", 0, "No"]]
@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+from utils.pipeline import ReconciliationPipeline
+from utils.pipeline_state import PipelineManifest, hash_dataframe
+from utils.schema import enforce_schema
+
+
+def invoice_frame(rows):
+    return pd.DataFrame(rows, columns=[
+        'GSTIN of supplier', 'Supplier', 'Invoice number', 'Invoice Date',
+        'Taxable Value', 'Integrated Tax', 'Central Tax', 'State/UT tax', 'Cess'
+    ])
+
+
+TALLY = invoice_frame([
+    ['27AAA', 'Abc Traders', 'T1', '01-04-2024', 1000.10, 180.02, 0, 0, 0],
+    ['27AAA', 'ABC Trader', 'T2', '02-04-2024', 500, 90, 0, 0, 0],
+    ['29BBB', 'Shree Steel', 'T3', '05-04-2024', 200, 0, 18, 18, 0],
+    ['No GSTIN', 'Krishna Motors', 'T4', '07-04-2024', 300.33, 0, 27.03, 27.03, 1],
+    ['No GSTIN', 'Krishna Motor', 'T5', '08-04-2024', 100, 0, 9, 9, 0],
+])
+
+GSTR = invoice_frame([
+    ['27AAA', 'ABC TRADERS', 'T1', '01-04-2024', 1000.10, 180.02, 0, 0, 0],
+    ['27AAA', 'ABC TRADERS', 'T2', '02-04-2024', 500, 90.5, 0, 0, 0],
+    ['29BBB', 'SHREE STEEL', 'T3', '05-04-2024', 200, 0, 18, 18, 0],
+    ['No GSTIN', 'KRISHNA MOTORS', 'T4', '07-04-2024', 300.33, 0, 27.03, 27.03, 1],
+])
+
+
+def matches(confirmations):
+    return pd.DataFrame({
+        'GSTR-2A Party': ['ABC TRADERS', 'ABC TRADERS', 'SHREE STEEL', 'KRISHNA MOTORS', 'KRISHNA MOTORS'],
+        'Tally Party': ['Abc Traders', 'ABC Trader', 'Shree Steel', 'Krishna Motors', 'Krishna Motor'],
+        'Manual Confirmation': confirmations,
+    })
+
+
+def run_full(workbook_path, confirmations, fixed_point, tolerance):
+    """Every stage from scratch; returns the pipeline, manifest and stage outputs"""
+    pipeline = ReconciliationPipeline(workbook_path)
+    manifest = PipelineManifest(workbook_path)
+    df_replaced, _ = pipeline.replace_names(TALLY.copy(), matches(confirmations))
+    manifest.record_stage('name_replacement', {'Tally_Replaced': df_replaced})
+    df_gstr, df_tally = enforce_schema(GSTR.copy()), enforce_schema(df_replaced.copy())
+    gst = pipeline.reconcile_gst(df_gstr, df_tally, 'Tally_Replaced', fixed_point, tolerance)
+    manifest.record_stage('gst_reconciliation', gst)
+    invoices = pipeline.reconcile_invoices(df_gstr.copy(), df_tally.copy(), 'Tally_Replaced', fixed_point, tolerance)
+    manifest.record_stage('invoice_reconciliation', {'Invoice_Recon': invoices})
+    return pipeline, manifest, df_replaced, gst, invoices
+
+
+def assert_same(incremental, full):
+    pd.testing.assert_frame_equal(incremental.reset_index(drop=True), full.reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_incremental_update_matches_full_recompute(tmp_path, fixed_point):
+    workbook_path = str(tmp_path / "work.xlsx")
+    before = ["Yes", "No", "Yes", "Yes", "No"]
+    after = ["Yes", "Yes", "No", "Yes", "Yes"]
+    pipeline, manifest, _, _, _ = run_full(workbook_path, before, fixed_point, 1.0)
+
+    df_replaced, mask, names = pipeline.update_names(manifest, matches(after))
+    manifest.record_stage('name_replacement', {'Tally_Replaced': df_replaced})
+    assert manifest.stale_stages() == ['gst_reconciliation', 'invoice_reconciliation']
+    gst = pipeline.update_gst(manifest, mask, names)
+    invoices = pipeline.update_invoices(manifest, mask, names)
+
+    _, _, full_replaced, full_gst, full_invoices = run_full(str(tmp_path / "full.xlsx"), after, fixed_point, 1.0)
+    assert_same(df_replaced, full_replaced)
+    for sheet in full_gst:
+        assert_same(gst[sheet], full_gst[sheet])
+    assert_same(invoices, full_invoices)
+
+
+def test_update_needs_the_recorded_artifact(tmp_path):
+    workbook_path = str(tmp_path / "work.xlsx")
+    pipeline, manifest, _, _, _ = run_full(workbook_path, ["Yes"] * 5, False, 1.0)
+    # The workbook now holds a different Tally_Replaced than the artifact produced
+    manifest.record_stage('name_replacement', {'Tally_Replaced': TALLY})
+    assert pipeline.update_names(manifest, matches(["No"] * 5)) is None
+
+
+def test_manifest_tracks_versions_and_staleness(tmp_path):
+    workbook_path = str(tmp_path / "work.xlsx")
+    manifest = PipelineManifest(workbook_path)
+    manifest.record_sheets(['Tally', 'GSTR-2A'])
+    assert manifest.version == 1
+    manifest.record_sheets(['Tally', 'GSTR-2A'])
+    assert manifest.version == 1
+
+    manifest.record_stage('matching', {'GSTR_Tally_Match': matches(["Yes"] * 5)})
+    manifest.record_stage('name_replacement', {'Tally_Replaced': TALLY})
+    assert manifest.is_done('name_replacement') and not manifest.is_done('gst_reconciliation')
+    assert manifest.stale_stages() == []
+
+    manifest.record_stage('matching', {'GSTR_Tally_Match': matches(["No"] * 5)})
+    assert manifest.stale_stages() == ['name_replacement']
+    # An unchanged rerun refreshes the inputs without a new output version
+    manifest.refresh_inputs('name_replacement')
+    assert manifest.stale_stages() == []
+
+    reloaded = PipelineManifest.load(workbook_path)
+    assert reloaded.version == manifest.version
+    assert reloaded.output_hash('name_replacement', 'Tally_Replaced') == hash_dataframe(TALLY)
+
+
+def test_sheets_in_the_upload_count_as_done(tmp_path):
+    manifest = PipelineManifest(str(tmp_path / "work.xlsx"))
+    manifest.record_sheets(['Tally', 'GSTR-2A', 'Tally_Replaced'])
+    assert manifest.is_done('name_replacement')
+    assert not manifest.is_done('invoice_reconciliation')
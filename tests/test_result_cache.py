@@ -0,0 +1,56 @@
+import pandas as pd
+
+from utils.result_cache import ResultCache, cache_key, result_size
+
+
+def test_cache_key_depends_on_every_part():
+    assert cache_key("stage", "abc", {"x": 1}) == cache_key("stage", "abc", {"x": 1})
+    assert cache_key("stage", "abc", {"x": 1}) != cache_key("stage", "abc", {"x": 2})
+
+
+def test_result_size_counts_frames_and_bytes():
+    df = pd.DataFrame({"a": range(100)})
+    assert result_size(df) == int(df.memory_usage(deep=True).sum())
+    assert result_size(b"x" * 1000) == 1000
+    assert result_size({"a": b"x" * 10, "b": [b"y" * 5]}) == 15
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = ResultCache(max_bytes=30)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    cache.put("c", b"c" * 10)
+    assert cache.get("a") is not None
+    cache.put("d", b"d" * 10)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.stats()["bytes"] == 30
+
+
+def test_replacing_a_key_updates_its_size():
+    cache = ResultCache(max_bytes=30)
+    cache.put("a", b"a" * 10)
+    cache.put("a", b"a" * 20)
+    assert cache.stats()["bytes"] == 20
+    assert cache.stats()["entries"] == 1
+
+
+def test_oversized_result_is_not_cached():
+    cache = ResultCache(max_bytes=10)
+    cache.put("small", b"s" * 5)
+    cache.put("big", b"b" * 11)
+    assert cache.get("big") is None
+    assert cache.get("small") is not None
+
+
+def test_get_or_compute_computes_once():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return b"result"
+
+    assert cache.get_or_compute("k", compute) == (b"result", False)
+    assert cache.get_or_compute("k", compute) == (b"result", True)
+    assert len(calls) == 1
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from utils.session_registry import SessionRegistry
+
+
+def test_session_expires_after_ttl():
+    registry = SessionRegistry(ttl_seconds=10)
+    registry.heartbeat("a", "s1", now=100)
+    assert registry.is_active("a", now=109)
+    assert not registry.is_active("a", now=110)
+    assert registry.active_count(now=110) == 0
+
+
+def test_newer_heartbeat_outlives_its_stale_heap_entry():
+    registry = SessionRegistry(ttl_seconds=10)
+    registry.heartbeat("a", "s1", now=100)
+    registry.heartbeat("a", "s1", now=105)
+    # The first heap entry surfaces at 110 but no longer matches the session's expiry
+    assert registry.is_active("a", now=112)
+    assert not registry.is_active("a", now=115)
+
+
+def test_sessions_expire_independently():
+    registry = SessionRegistry(ttl_seconds=10)
+    registry.heartbeat("a", "s1", now=100)
+    registry.heartbeat("b", "s2", now=104)
+    assert registry.active_count(now=111) == 1
+    assert [s["user_id"] for s in registry.snapshot(now=111)] == ["b"]
+
+
+def test_heap_is_compacted_by_repeated_heartbeats():
+    registry = SessionRegistry(ttl_seconds=10)
+    for i in range(1000):
+        registry.heartbeat("a", "s1", now=100 + i * 0.001)
+    assert len(registry._expiry_heap) <= 2 * len(registry._sessions) + 65
+    assert registry.is_active("a", now=109)
+
+
+def test_restore_skips_expired_and_invalid_records():
+    registry = SessionRegistry(ttl_seconds=60)
+    now = datetime(2024, 1, 1, 12, 0).timestamp()
+    registry.restore([
+        {"user_id": "fresh", "last_activity": datetime(2024, 1, 1, 11, 59, 30).isoformat(),
+         "start_time": datetime(2024, 1, 1, 11, 0).isoformat()},
+        {"user_id": "old", "last_activity": datetime(2024, 1, 1, 11, 0).isoformat()},
+        {"user_id": "broken"},
+    ], now=now)
+    assert registry.is_active("fresh", now=now)
+    assert not registry.is_active("old", now=now)
+    assert not registry.is_active("broken", now=now)
+    # The restored session keeps its original expiry
+    assert not registry.is_active("fresh", now=now + 31)
@@ -0,0 +1,89 @@
+import os
+import time
+
+import pytest
+
+from utils.upload_store import UploadStore, UploadQuotaExceeded
+
+
+def make_store(tmp_path, active=(), busy=(), max_bytes=1500, ttl_seconds=60):
+    return UploadStore(
+        root=str(tmp_path),
+        max_bytes=max_bytes,
+        ttl_seconds=ttl_seconds,
+        is_active=lambda owner: owner in active,
+        is_busy=lambda owner: owner in busy,
+    )
+
+
+def test_rerun_reuses_workbook_without_reading(tmp_path):
+    store = make_store(tmp_path)
+    path, digest, written = store.store("a", "f1", lambda: b"a" * 100)
+    assert written and os.path.exists(path)
+
+    def fail():
+        raise AssertionError("upload read again")
+
+    assert store.store("a", "f1", fail) == (path, digest, False)
+
+
+def test_active_owner_is_never_evicted(tmp_path):
+    store = make_store(tmp_path, active={"a", "b"})
+    path_a, _, _ = store.store("a", "f1", lambda: b"a" * 1000)
+    with open(f"{path_a}.manifest.json", "w") as f:
+        f.write("{}")
+
+    with pytest.raises(UploadQuotaExceeded):
+        store.store("b", "f2", lambda: b"b" * 1000)
+    assert os.path.exists(path_a)
+    assert os.path.exists(f"{path_a}.manifest.json")
+
+
+def test_owner_with_running_job_is_never_evicted(tmp_path):
+    store = make_store(tmp_path, busy={"a"}, ttl_seconds=0)
+    path_a, _, _ = store.store("a", "f1", lambda: b"a" * 1000)
+
+    with pytest.raises(UploadQuotaExceeded):
+        store.store("b", "f2", lambda: b"b" * 1000)
+    assert os.path.exists(path_a)
+
+
+def test_idle_but_present_owner_is_never_evicted(tmp_path):
+    # Owner "a" dropped out of the session registry but kept rerunning within the TTL
+    store = make_store(tmp_path, ttl_seconds=60)
+    path_a, _, _ = store.store("a", "f1", lambda: b"a" * 1000)
+
+    with pytest.raises(UploadQuotaExceeded):
+        store.store("b", "f2", lambda: b"b" * 1000)
+    store.sweep()
+    assert os.path.exists(path_a)
+    assert store.store("a", "f1", lambda: b"")[2] is False
+
+
+def test_idle_owner_is_evicted_and_rewritten_on_return(tmp_path):
+    store = make_store(tmp_path, ttl_seconds=0)
+    path_a, _, _ = store.store("a", "f1", lambda: b"a" * 1000)
+    with open(f"{path_a}.manifest.json", "w") as f:
+        f.write("{}")
+
+    path_b, _, written = store.store("b", "f2", lambda: b"b" * 1000)
+    assert written and os.path.exists(path_b)
+    assert not os.path.exists(path_a)
+    assert not os.path.exists(f"{path_a}.manifest.json")
+
+    # The returning owner gets a fresh copy and is told so
+    assert store.store("a", "f1", lambda: b"a" * 1000)[2] is True
+
+
+def test_sweep_removes_expired_owners_only(tmp_path):
+    store = make_store(tmp_path, active={"b"}, ttl_seconds=60, max_bytes=10000)
+    path_a, _, _ = store.store("a", "f1", lambda: b"a" * 10)
+    path_b, _, _ = store.store("b", "f2", lambda: b"b" * 10)
+
+    store.sweep(now=time.time() + 30)
+    assert os.path.exists(path_a) and os.path.exists(path_b)
+
+    store.sweep(now=time.time() + 120)
+    assert not os.path.exists(path_a)
+    assert os.path.exists(path_b)
+    assert store.stats()["workbooks"] == 1
@@ -0,0 +1,146 @@
+import itertools
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# CPU-bound stages allowed to run at once across every session of this process
+MAX_RUNNING_JOBS = os.cpu_count() or 1
+
+# Memory reserved by a heavy stage unless it asks for more
+JOB_MEMORY_BUDGET = 128 * 1024 * 1024
+
+# Bytes per cell of a dense TF-IDF similarity block: the densified queries,
+# the float64 product and the partition copy taken for the shortlist
+BLOCK_BYTES_PER_CELL = 32
+
+# Loaded sheets take several times the size of the compressed .xlsx
+WORKBOOK_MEMORY_FACTOR = 20
+
+# Grouping and joining loaded frames takes a few copies of them
+FRAME_MEMORY_FACTOR = 4
+
+
+def physical_memory():
+    """Installed memory in bytes, or None where the platform does not report it"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Total memory heavy stages may reserve together: half of the machine
+MEMORY_LIMIT = (physical_memory() or 8 * 1024 ** 3) // 2
+
+
+def block_cells(memory=JOB_MEMORY_BUDGET):
+    """Largest dense similarity block, in cells, that fits in a memory budget"""
+    return max(1, memory // BLOCK_BYTES_PER_CELL)
+
+
+def workbook_memory(workbook_path):
+    """Memory to reserve for a stage that loads a workbook, at least the job budget"""
+    try:
+        size = os.path.getsize(workbook_path)
+    except OSError:
+        return JOB_MEMORY_BUDGET
+    return max(JOB_MEMORY_BUDGET, size * WORKBOOK_MEMORY_FACTOR)
+
+
+def frames_memory(*frames):
+    """Memory to reserve for a stage working on already loaded frames, at least the job budget"""
+    size = sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+    return max(JOB_MEMORY_BUDGET, size * FRAME_MEMORY_FACTOR)
+
+
+class AdmissionController:
+    """Process-wide FIFO queue in front of CPU-bound stages.
+
+    Each heavy stage takes a slot before it starts and gives it back when it
+    ends. At most max_running stages hold a slot at once and their memory
+    reservations stay within memory_limit; a stage larger than the limit is
+    still admitted once nothing else runs, so it cannot wait forever.
+    Waiters are admitted strictly in arrival order, so a large stage at the
+    head of the queue is not starved by smaller ones behind it.
+    """
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, memory_limit=MEMORY_LIMIT):
+        self.max_running = max_running
+        self.memory_limit = memory_limit
+        self.admitted = 0
+        self._tickets = itertools.count(1)
+        self._queue = deque()
+        self._running = {}
+        self._condition = threading.Condition()
+
+    def _can_admit_locked(self, ticket, memory):
+        if not self._queue or self._queue[0] != ticket:
+            return False
+        if len(self._running) >= self.max_running:
+            return False
+        reserved = sum(self._running.values())
+        return not self._running or reserved + memory <= self.memory_limit
+
+    def acquire(self, memory=JOB_MEMORY_BUDGET, wait=None, poll_seconds=0.5):
+        """Block until the stage may run and return its ticket.
+
+        wait(position) is called outside the lock while the stage is queued,
+        with its 1-based place in line; an exception raised there (e.g. a
+        cancelled job) leaves the queue and propagates.
+        """
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._condition:
+                    if self._can_admit_locked(ticket, memory):
+                        self._queue.popleft()
+                        self._running[ticket] = memory
+                        self.admitted += 1
+                        # The next waiter may fit alongside this one
+                        self._condition.notify_all()
+                        return ticket
+                    position = self._queue.index(ticket) + 1
+                if wait is not None:
+                    wait(position)
+                with self._condition:
+                    if not self._can_admit_locked(ticket, memory):
+                        self._condition.wait(poll_seconds)
+        except BaseException:
+            with self._condition:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._condition.notify_all()
+            raise
+
+    def release(self, ticket):
+        """Give a slot back and wake the queue"""
+        with self._condition:
+            if self._running.pop(ticket, None) is not None:
+                self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, memory=JOB_MEMORY_BUDGET, wait=None):
+        """Hold a slot for the duration of a with block"""
+        ticket = self.acquire(memory, wait)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Running and queued stage counts and reserved memory"""
+        with self._condition:
+            return {
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "reserved_bytes": sum(self._running.values()),
+                "max_running": self.max_running,
+                "memory_limit": self.memory_limit,
+                "admitted": self.admitted
+            }
+
+
+# Global admission queue shared by every session served by this process
+admission = AdmissionController()
@@ -5,13 +5,25 @@ from datetime import datetime, timedelta
 import time
 import uuid
 import hashlib
+import threading
+from utils.session_registry import session_registry
+
+# Minimum seconds between rewrites of the sessions file
+SESSIONS_SNAPSHOT_INTERVAL = 60
+# Seconds a shared summary snapshot is served before it is recomputed
+SUMMARY_CACHE_TTL = 10
 
 class AnalyticsManager:
     def __init__(self):
         self.analytics_file = "data/analytics.json"
         self.sessions_file = "data/sessions.json"
         self.usage_file = "data/usage_stats.json"
+        self.last_sessions_save = 0
+        self.summary_snapshot = None
+        self.summary_snapshot_time = 0
+        self.summary_lock = threading.Lock()
         self.ensure_data_directory()
+        self.restore_active_sessions()
         self.init_session()
     
     def ensure_data_directory(self):
@@ -125,41 +137,36 @@ class AnalyticsManager:
         except Exception as e:
             print(f"Error tracking visit: {e}")
     
-    def update_active_sessions(self):
-        """Update active sessions list"""
+    def restore_active_sessions(self):
+        """Seed the in-memory session registry from the sessions file"""
         try:
             sessions = self.load_json(self.sessions_file)
-            current_time = datetime.now()
-            
-            active_sessions = sessions.get("active_sessions", [])
-            # Clean old sessions (older than 30 minutes)
-            active_sessions = [
-                session for session in active_sessions
-                if datetime.fromisoformat(session["last_activity"]) > current_time - timedelta(minutes=30)
-            ]
-            
-            user_id = self.get_user_id()
-            session_found = False
-            
-            for session in active_sessions:
-                if session["user_id"] == user_id:
-                    session["last_activity"] = current_time.isoformat()
-                    session_found = True
-                    break
-            
-            if not session_found:
-                active_sessions.append({
-                    "user_id": user_id,
-                    "session_id": st.session_state.session_id,
-                    "start_time": st.session_state.session_started.isoformat(),
-                    "last_activity": current_time.isoformat()
-                })
-            
-            sessions["active_sessions"] = active_sessions
-            self.save_json(self.sessions_file, sessions)
+            session_registry.restore(sessions.get("active_sessions", []))
+        except Exception as e:
+            print(f"Error restoring sessions: {e}")
+    
+    def update_active_sessions(self):
+        """Record a heartbeat for the current session"""
+        try:
+            session_registry.heartbeat(
+                self.get_user_id(),
+                st.session_state.get("session_id"),
+                st.session_state.get("session_started")
+            )
+            self.save_active_sessions()
         except Exception as e:
             print(f"Error updating sessions: {e}")
     
+    def save_active_sessions(self, force=False):
+        """Persist the registry snapshot, at most once per snapshot interval"""
+        now = time.time()
+        if not force and now - self.last_sessions_save < SESSIONS_SNAPSHOT_INTERVAL:
+            return
+        self.last_sessions_save = now
+        sessions = self.load_json(self.sessions_file)
+        sessions["active_sessions"] = session_registry.snapshot()
+        self.save_json(self.sessions_file, sessions)
+    
     def track_page_view(self, page_name):
         """Track page view"""
         try:
@@ -208,15 +215,8 @@ class AnalyticsManager:
         """Get comprehensive analytics summary"""
         try:
             analytics = self.load_json(self.analytics_file)
-            sessions = self.load_json(self.sessions_file)
             usage = self.load_json(self.usage_file)
-            
-            current_time = datetime.now()
-            active_sessions = sessions.get("active_sessions", [])
-            active_users = len([
-                s for s in active_sessions
-                if datetime.fromisoformat(s["last_activity"]) > current_time - timedelta(minutes=30)
-            ])
+            active_users = session_registry.active_count()
             
             today = datetime.now().strftime("%Y-%m-%d")
             today_visits = analytics.get("daily_visits", {}).get(today, 0)
@@ -271,11 +271,26 @@ class AnalyticsManager:
             pass
         return 0
     
+    def get_cached_summary(self):
+        """Get the process-wide summary snapshot, refreshed at most once per TTL"""
+        if self.summary_snapshot is None or time.time() - self.summary_snapshot_time >= SUMMARY_CACHE_TTL:
+            with self.summary_lock:
+                # Another session may have refreshed it while we waited
+                if self.summary_snapshot is None or time.time() - self.summary_snapshot_time >= SUMMARY_CACHE_TTL:
+                    self.summary_snapshot = self.get_analytics_summary()
+                    self.summary_snapshot_time = time.time()
+        
+        summary = dict(self.summary_snapshot)
+        summary["active_users"] = session_registry.active_count()
+        summary["session_duration"] = self.get_session_duration()
+        return summary
+    
     def get_real_time_stats(self):
         """Get real-time statistics"""
         try:
+            self.init_session()
             self.update_active_sessions()
-            return self.get_analytics_summary()
+            return self.get_cached_summary()
         except Exception as e:
             print(f"Error getting real-time stats: {e}")
             return self.get_default_stats()
@@ -0,0 +1,172 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+
+# Ways of writing result sheets into a workbook
+EXPORT_BACKENDS = {
+    "openpyxl": "Standard (openpyxl)",
+    "streaming": "Streaming (write-only, constant memory)"
+}
+
+DEFAULT_BACKEND = "openpyxl"
+
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill("solid", fgColor="3B82F6")
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
+
+# Number format applied to fractional amounts
+AMOUNT_FORMAT = '#,##0.00'
+
+# Input sheets carry a title row above their header
+HEADER_ROWS = {'Tally': 1, 'GSTR-2A': 1}
+
+
+class StreamingSheet:
+    """Write-only worksheet that styles its header and formats amounts.
+
+    Rows are serialized as they are appended, so memory does not grow with
+    the number of rows written.
+    """
+
+    def __init__(self, workbook, title):
+        self.ws = workbook.create_sheet(title)
+        self.header_written = False
+        self.amount_cells = {}
+
+    def append_header(self, columns):
+        """Append a styled header row"""
+        cells = []
+        for col in columns:
+            cell = WriteOnlyCell(self.ws, value=str(col))
+            cell.font = HEADER_FONT
+            cell.fill = HEADER_FILL
+            cell.alignment = HEADER_ALIGNMENT
+            cells.append(cell)
+        self.ws.append(cells)
+        self.header_written = True
+
+    def amount_cell(self, column):
+        """Formatted cell reused for every amount in a column.
+
+        Write-only rows are serialized as soon as they are appended, so one
+        cell per column can carry each row's value in turn.
+        """
+        cell = self.amount_cells.get(column)
+        if cell is None:
+            cell = WriteOnlyCell(self.ws)
+            cell.number_format = AMOUNT_FORMAT
+            self.amount_cells[column] = cell
+        return cell
+
+    def append_row(self, values):
+        """Append a row, formatting floats as amounts"""
+        row = list(values)
+        for i, value in enumerate(row):
+            if isinstance(value, float):
+                cell = self.amount_cell(i)
+                cell.value = value
+                row[i] = cell
+        self.ws.append(row)
+
+    def append_frame(self, df):
+        """Append a frame's rows, writing its header on first use"""
+        if not self.header_written:
+            self.append_header(df.columns)
+        # Convert column by column; NaN and NaT become empty cells
+        columns = [df[col].astype(object).where(df[col].notna(), None).tolist() for col in df.columns]
+        for values in zip(*columns):
+            self.append_row(values)
+
+
+@contextmanager
+def atomic_write(path):
+    """Yield a temporary path next to path and swap it into place once written.
+
+    Readers, e.g. background jobs, see either the old or the new workbook,
+    never a partly written one.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp.xlsx",
+                                    dir=os.path.dirname(path) or None)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def snapshot_workbook(path):
+    """Copy of a workbook that later saves to it cannot change, e.g. for a background job"""
+    fd, snapshot_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".snapshot.xlsx",
+                                         dir=os.path.dirname(path) or None)
+    os.close(fd)
+    shutil.copyfile(path, snapshot_path)
+    return snapshot_path
+
+
+def save_workbook(book, path):
+    """Save an openpyxl workbook atomically"""
+    with atomic_write(path) as tmp_path:
+        book.save(tmp_path)
+
+
+def write_sheets(path, sheets):
+    """Write {sheet_name: DataFrame} to a new workbook in one streaming pass"""
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        StreamingSheet(wb, name).append_frame(df)
+    wb.save(path)
+
+
+def copy_workbook(source_path, dest_path, replacements=None):
+    """Stream a workbook's sheets into a new workbook, replacing some of them.
+
+    Sheets in replacements ({sheet_name: DataFrame}) take the place of the
+    sheet of the same name or are appended after the existing sheets. Copied
+    sheets keep their values; headers are restyled and amounts formatted.
+    """
+    replacements = dict(replacements or {})
+    source = load_workbook(source_path, read_only=True)
+    try:
+        wb = Workbook(write_only=True)
+        for name in source.sheetnames:
+            if name in replacements:
+                StreamingSheet(wb, name).append_frame(replacements.pop(name))
+                continue
+            sheet = StreamingSheet(wb, name)
+            header_row = HEADER_ROWS.get(name, 0)
+            for index, values in enumerate(source[name].iter_rows(values_only=True)):
+                if index == header_row:
+                    sheet.append_header(['' if value is None else value for value in values])
+                else:
+                    sheet.append_row(values)
+        for name, df in replacements.items():
+            StreamingSheet(wb, name).append_frame(df)
+        wb.save(dest_path)
+    finally:
+        source.close()
+
+
+def replace_sheets(path, sheets):
+    """Replace or add sheets in a workbook via a streamed copy swapped into place"""
+    with atomic_write(path) as tmp_path:
+        copy_workbook(path, tmp_path, sheets)
+
+
+def save_sheets(path, sheets, backend=DEFAULT_BACKEND):
+    """Replace or add result sheets in the working workbook with the chosen backend"""
+    if backend == "streaming":
+        replace_sheets(path, sheets)
+        return
+    # Appending rewrites the file, so it works on a copy that replaces the workbook when done
+    with atomic_write(path) as tmp_path:
+        shutil.copyfile(path, tmp_path)
+        with pd.ExcelWriter(tmp_path, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, sheet_name=name, index=False)
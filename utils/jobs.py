@@ -0,0 +1,150 @@
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads shared by every session's background jobs
+MAX_JOB_WORKERS = min(4, os.cpu_count() or 1)
+
+# Finished jobs nobody collected are dropped after this long
+JOB_TTL_SECONDS = 60 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation was requested"""
+
+
+class Job:
+    """One background task with its progress, result and cancellation flag"""
+
+    def __init__(self, job_id, name, owner=None, context=None):
+        self.job_id = job_id
+        self.name = name
+        self.owner = owner
+        # Whatever the submitter needs when it applies the result
+        self.context = context
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def report(self, done, total, message=""):
+        """Progress callback for the task; raises JobCancelled once cancellation is requested"""
+        self.check()
+        self.done, self.total = done, total
+        if message:
+            self.message = message
+
+    def check(self):
+        """Stop the task here if it was cancelled"""
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.name)
+
+    @property
+    def fraction(self):
+        """Completed share of the work, 0.0 to 1.0"""
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def finished(self):
+        """Check whether the job stopped, successfully or not"""
+        return self.status in FINISHED_STATES
+
+
+class JobRunner:
+    """Thread pool with a job table, so long stages run outside the script thread.
+
+    Jobs are polled by id from any rerun. Tasks receive the Job as their
+    first argument and call job.report(done, total) or job.check() to
+    publish progress and honour cancellation. Results are only read back
+    by the session that owns the job, in its own script thread.
+    """
+
+    def __init__(self, max_workers=MAX_JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gst-job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, task, *args, owner=None, context=None, **kwargs):
+        """Queue task(job, *args, **kwargs) and return its job id"""
+        with self._lock:
+            self._sweep_locked(time.time())
+            job = Job(f"job-{next(self._ids)}", name, owner, context)
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, task, args, kwargs)
+        return job.job_id
+
+    def _run(self, job, task, args, kwargs):
+        with self._lock:
+            if job.finished:
+                # Cancelled while queued
+                return
+            job.status = RUNNING
+        try:
+            job.result = task(job, *args, **kwargs)
+            self._finish(job, DONE)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            print(f"Error in background job {job.name}: {e}")
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        with self._lock:
+            job.finished_at = time.time()
+            job.status = status
+
+    def get(self, job_id):
+        """Job by id, or None once it was collected or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; a queued job never starts, a running one stops at its next check"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                job.finished_at = time.time()
+                job.status = CANCELLED
+
+    def collect(self, job_id):
+        """Remove a finished job from the table and return it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return None
+            return self._jobs.pop(job_id)
+
+    def jobs_for(self, owner):
+        """Jobs submitted by one owner, oldest first"""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def _sweep_locked(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at + JOB_TTL_SECONDS <= now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Global runner shared by every session served by this process
+job_runner = JobRunner()
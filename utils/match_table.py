@@ -0,0 +1,136 @@
+import io
+import pandas as pd
+
+# Columns of the match sheet shown to users and saved as 'GSTR_Tally_Match'
+MATCH_COLUMNS = ['GSTR-2A Party', 'Tally Party', 'Score', 'Manual Confirmation']
+
+CONFIRMATION_DTYPE = pd.CategoricalDtype(["Yes", "No"])
+
+# Matches at or above this score are confirmed by default
+HIGH_SCORE_CUTOFF = 80
+
+# Columns identifying a match independently of its row position
+MATCH_KEY = ['GSTR-2A Party', 'Tally Party']
+
+
+def score_column(scores):
+    """Scores as int16, or float32 when a scorer produced fractional scores"""
+    scores = pd.to_numeric(scores).fillna(0)
+    if (scores % 1 == 0).all():
+        return scores.astype('int16')
+    return scores.astype('float32')
+
+
+def build_match_table(results):
+    """Build the columnar match table from (gstr, tally, score, default) rows"""
+    df = pd.DataFrame(results, columns=['GSTR-2A Party', 'Tally Party', 'Score', 'Default Confirmation'])
+    df['Score'] = score_column(df['Score'])
+    df['Default Confirmation'] = df['Default Confirmation'].astype(CONFIRMATION_DTYPE)
+    df['Manual Confirmation'] = df['Default Confirmation'].copy()
+    return df
+
+
+def default_confirmation(gstr_name, tally_name, score):
+    """Default confirmation rule applied to freshly matched pairs"""
+    return "Yes" if gstr_name and tally_name and score >= HIGH_SCORE_CUTOFF else "No"
+
+
+def apply_suggestion(df, gstr_name, tally_name, score):
+    """Pair two names chosen from the suggestions and return the new match table.
+
+    Rows that held either name are replaced by the confirmed pair; names
+    displaced from those rows go back to unmatched rows.
+    """
+    touched = (df['GSTR-2A Party'] == gstr_name) | (df['Tally Party'] == tally_name)
+    new_rows = [[gstr_name, tally_name, score, default_confirmation(gstr_name, tally_name, score), "Yes"]]
+    for other_gstr, other_tally in df.loc[touched, MATCH_KEY].itertuples(index=False):
+        if other_gstr and other_gstr != gstr_name:
+            new_rows.append([other_gstr, '', 0, "No", "No"])
+        if other_tally and other_tally != tally_name:
+            new_rows.append(['', other_tally, 0, "No", "No"])
+    
+    df_new = pd.DataFrame(new_rows, columns=['GSTR-2A Party', 'Tally Party', 'Score',
+                                             'Default Confirmation', 'Manual Confirmation'])
+    df_new = pd.concat([df[~touched], df_new], ignore_index=True)
+    df_new['Score'] = score_column(df_new['Score'])
+    for col in ['Default Confirmation', 'Manual Confirmation']:
+        df_new[col] = df_new[col].astype(str).astype(CONFIRMATION_DTYPE)
+    return df_new
+
+
+def is_paired(df):
+    """Mask of rows where both a GSTR and a Tally name are present"""
+    return (df['GSTR-2A Party'] != '') & (df['Tally Party'] != '')
+
+
+def high_score_mask(df, cutoff=HIGH_SCORE_CUTOFF):
+    """Mask of paired rows scoring at or above the cutoff"""
+    return (df['Score'] >= cutoff) & is_paired(df)
+
+
+def set_confirmations(df, mask, value):
+    """Set the confirmation for every row in a mask"""
+    df.loc[mask, 'Manual Confirmation'] = value
+
+
+def confirmation_text(value):
+    """Text of one answer; whole-number floats read back from Excel (1.0) count as their integer"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def normalize_confirmations(values):
+    """Parse free-text Yes/No answers into the confirmation categorical"""
+    answers = pd.Series(values).map(confirmation_text).str.strip().str.upper()
+    normalized = answers.isin(['YES', 'Y', '1', 'TRUE']).map({True: "Yes", False: "No"})
+    return normalized.astype(CONFIRMATION_DTYPE)
+
+
+def normalize_party_names(values):
+    """Party names as stripped strings, with blanks for missing values"""
+    return pd.Series(values).fillna('').astype(str).str.strip()
+
+
+def merge_uploaded_confirmations(df, df_uploaded):
+    """Apply uploaded confirmations to the match table by party-name key.
+
+    Rows are joined on (GSTR-2A Party, Tally Party), so sorting or filtering
+    the sheet offline does not misapply edits. Returns the number of matches
+    updated and the uploaded rows that did not correspond to any match.
+    """
+    uploaded = pd.DataFrame({col: normalize_party_names(df_uploaded[col]).values for col in MATCH_KEY})
+    uploaded['Manual Confirmation'] = normalize_confirmations(df_uploaded['Manual Confirmation']).values
+    # When a pair appears more than once, the last edit wins
+    uploaded = uploaded.drop_duplicates(subset=MATCH_KEY, keep='last')
+    
+    current = pd.DataFrame({col: normalize_party_names(df[col]).values for col in MATCH_KEY})
+    current['row'] = df.index
+    
+    merged = current.merge(uploaded, on=MATCH_KEY, how='left', indicator=True)
+    applied = merged[merged['_merge'] == 'both']
+    df.loc[applied['row'].values, 'Manual Confirmation'] = applied['Manual Confirmation'].values
+    
+    unmatched = uploaded.merge(current[MATCH_KEY], on=MATCH_KEY, how='left', indicator=True)
+    unmatched = unmatched[unmatched['_merge'] == 'left_only'].drop(columns='_merge')
+    return len(applied), unmatched.reset_index(drop=True)
+
+
+def confirmation_counts(df):
+    """Return (confirmed, total) match counts"""
+    return int((df['Manual Confirmation'] == "Yes").sum()), len(df)
+
+
+def export_match_sheet(df):
+    """Match table in the layout of the 'GSTR_Tally_Match' sheet"""
+    df_export = df[MATCH_COLUMNS].copy()
+    df_export['Manual Confirmation'] = df_export['Manual Confirmation'].astype(str)
+    return df_export
+
+
+def match_table_to_excel(df):
+    """Serialize the match table as a single-sheet workbook"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        export_match_sheet(df).to_excel(writer, sheet_name='Matching_Results', index=False)
+    return output.getvalue()
@@ -0,0 +1,266 @@
+import heapq
+import numpy as np
+from utils import tfidf
+from utils.match_table import HIGH_SCORE_CUTOFF
+from utils.scorers import SCORERS, PairwiseScorer, PhoneticPrefilter, get_scorer
+
+# Candidates kept per name; assignment only needs the best one,
+# the rest are kept for review suggestions
+CANDIDATES_PER_NAME = 5
+
+# Neighbours shortlisted by TF-IDF per name before rescoring
+NN_SHORTLIST = 20
+
+# Engines producing match candidates; the nearest-neighbour engine needs scipy
+MATCH_ENGINES = {"exhaustive": "Exhaustive (every pair)"}
+if tfidf.tfidf_available():
+    MATCH_ENGINES["tfidf_nn"] = "TF-IDF nearest neighbours (large lists)"
+
+DEFAULT_ENGINE = "exhaustive"
+
+
+class MatchCandidates:
+    """Top-k scored candidates for every GSTR and Tally name of an upload.
+
+    Scores do not depend on the match threshold, so the same candidates can
+    be re-assigned for any threshold without scoring again.
+    """
+
+    def __init__(self, tally_list, gstr_list, k=CANDIDATES_PER_NAME):
+        self.k = k
+        self.tally_upper = {name.upper(): name for name in tally_list}
+        self.gstr_upper = {name.upper(): name for name in gstr_list}
+        self.tally_keys = list(self.tally_upper.keys())
+        self.gstr_keys = list(self.gstr_upper.keys())
+        # name -> [(candidate, score), ...] best first
+        self.gstr_top = {}
+        self.tally_top = {}
+
+
+def scorers_for(engine=DEFAULT_ENGINE):
+    """Names of the registered scorers an engine can score with"""
+    if engine == "tfidf_nn":
+        return [name for name, scorer in SCORERS.items() if isinstance(scorer, PairwiseScorer)]
+    return list(SCORERS)
+
+
+def engine_scorer(scorer=None, engine=DEFAULT_ENGINE):
+    """The scorer an engine actually scores with.
+
+    The nearest-neighbour engine shortlists by TF-IDF already, so a phonetic
+    prefilter is unwrapped to its base scorer, and the shortlist can only be
+    rescored pair by pair.
+    """
+    scorer = scorer or get_scorer()
+    if engine != "tfidf_nn":
+        return scorer
+    if isinstance(scorer, PhoneticPrefilter):
+        scorer = scorer.base
+    if not isinstance(scorer, PairwiseScorer):
+        raise ValueError(f"The nearest-neighbour engine needs a pairwise scorer, not '{scorer.label}'")
+    return scorer
+
+
+def _push_candidate(heap, k, entry):
+    """Keep the k best (score, -index, name) entries in a min-heap"""
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+def _ranked(heap):
+    """Heap entries as [(name, score)] best first, earliest name winning ties"""
+    return [(name, score) for score, _, name in sorted(heap, reverse=True)]
+
+
+def _rank_keys(scores, positions, n):
+    """Sortable int64 keys: higher score first, then the earliest position as in extractOne"""
+    return scores * (n + 1) + (n - 1 - positions)
+
+
+def _top_keys(keys, k, axis):
+    """The k largest keys along an axis, best first"""
+    if keys.shape[axis] > k:
+        keys = np.take_along_axis(keys, np.argpartition(-keys, k - 1, axis=axis).take(range(k), axis=axis), axis=axis)
+    return -np.sort(-keys, axis=axis)
+
+
+def _ranked_keys(keys, names, n):
+    """Decode a row of rank keys into [(name, score), ...] best first"""
+    return [(names[n - 1 - int(key % (n + 1))], int(key // (n + 1))) for key in keys]
+
+
+def score_candidates(tally_list, gstr_list, k=CANDIDATES_PER_NAME, progress=None, scorer=None):
+    """Score every GSTR/Tally pair once and keep the top-k candidates per name.
+
+    With the default 'ratio' scorer names are compared the way
+    process.extractOne(scorer=fuzz.ratio) does, so the best candidate for a
+    name is the match extractOne would return. Scores arrive a block of GSTR
+    rows at a time from the scorer's batch API; the top-k of each row is
+    taken with argpartition and each Tally column keeps a running top-k, so
+    memory stays at one block plus O((G + T) * k).
+    """
+    scorer = scorer or get_scorer()
+    candidates = MatchCandidates(tally_list, gstr_list, k)
+    gstr_keys, tally_keys = candidates.gstr_keys, candidates.tally_keys
+    n_gstr, n_tally = len(gstr_keys), len(tally_keys)
+    if not n_gstr or not n_tally:
+        candidates.gstr_top = {name: [] for name in gstr_keys}
+        candidates.tally_top = {name: [] for name in tally_keys}
+        return candidates
+
+    row_k, column_k = min(k, n_tally), min(k, n_gstr)
+    tally_positions = np.arange(n_tally)
+    column_best = np.empty((0, n_tally), dtype=np.int64)
+    for start, block in scorer.score_blocks(gstr_keys, tally_keys):
+        block = np.asarray(block, dtype=np.int64)
+        stop = start + block.shape[0]
+
+        row_best = _top_keys(_rank_keys(block, tally_positions, n_tally), row_k, axis=1)
+        for offset, keys in enumerate(row_best):
+            candidates.gstr_top[gstr_keys[start + offset]] = _ranked_keys(keys, tally_keys, n_tally)
+
+        gstr_positions = np.arange(start, stop)[:, None]
+        column_keys = _rank_keys(block, gstr_positions, n_gstr)
+        column_best = _top_keys(np.vstack([column_best, column_keys]), column_k, axis=0)
+
+        if progress:
+            progress(stop, n_gstr)
+
+    for t_index, tally_name in enumerate(tally_keys):
+        candidates.tally_top[tally_name] = _ranked_keys(column_best[:, t_index], gstr_keys, n_gstr)
+
+    return candidates
+
+
+def _rescore_neighbours(queries, choices, scorer, k, progress=None, done=0, total=0,
+                        max_block_cells=tfidf.MAX_BLOCK_CELLS):
+    """Shortlist choices per query by TF-IDF cosine and rescore the shortlist.
+
+    Returns {query: [(choice, score), ...]} best first, with ties going to
+    the earliest choice as in the exhaustive engine.
+    """
+    top = {}
+    if not queries:
+        return top
+    prepared_queries = scorer.prepare(queries)
+    prepared_choices = scorer.prepare(choices)
+    query_matrix, choice_matrix = tfidf.vectorize_pair(prepared_queries, prepared_choices)
+
+    for start, neighbours in tfidf.nearest_neighbours(query_matrix, choice_matrix, NN_SHORTLIST,
+                                                        max_block_cells):
+        for offset, row in enumerate(neighbours):
+            q_index = start + offset
+            heap = []
+            for c_index in row.tolist():
+                score = scorer.similarity(prepared_queries[q_index], prepared_choices[c_index])
+                _push_candidate(heap, k, (score, -c_index, choices[c_index]))
+            top[queries[q_index]] = _ranked(heap)
+
+        if progress:
+            progress(done + start + len(neighbours), total)
+
+    return top
+
+
+def score_candidates_nn(tally_list, gstr_list, k=CANDIDATES_PER_NAME, progress=None, scorer=None,
+                        max_block_cells=tfidf.MAX_BLOCK_CELLS):
+    """Top-k candidates from a TF-IDF nearest-neighbour shortlist.
+
+    Names are vectorized into character-trigram TF-IDF rows; the nearest
+    NN_SHORTLIST neighbours of every name are found with chunked sparse
+    matrix products and only those pairs are rescored with the pairwise
+    scorer (fuzz.ratio by default). Each direction is shortlisted
+    separately, so both GSTR and Tally names get their own candidates.
+    max_block_cells bounds the dense similarity blocks.
+    """
+    scorer = engine_scorer(scorer, "tfidf_nn")
+    candidates = MatchCandidates(tally_list, gstr_list, k)
+    gstr_keys, tally_keys = candidates.gstr_keys, candidates.tally_keys
+    total = len(gstr_keys) + len(tally_keys)
+
+    candidates.gstr_top = _rescore_neighbours(gstr_keys, tally_keys, scorer, k, progress, 0, total,
+                                              max_block_cells)
+    candidates.tally_top = _rescore_neighbours(tally_keys, gstr_keys, scorer, k, progress, len(gstr_keys), total,
+                                               max_block_cells)
+    return candidates
+
+
+def build_candidates(tally_list, gstr_list, engine=DEFAULT_ENGINE, k=CANDIDATES_PER_NAME, progress=None, scorer=None,
+                     max_block_cells=tfidf.MAX_BLOCK_CELLS):
+    """Build match candidates with the chosen engine"""
+    if engine == "tfidf_nn":
+        return score_candidates_nn(tally_list, gstr_list, k, progress, scorer, max_block_cells)
+    return score_candidates(tally_list, gstr_list, k, progress, scorer)
+
+
+def suggest_alternatives(candidates, gstr_name, tally_name):
+    """Ranked alternative partners for a match row from the cached candidates.
+
+    Rows with a GSTR name get Tally suggestions; Tally-only rows get GSTR
+    suggestions. The row's current partner is left out. Returns a list of
+    (real_name, score) pairs, best first.
+    """
+    if gstr_name:
+        ranked = candidates.gstr_top.get(str(gstr_name).upper(), [])
+        real_names, current = candidates.tally_upper, tally_name
+    else:
+        ranked = candidates.tally_top.get(str(tally_name).upper(), [])
+        real_names, current = candidates.gstr_upper, gstr_name
+    return [
+        (real_names[name], score) for name, score in ranked
+        if real_names[name] != current
+    ]
+
+
+def assign_matches(candidates, threshold):
+    """Two-way assignment of matches from cached candidates.
+
+    GSTR names claim their best Tally candidate first, then the remaining
+    Tally names claim their best GSTR candidate, each only if the score
+    reaches the threshold and the candidate is still unclaimed.
+    """
+    match_map, used_tally, used_gstr = {}, set(), set()
+
+    # GSTR to Tally matching
+    for gstr_name in candidates.gstr_keys:
+        best_match, score = (candidates.gstr_top.get(gstr_name) or [(None, 0)])[0]
+        gstr_real = candidates.gstr_upper[gstr_name]
+
+        if best_match and score >= threshold and best_match not in used_tally:
+            tally_real = candidates.tally_upper[best_match]
+            match_map[(gstr_real, tally_real)] = (gstr_real, tally_real, score)
+            used_gstr.add(gstr_name)
+            used_tally.add(best_match)
+        else:
+            match_map[(gstr_real, '')] = (gstr_real, '', 0)
+            used_gstr.add(gstr_name)
+
+    # Tally to GSTR matching
+    for tally_name in candidates.tally_keys:
+        if tally_name in used_tally:
+            continue
+
+        best_match, score = (candidates.tally_top.get(tally_name) or [(None, 0)])[0]
+        tally_real = candidates.tally_upper[tally_name]
+
+        if best_match and score >= threshold and best_match not in used_gstr:
+            gstr_real = candidates.gstr_upper[best_match]
+            match_map[(gstr_real, tally_real)] = (gstr_real, tally_real, score)
+            used_tally.add(tally_name)
+            used_gstr.add(best_match)
+        else:
+            match_map[('', tally_real)] = ('', tally_real, 0)
+            used_tally.add(tally_name)
+
+    results = []
+    for gstr_name, tally_name, score in match_map.values():
+        # Set default confirmation based on match quality
+        if gstr_name and tally_name and score >= HIGH_SCORE_CUTOFF:
+            confirm = "Yes"
+        else:
+            confirm = "No"
+        results.append([gstr_name, tally_name, score, confirm])
+
+    return results
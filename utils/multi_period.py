@@ -0,0 +1,140 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from utils.reconciliation import INVOICE_KEY, clean_invoice_frame, reconcile_invoices
+from utils.schema import read_sheet
+
+# Invoices are split into this many GSTIN partitions for reconciliation
+DEFAULT_PARTITIONS = 16
+
+# Worker processes for loading period files and reconciling partitions;
+# openpyxl parsing and pandas grouping hold the GIL, so threads would not overlap
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+PERIOD_FORMAT = '%Y-%m'
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def process_pool():
+    """Worker process pool shared by every session, started on first use.
+
+    Workers are spawned rather than forked, as forking the multi-threaded
+    server process can leave locks held in the child. They stay alive
+    between runs, so only the first run pays for starting them.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or getattr(_pool, '_broken', False):
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def invoice_months(dates):
+    """Invoice dates as YYYY-MM period labels, NaN where the date is unreadable"""
+    return pd.to_datetime(dates, errors='coerce', dayfirst=True).dt.strftime(PERIOD_FORMAT)
+
+
+def period_label(df, fallback):
+    """Return period of a monthly GSTR-2A file: its most common invoice month"""
+    if 'Invoice Date' in df.columns:
+        months = invoice_months(df['Invoice Date']).dropna()
+        if not months.empty:
+            return months.mode().iloc[0]
+    return fallback
+
+
+def load_gstr_period(file_name, content):
+    """Load the GSTR-2A sheet of one monthly file and tag it with its return period"""
+    df = read_sheet(io.BytesIO(content), 'GSTR-2A', 1)
+    df = clean_invoice_frame(df)
+    df['Return Period'] = period_label(df, os.path.splitext(file_name)[0])
+    return df
+
+
+def load_gstr_periods(files):
+    """Load monthly GSTR-2A files in parallel worker processes.
+
+    files is a list of (file_name, bytes). Returns the combined GSTR frame
+    and a per-file summary of periods and row counts.
+    """
+    frames = list(process_pool().map(load_gstr_period, [name for name, _ in files], [data for _, data in files]))
+
+    df_periods = pd.DataFrame({
+        'File': [name for name, _ in files],
+        'Return Period': [df['Return Period'].iloc[0] if len(df) else '' for df in frames],
+        'Rows': [len(df) for df in frames]
+    })
+    return pd.concat(frames, ignore_index=True), df_periods
+
+
+def gstin_partition(df, partitions):
+    """Stable partition number of every row, hashed on GSTIN"""
+    hashes = pd.util.hash_pandas_object(df['GSTIN of supplier'].astype(str), index=False)
+    return hashes.values % partitions
+
+
+def split_by_gstin(df, partitions):
+    """Split a frame into {partition: rows} by GSTIN hash"""
+    return {key: part for key, part in df.groupby(gstin_partition(df, partitions))}
+
+
+def reconcile_partition(df_gstr, df_tally):
+    """Invoice reconciliation of one partition with cross-period flags.
+
+    An invoice is cross-period when it is on both sides and its GSTR-2A
+    return period differs from the month of the Tally invoice date, or it
+    was reported in more than one return period.
+    """
+    df_combined = reconcile_invoices(df_gstr, df_tally)
+
+    gstr_periods = (df_gstr[INVOICE_KEY + ['Return Period']]
+                    .drop_duplicates()
+                    .sort_values('Return Period')
+                    .groupby(INVOICE_KEY, observed=True)['Return Period']
+                    .agg(', '.join)
+                    .rename('GSTR Return Period'))
+    tally_dates = df_tally['Invoice Date'] if 'Invoice Date' in df_tally.columns else pd.Series(index=df_tally.index)
+    tally_periods = (df_tally.assign(**{'Tally Period': invoice_months(tally_dates)})
+                     .groupby(INVOICE_KEY, observed=True)['Tally Period']
+                     .first())
+
+    df_combined = df_combined.join(gstr_periods, on=INVOICE_KEY).join(tally_periods, on=INVOICE_KEY)
+    on_both_sides = df_combined['GSTR Return Period'].notna() & df_combined['Tally Period'].notna()
+    in_several_returns = df_combined['GSTR Return Period'].str.contains(', ', regex=False).fillna(False).astype(bool)
+    cross_period = (on_both_sides & (df_combined['GSTR Return Period'] != df_combined['Tally Period'])) | in_several_returns
+    df_combined['Cross Period'] = cross_period.map({True: 'Yes', False: 'No'})
+    return df_combined
+
+
+def reconcile_periods(df_gstr, df_tally, partitions=DEFAULT_PARTITIONS, progress=None):
+    """Reconcile invoices partition by partition in worker processes.
+
+    Both sides are partitioned by the same GSTIN hash, so every invoice key
+    lands in exactly one partition and the partition results concatenate
+    into the consolidated Invoice_Recon.
+    """
+    gstr_parts = split_by_gstin(df_gstr, partitions)
+    tally_parts = split_by_gstin(df_tally, partitions)
+    keys = sorted(set(gstr_parts) | set(tally_parts))
+
+    futures = {
+        process_pool().submit(reconcile_partition, gstr_parts.get(key, df_gstr.iloc[0:0]),
+                              tally_parts.get(key, df_tally.iloc[0:0])): key
+        for key in keys
+    }
+    results = {}
+    for done, future in enumerate(as_completed(futures), 1):
+        results[futures[future]] = future.result()
+        if progress:
+            progress(done, len(keys))
+
+    if not results:
+        return reconcile_partition(df_gstr, df_tally)
+    df_combined = pd.concat([results[key] for key in keys], ignore_index=True)
+    return df_combined.sort_values('GSTIN of supplier', kind='stable', ignore_index=True)
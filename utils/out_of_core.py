@@ -0,0 +1,186 @@
+import os
+import glob
+import itertools
+import shutil
+import tempfile
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from utils.excel_export import StreamingSheet
+from utils.schema import enforce_schema
+from utils.reconciliation import (clean_invoice_frame, reconcile_invoices, amounts_to_rupees,
+                                  gst_columns, gst_rows, group_gst, gst_results, gst_totals, gst_summary)
+
+# Rows read from a sheet before they are spilled to disk
+CHUNK_ROWS = 50_000
+
+# Partitions spilled per input; memory is bounded by the largest partition
+DEFAULT_PARTITIONS = 64
+
+
+def iter_sheet_chunks(path, sheet_name, header_row, chunk_rows=CHUNK_ROWS):
+    """Stream a worksheet as DataFrame chunks without loading the whole workbook.
+
+    header_row is the 0-based row holding column names, as in
+    pd.read_excel(header=...). Blank header cells are named like pandas
+    does ('Unnamed: i').
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        for _ in range(header_row):
+            next(rows, None)
+        header = next(rows, None) or ()
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row[:len(columns)])
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        wb.close()
+
+
+def partition_of(keys, partitions):
+    """Stable partition number of every key"""
+    return pd.util.hash_pandas_object(keys.astype(str), index=False).values % partitions
+
+
+class SpillStore:
+    """Partitioned chunks spilled to a temporary directory.
+
+    Each chunk is split by partition and written as its own pickle, so
+    spilling never holds more than one chunk in memory; reading a partition
+    concatenates only that partition's pieces.
+    """
+
+    def __init__(self, partitions=DEFAULT_PARTITIONS):
+        self.partitions = partitions
+        self.directory = tempfile.mkdtemp(prefix="gst_spill_")
+        self.chunk_count = 0
+
+    def spill(self, side, df, keys):
+        """Write one chunk's rows into per-partition files"""
+        self.chunk_count += 1
+        for part, rows in df.groupby(partition_of(keys, self.partitions)):
+            rows.to_pickle(os.path.join(self.directory, f"{side}_{part}_{self.chunk_count}.pkl"))
+
+    def load(self, side, part, empty):
+        """All spilled rows of one side and partition"""
+        pieces = [pd.read_pickle(f) for f in sorted(glob.glob(os.path.join(self.directory, f"{side}_{part}_*.pkl")))]
+        return pd.concat(pieces, ignore_index=True) if pieces else empty
+
+    def close(self):
+        """Remove the spill directory"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def reconcile_invoices_out_of_core(source, gstr_source, output_path, partitions=DEFAULT_PARTITIONS,
+                                   prepare_tally=None, progress=None, fixed_point=False, tolerance=None):
+    """Invoice reconciliation with memory bounded by partition size.
+
+    source and gstr_source are (path, sheet_name, header_row) tuples. Both
+    sides are streamed from the workbook, spilled to disk partitioned by
+    GSTIN hash and reconciled one partition at a time; results stream into
+    a write-only workbook at output_path. fixed_point and tolerance work as
+    in reconcile_invoices. Returns the number of result rows.
+    """
+    store = SpillStore(partitions)
+    try:
+        empty = {}
+        for side, (path, sheet, header_row) in (("tally", source), ("gstr", gstr_source)):
+            for chunk in iter_sheet_chunks(path, sheet, header_row):
+                if side == "tally" and prepare_tally:
+                    chunk = prepare_tally(chunk)
+                chunk = clean_invoice_frame(enforce_schema(chunk, categories=False))
+                empty.setdefault(side, chunk.iloc[0:0])
+                store.spill(side, chunk, chunk['GSTIN of supplier'])
+        if len(empty) < 2:
+            raise ValueError("Both the Tally and GSTR-2A sheets need at least one row")
+
+        wb = Workbook(write_only=True)
+        sheet = StreamingSheet(wb, 'Invoice_Recon')
+        total_rows = 0
+        for part in range(partitions):
+            df_gstr = store.load("gstr", part, empty["gstr"])
+            df_tally = store.load("tally", part, empty["tally"])
+            if len(df_gstr) or len(df_tally):
+                df_result = reconcile_invoices(df_gstr, df_tally, fixed_point, tolerance)
+                sheet.append_frame(df_result)
+                total_rows += len(df_result)
+            if progress:
+                progress(part + 1, partitions)
+        wb.save(output_path)
+        return total_rows
+    finally:
+        store.close()
+
+
+def reconcile_gst_out_of_core(source, gstr_source, output_path, tally_sheet_used,
+                              partitions=DEFAULT_PARTITIONS, prepare_tally=None, progress=None,
+                              fixed_point=False, tolerance=None):
+    """Party-level GST reconciliation with memory bounded by partition size.
+
+    Rows are spilled partitioned by their Group_Key hash, so each party is
+    grouped and compared within one partition. Summary totals accumulate
+    across partitions, in paise under fixed_point. fixed_point and tolerance
+    work as in reconcile_gst. Returns row counts of the written sheets.
+    """
+    store = SpillStore(partitions)
+    try:
+        tally_chunks = iter_sheet_chunks(*source)
+        gstr_chunks = iter_sheet_chunks(*gstr_source)
+        first = {"tally": next(tally_chunks, None), "gstr": next(gstr_chunks, None)}
+        if first["tally"] is None or first["gstr"] is None:
+            raise ValueError("Both the Tally and GSTR-2A sheets need at least one row")
+        if prepare_tally:
+            first["tally"] = prepare_tally(first["tally"])
+        first = {side: enforce_schema(chunk, categories=False) for side, chunk in first.items()}
+        # Columns are resolved from the first chunk of each side, as the in-memory path does
+        cols = gst_columns(first["tally"], first["gstr"])
+
+        empty = {}
+        for side, rest in (("tally", tally_chunks), ("gstr", gstr_chunks)):
+            gstin_col = cols['gstin_tally'] if side == "tally" else cols['gstin_gstr']
+            for index, chunk in enumerate(itertools.chain([first[side]], rest)):
+                if index > 0:
+                    if side == "tally" and prepare_tally:
+                        chunk = prepare_tally(chunk)
+                    chunk = enforce_schema(chunk, categories=False)
+                chunk = gst_rows(chunk, gstin_col, cols, fixed_point)
+                empty.setdefault(side, chunk.iloc[0:0])
+                store.spill(side, chunk, chunk['Group_Key'])
+
+        wb = Workbook(write_only=True)
+        summary_sheet = StreamingSheet(wb, 'GST_Input_Summary')
+        sheets = {name: StreamingSheet(wb, name) for name in ('T_vs_G-2A', 'N_I_T_B_I_G', 'N_I_G_B_I_T')}
+        counts = {name: 0 for name in sheets}
+        gstr_totals, tally_totals = [0, 0, 0, 0], [0, 0, 0, 0]
+
+        for part in range(partitions):
+            df_gstr_grp = group_gst(store.load("gstr", part, empty["gstr"]), cols)
+            df_tally_grp = group_gst(store.load("tally", part, empty["tally"]), cols)
+            if len(df_gstr_grp) or len(df_tally_grp):
+                gstr_totals = [a + b for a, b in zip(gstr_totals, gst_totals(df_gstr_grp, cols))]
+                tally_totals = [a + b for a, b in zip(tally_totals, gst_totals(df_tally_grp, cols))]
+                results = gst_results(df_gstr_grp, df_tally_grp, cols, tally_sheet_used, fixed_point, tolerance)
+                for name, sheet in sheets.items():
+                    sheet.append_frame(results[name])
+                    counts[name] += len(results[name])
+            if progress:
+                progress(part + 1, partitions)
+
+        df_summary = gst_summary(gstr_totals, tally_totals, tally_sheet_used)
+        if fixed_point:
+            amounts_to_rupees(df_summary, ['Integrated Tax', 'Central Tax', 'State/UT Tax', 'Cess'])
+        summary_sheet.append_frame(df_summary)
+        counts['GST_Input_Summary'] = len(df_summary)
+        wb.save(output_path)
+        return counts
+    finally:
+        store.close()
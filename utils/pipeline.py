@@ -0,0 +1,188 @@
+import pandas as pd
+from utils.pipeline_state import hash_dataframe
+from utils.reconciliation import (INVOICE_KEY, clean_invoice_frame, reconcile_invoices, gst_columns, gst_rows,
+                                  group_gst, gst_results)
+from utils.schema import get_column, parse_dates
+
+
+def confirmed_name_map(df_matches):
+    """Tally → GSTR-2A name map of the matches confirmed for replacement"""
+    name_map = {}
+    for _, row in df_matches.iterrows():
+        gstr_name = row['GSTR-2A Party']
+        tally_name = row['Tally Party']
+        confirmation = str(row['Manual Confirmation']).strip().upper()
+        if confirmation == "YES" and pd.notna(gstr_name) and pd.notna(tally_name):
+            if gstr_name != '' and tally_name != '':
+                name_map[tally_name] = gstr_name
+    return name_map
+
+
+def changed_names(old_map, new_map):
+    """Tally names whose replacement differs between two name maps"""
+    return {name for name in set(old_map) | set(new_map) if old_map.get(name) != new_map.get(name)}
+
+
+def replace_names(series, name_map):
+    """Supplier names with the mapped replacements applied; blanks are kept"""
+    values = series.astype(object)
+    return values.map(name_map).where(values.isin(list(name_map)), values)
+
+
+def replace_tally_names(df_tally, name_map):
+    """Tally_Replaced sheet: the Tally sheet with confirmed names replaced and dates formatted"""
+    col_supplier = get_column(df_tally, 'Supplier')
+    df_new = df_tally.copy()
+    df_new[col_supplier] = replace_names(df_new[col_supplier], name_map)
+    if 'Invoice Date' in df_new.columns:
+        df_new['Invoice Date'] = parse_dates(df_new['Invoice Date']).dt.strftime('%d-%m-%Y')
+    return df_new
+
+
+def set_supplier_names(df, mask, names):
+    """Copy of a normalized frame with the masked rows' supplier names set"""
+    col_supplier = get_column(df, 'Supplier')
+    df = df.copy()
+    values = df[col_supplier].astype(object)
+    values[mask] = [name.strip() if isinstance(name, str) else name for name in names]
+    is_category = isinstance(df[col_supplier].dtype, pd.CategoricalDtype)
+    df[col_supplier] = values.astype('category') if is_category else values
+    return df
+
+
+def sort_invoices(df):
+    """Invoice results in key order, as the outer join of a full run leaves them"""
+    return df.sort_values(INVOICE_KEY, key=lambda col: col.astype(str), kind='stable', ignore_index=True)
+
+
+class ReconciliationPipeline:
+    """Artifacts of the pipeline stages for one working workbook.
+
+    Each stage keeps the frames and intermediate tables it produced along
+    with the hash of its main output sheet. An artifact is only reused while
+    that hash still matches the manifest, so an incremental update never
+    starts from results the workbook no longer holds.
+
+    When confirmations change, update_names() replaces only the Tally rows
+    whose names changed, and update_gst() / update_invoices() regroup only
+    the parties and GSTINs those rows touch.
+    """
+
+    def __init__(self, workbook_path):
+        self.workbook_path = workbook_path
+        self.artifacts = {}
+
+    def artifact(self, manifest, stage_key, sheet):
+        """A stage's artifact if it produced the output currently recorded for the stage"""
+        artifact = self.artifacts.get(stage_key)
+        if artifact is None or manifest.output_hash(stage_key, sheet) != artifact["hash"]:
+            return None
+        return artifact
+
+    @staticmethod
+    def row_aligned(artifact, mask):
+        """Check that a stage artifact holds Tally_Replaced rows matching a name replacement mask"""
+        return (artifact is not None and artifact["tally_sheet_used"] == "Tally_Replaced"
+                and len(artifact["tally"]) == len(mask))
+
+    # --- Name replacement ---
+    def replace_names(self, df_tally, df_matches):
+        """Full name replacement; returns (Tally_Replaced, number of names mapped)"""
+        name_map = confirmed_name_map(df_matches)
+        df_new = replace_tally_names(df_tally, name_map)
+        self.artifacts["name_replacement"] = {
+            "source": df_tally, "name_map": name_map, "sheet": df_new, "hash": hash_dataframe(df_new)
+        }
+        return df_new, len(name_map)
+
+    def update_names(self, manifest, df_matches):
+        """Apply a confirmation diff to Tally_Replaced.
+
+        Returns (Tally_Replaced, changed row mask, names of those rows), or
+        None when there is no current artifact to update.
+        """
+        artifact = self.artifact(manifest, "name_replacement", "Tally_Replaced")
+        if artifact is None:
+            return None
+        name_map = confirmed_name_map(df_matches)
+        source = artifact["source"]
+        col_supplier = get_column(source, 'Supplier')
+        mask = source[col_supplier].astype(object).isin(list(changed_names(artifact["name_map"], name_map))).to_numpy()
+
+        df_new = artifact["sheet"].copy()
+        names = replace_names(source.loc[mask, col_supplier], name_map)
+        df_new.loc[mask, col_supplier] = names
+        self.artifacts["name_replacement"] = {
+            "source": source, "name_map": name_map, "sheet": df_new, "hash": hash_dataframe(df_new)
+        }
+        return df_new, mask, names.tolist()
+
+    # --- GST reconciliation ---
+    def reconcile_gst(self, df_gstr, df_tally, tally_sheet_used, fixed_point=False, tolerance=None):
+        """Full GST reconciliation of normalized frames; returns the four result sheets"""
+        cols = gst_columns(df_tally, df_gstr)
+        df_gstr_grp = group_gst(gst_rows(df_gstr, cols['gstin_gstr'], cols, fixed_point), cols)
+        df_tally_grp = group_gst(gst_rows(df_tally, cols['gstin_tally'], cols, fixed_point), cols)
+        return self._store_gst(df_tally, df_gstr_grp, df_tally_grp, cols, tally_sheet_used, fixed_point, tolerance)
+
+    def update_gst(self, manifest, mask, names):
+        """Regroup only the parties touched by renamed Tally rows; None without a usable artifact"""
+        artifact = self.artifact(manifest, "gst_reconciliation", "T_vs_G-2A")
+        if not self.row_aligned(artifact, mask):
+            return None
+        cols, fixed_point = artifact["cols"], artifact["fixed_point"]
+        df_before = artifact["tally"]
+        df_tally = set_supplier_names(df_before, mask, names)
+
+        # Parties the renamed rows leave and join
+        old_keys = gst_rows(df_before[mask], cols['gstin_tally'], cols)['Group_Key']
+        tally_rows = gst_rows(df_tally, cols['gstin_tally'], cols, fixed_point)
+        affected = set(old_keys) | set(tally_rows.loc[mask, 'Group_Key'])
+
+        df_tally_grp = artifact["tally_grp"]
+        df_tally_grp = pd.concat([
+            df_tally_grp[~df_tally_grp['Group_Key'].isin(affected)],
+            group_gst(tally_rows[tally_rows['Group_Key'].isin(affected)], cols)
+        ]).sort_values('Group_Key', ignore_index=True)
+        return self._store_gst(df_tally, artifact["gstr_grp"], df_tally_grp, cols, "Tally_Replaced",
+                               fixed_point, artifact["tolerance"])
+
+    def _store_gst(self, df_tally, df_gstr_grp, df_tally_grp, cols, tally_sheet_used, fixed_point, tolerance):
+        sheets = gst_results(df_gstr_grp, df_tally_grp, cols, tally_sheet_used, fixed_point, tolerance)
+        self.artifacts["gst_reconciliation"] = {
+            "tally": df_tally, "gstr_grp": df_gstr_grp, "tally_grp": df_tally_grp, "cols": cols,
+            "tally_sheet_used": tally_sheet_used, "fixed_point": fixed_point, "tolerance": tolerance,
+            "hash": hash_dataframe(sheets['T_vs_G-2A'])
+        }
+        return sheets
+
+    # --- Invoice reconciliation ---
+    def reconcile_invoices(self, df_gstr, df_tally, tally_sheet_used, fixed_point=False, tolerance=None):
+        """Full invoice reconciliation of normalized frames; returns the Invoice_Recon sheet"""
+        df_gstr, df_tally = clean_invoice_frame(df_gstr), clean_invoice_frame(df_tally)
+        df_result = reconcile_invoices(df_gstr, df_tally, fixed_point, tolerance)
+        return self._store_invoices(df_gstr, df_tally, df_result, tally_sheet_used, fixed_point, tolerance)
+
+    def update_invoices(self, manifest, mask, names):
+        """Recompute only the GSTINs of renamed Tally rows; None without a usable artifact"""
+        artifact = self.artifact(manifest, "invoice_reconciliation", "Invoice_Recon")
+        if not self.row_aligned(artifact, mask):
+            return None
+        df_gstr = artifact["gstr"]
+        df_tally = set_supplier_names(artifact["tally"], mask, names)
+        affected = set(df_tally.loc[mask, 'GSTIN of supplier'])
+
+        df_result = artifact["result"]
+        fresh = reconcile_invoices(df_gstr[df_gstr['GSTIN of supplier'].isin(affected)],
+                                   df_tally[df_tally['GSTIN of supplier'].isin(affected)],
+                                   artifact["fixed_point"], artifact["tolerance"])
+        df_result = sort_invoices(pd.concat([df_result[~df_result['GSTIN of supplier'].isin(affected)], fresh]))
+        return self._store_invoices(df_gstr, df_tally, df_result, "Tally_Replaced",
+                                    artifact["fixed_point"], artifact["tolerance"])
+
+    def _store_invoices(self, df_gstr, df_tally, df_result, tally_sheet_used, fixed_point, tolerance):
+        self.artifacts["invoice_reconciliation"] = {
+            "gstr": df_gstr, "tally": df_tally, "result": df_result, "tally_sheet_used": tally_sheet_used,
+            "fixed_point": fixed_point, "tolerance": tolerance, "hash": hash_dataframe(df_result)
+        }
+        return df_result
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+import pandas as pd
+
+# Pipeline stages in execution order, with the workbook sheets each one writes
+# and the upstream stages whose outputs it reads
+PIPELINE_STAGES = [
+    {
+        "key": "matching",
+        "name": "🚀 Fuzzy Matching",
+        "sheets": ["GSTR_Tally_Match"],
+        "depends_on": [],
+        "session_var": "matching_completed",
+        "description": "Supplier name matching completed"
+    },
+    {
+        "key": "name_replacement",
+        "name": "🔁 Name Replacement",
+        "sheets": ["Tally_Replaced"],
+        "depends_on": ["matching"],
+        "session_var": "name_replacement_done",
+        "description": "Tally names replaced with GSTR names"
+    },
+    {
+        "key": "gst_reconciliation",
+        "name": "📊 GST Reconciliation",
+        "sheets": ["GST_Input_Summary", "T_vs_G-2A", "N_I_T_B_I_G", "N_I_G_B_I_T"],
+        "depends_on": ["name_replacement"],
+        "session_var": "gst_reconciliation_done",
+        "description": "GST amounts reconciled and analyzed"
+    },
+    {
+        "key": "invoice_reconciliation",
+        "name": "🧾 Invoice Reconciliation",
+        "sheets": ["Invoice_Recon"],
+        "depends_on": ["name_replacement"],
+        "session_var": "invoice_reconciliation_done",
+        "description": "Invoice-wise comparison completed"
+    }
+]
+
+STAGE_DEPENDENCIES = {stage["key"]: stage["depends_on"] for stage in PIPELINE_STAGES}
+
+
+def hash_dataframe(df):
+    """Content hash of a dataframe's columns and values"""
+    digest = hashlib.sha1()
+    digest.update("|".join(str(col) for col in df.columns).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class PipelineManifest:
+    """Record of the working workbook's sheets and completed stages.
+
+    The manifest is kept in session state and mirrored to a JSON file next
+    to the workbook, so status checks never need to open the workbook.
+    """
+
+    def __init__(self, workbook_path):
+        self.workbook_path = workbook_path
+        self.path = f"{workbook_path}.manifest.json"
+        self.version = 0
+        self.sheets = []
+        self.stages = {}
+
+    @classmethod
+    def load(cls, workbook_path):
+        """Load the manifest stored next to a workbook, or start an empty one"""
+        manifest = cls(workbook_path)
+        try:
+            if os.path.exists(manifest.path):
+                with open(manifest.path, 'r') as f:
+                    data = json.load(f)
+                manifest.version = data.get("version", 0)
+                manifest.sheets = data.get("sheets", [])
+                manifest.stages = data.get("stages", {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading manifest {manifest.path}: {e}")
+        return manifest
+
+    def save(self):
+        """Write the manifest next to the workbook"""
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({
+                    "version": self.version,
+                    "sheets": self.sheets,
+                    "stages": self.stages
+                }, f, indent=2, default=str)
+        except OSError as e:
+            print(f"Error saving manifest {self.path}: {e}")
+
+    def record_sheets(self, sheet_names):
+        """Record the sheets present in the workbook; the version only moves when new sheets appear"""
+        if self._add_sheets(sheet_names):
+            self.version += 1
+            self.save()
+
+    def _add_sheets(self, sheet_names):
+        new_sheets = [sheet for sheet in sheet_names if sheet not in self.sheets]
+        self.sheets.extend(new_sheets)
+        return bool(new_sheets)
+
+    def record_stage(self, stage_key, outputs, inputs=None):
+        """Record a completed stage with row counts and hashes of its output sheets.
+
+        Each record is a new version of the stage's artifacts and remembers
+        the upstream output hashes it was computed from: inputs when the
+        stage ran on a snapshot taken earlier, else the current ones.
+        """
+        self.stages[stage_key] = {
+            "completed_at": datetime.now().isoformat(),
+            "version": self.stages.get(stage_key, {}).get("version", 0) + 1,
+            "inputs": self.input_hashes(stage_key) if inputs is None else inputs,
+            "outputs": {
+                sheet: {"rows": len(df), "hash": hash_dataframe(df)}
+                for sheet, df in outputs.items()
+            }
+        }
+        self._add_sheets(outputs.keys())
+        self.version += 1
+        self.save()
+
+    def refresh_inputs(self, stage_key, inputs=None):
+        """Record that a stage's unchanged outputs were recomputed from the given or current upstream outputs"""
+        stage = self.stages.get(stage_key)
+        if stage is None:
+            return
+        stage["inputs"] = self.input_hashes(stage_key) if inputs is None else inputs
+        self.save()
+
+    def input_hashes(self, stage_key):
+        """Current output hashes of a stage's upstream stages"""
+        return {dep: self.output_hashes(dep) for dep in STAGE_DEPENDENCIES.get(stage_key, [])}
+
+    def output_hashes(self, stage_key):
+        """Hashes of a stage's recorded output sheets by name"""
+        outputs = self.stages.get(stage_key, {}).get("outputs", {})
+        return {sheet: output["hash"] for sheet, output in outputs.items()}
+
+    def is_stale(self, stage_key):
+        """Check whether a completed stage was computed from outdated upstream outputs"""
+        stage = self.stages.get(stage_key)
+        if stage is None or "inputs" not in stage:
+            return False
+        for dep in STAGE_DEPENDENCIES.get(stage_key, []):
+            if self.is_stale(dep) or stage["inputs"].get(dep, {}) != self.output_hashes(dep):
+                return True
+        return False
+
+    def stale_stages(self):
+        """Completed stages needing recomputation, in pipeline order"""
+        return [stage["key"] for stage in PIPELINE_STAGES if self.is_stale(stage["key"])]
+
+    def has_outputs(self, stage_key, outputs):
+        """Check whether a stage already recorded exactly these output sheets"""
+        return all(
+            sheet in self.sheets and self.output_hash(stage_key, sheet) == hash_dataframe(df)
+            for sheet, df in outputs.items()
+        )
+
+    def is_done(self, stage_key):
+        """Check whether a stage has written its outputs, here or in the uploaded workbook"""
+        if stage_key in self.stages:
+            return True
+        stage = next((stage for stage in PIPELINE_STAGES if stage["key"] == stage_key), None)
+        return stage is not None and stage["sheets"][0] in self.sheets
+
+    def output_hash(self, stage_key, sheet):
+        """Content hash recorded for a stage's output sheet, if any"""
+        return self.stages.get(stage_key, {}).get("outputs", {}).get(sheet, {}).get("hash")
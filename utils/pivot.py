@@ -0,0 +1,136 @@
+from itertools import combinations
+import pandas as pd
+from utils.multi_period import invoice_months
+from utils.reconciliation import AMOUNT_COLUMNS, amounts_to_paise, amounts_to_rupees, flag_variances
+from utils.schema import get_column
+
+# Key dimensions a pivot can break down by: label -> (source column, sheet name code)
+DIMENSIONS = {
+    'GSTIN': ('GSTIN of supplier', 'GSTIN'),
+    'Supplier': ('Supplier', 'Sup'),
+    'Rate': ('Rate', 'Rate'),
+    'Month': ('Invoice Date', 'Month'),
+    'Place of Supply': ('Place of supply', 'POS')
+}
+
+DEFAULT_DIMENSIONS = ['GSTIN', 'Rate', 'Month']
+
+# How the grouping sets are derived from the chosen dimensions
+GROUPING_MODES = {
+    "sets": "Full combination only",
+    "rollup": "Roll-up (each leading subset)",
+    "cube": "Cube (every combination)"
+}
+
+SIDES = ('GSTR', 'Tally')
+
+
+def available_dimensions(df_gstr, df_tally):
+    """Dimensions whose source column is present in both sheets"""
+    available = []
+    for label, (column, _) in DIMENSIONS.items():
+        try:
+            get_column(df_gstr, column)
+            get_column(df_tally, column)
+        except KeyError:
+            continue
+        available.append(label)
+    return available
+
+
+def grouping_sets(dims, mode="sets"):
+    """Grouping sets for the chosen dimensions, largest first, as in SQL GROUPING SETS/ROLLUP/CUBE"""
+    dims = list(dims)
+    if mode == "rollup":
+        return [tuple(dims[:size]) for size in range(len(dims), 0, -1)]
+    if mode == "cube":
+        return [subset for size in range(len(dims), 0, -1) for subset in combinations(dims, size)]
+    return [tuple(dims)]
+
+
+def dimension_frame(df, dims):
+    """Dimension values of every row; months come from the invoice date"""
+    values = {}
+    for label in dims:
+        column = get_column(df, DIMENSIONS[label][0])
+        if label == 'Month':
+            values[label] = invoice_months(df[column])
+        else:
+            values[label] = df[column].astype(object)
+    return pd.DataFrame(values, index=df.index)
+
+
+def base_table(df_gstr, df_tally, dims, fixed_point=False):
+    """One grouped table of amount sums per side at the finest grain of dims.
+
+    Every requested breakdown is a roll-up of this table, so the raw rows
+    are grouped only once.
+    """
+    frames = []
+    for side, df in zip(SIDES, (df_gstr, df_tally)):
+        amounts = df[[col for col in AMOUNT_COLUMNS if col in df.columns]]
+        if fixed_point:
+            amounts = amounts_to_paise(amounts, AMOUNT_COLUMNS)
+        frame = pd.concat([dimension_frame(df, dims), amounts], axis=1)
+        frame['Side'] = side
+        frames.append(frame)
+    df_all = pd.concat(frames, ignore_index=True)
+    for col in AMOUNT_COLUMNS:
+        if col not in df_all.columns:
+            df_all[col] = 0
+    df_all[list(AMOUNT_COLUMNS)] = df_all[list(AMOUNT_COLUMNS)].fillna(0)
+
+    base = df_all.groupby(list(dims) + ['Side'], dropna=False)[list(AMOUNT_COLUMNS)].sum()
+    base = base.unstack('Side', fill_value=0)
+    base.columns = [f"{col}_{side}" for col, side in base.columns]
+    for col in AMOUNT_COLUMNS:
+        for side in SIDES:
+            if f"{col}_{side}" not in base.columns:
+                base[f"{col}_{side}"] = 0
+    return base.reset_index()
+
+
+def view_name(dims):
+    """Sheet name of a breakdown, within Excel's 31 character limit"""
+    return ('Pivot_' + '_'.join(DIMENSIONS[label][1] for label in dims))[:31]
+
+
+def reconcile_view(df_view, fixed_point=False, tolerance=None):
+    """Order a rolled-up view's columns and add per-tax-head variances"""
+    amount_columns = [f"{col}_{side}" for col in AMOUNT_COLUMNS for side in SIDES]
+    dims = [col for col in df_view.columns if col not in amount_columns]
+    df_view = df_view[dims + amount_columns].copy()
+    for col, variance in AMOUNT_COLUMNS.items():
+        df_view[variance] = df_view[col + '_GSTR'] - df_view[col + '_Tally']
+    if tolerance is not None:
+        flag_variances(df_view, AMOUNT_COLUMNS.values(), tolerance, fixed_point)
+    if fixed_point:
+        amounts_to_rupees(df_view, amount_columns + list(AMOUNT_COLUMNS.values()))
+    return df_view
+
+
+def pivot_reconcile(df_gstr, df_tally, dims, mode="sets", fixed_point=False, tolerance=None):
+    """Reconcile amounts over several key breakdowns; returns {sheet_name: DataFrame}.
+
+    Sets are computed largest first, each one rolled up from the smallest
+    already-computed view that contains its dimensions, so many breakdowns
+    cost little more than the base grouping.
+    """
+    dims = list(dims)
+    if not dims:
+        raise ValueError("Choose at least one dimension")
+    base = base_table(df_gstr, df_tally, dims, fixed_point)
+    amount_columns = [col for col in base.columns if col not in dims]
+
+    views = {tuple(dims): base}
+    for subset in grouping_sets(dims, mode):
+        if subset in views:
+            continue
+        parents = [view for key, view in views.items() if set(subset) <= set(key)]
+        parent = min(parents, key=len)
+        views[subset] = parent.groupby(list(subset), dropna=False)[amount_columns].sum().reset_index()
+
+    return {
+        view_name(subset): reconcile_view(views[subset], fixed_point, tolerance)
+        for subset in grouping_sets(dims, mode)
+    }
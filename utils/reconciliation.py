@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+from utils.schema import get_column, fill_missing, to_paise, to_rupees, PAISE_PER_RUPEE
+
+# Columns identifying an invoice on both sides
+INVOICE_KEY = ['GSTIN of supplier', 'Supplier', 'Invoice number']
+
+# Amount columns summed per invoice, with the label used for their variance
+AMOUNT_COLUMNS = {
+    'Taxable Value': 'Taxable Value Variance',
+    'Integrated Tax': 'Integrated Tax Variance',
+    'Central Tax': 'Central Tax Variance',
+    'State/UT tax': 'State/UT Tax Variance',
+    'Cess': 'Cess Variance'
+}
+
+# GSTIN values treated as missing when grouping parties
+NO_GSTIN_VALUES = ['', 'NO_GSTIN', 'nan', 'No GSTIN']
+
+# Largest variance per tax head, in rupees, still treated as a match
+DEFAULT_TOLERANCE = 1.0
+
+
+def amounts_to_paise(df, columns):
+    """Copy of a frame with the given amount columns as int64 paise"""
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            df[col] = to_paise(df[col])
+    return df
+
+
+def amounts_to_rupees(df, columns):
+    """Convert paise columns of a result frame back to rupees"""
+    for col in columns:
+        if col in df.columns:
+            df[col] = to_rupees(df[col])
+    return df
+
+
+def flag_variances(df, variance_columns, tolerance, fixed_point=False):
+    """Add a 'Variance Flag' column: Match when every variance is within tolerance rupees"""
+    limit = round(tolerance * PAISE_PER_RUPEE) if fixed_point else tolerance
+    within = (df[list(variance_columns)].abs() <= limit).all(axis=1)
+    df['Variance Flag'] = within.map({True: 'Match', False: 'Mismatch'})
+    return df
+
+
+def clean_invoice_frame(df):
+    """Strip column names and fill the defaults invoice reconciliation relies on"""
+    df.columns = df.columns.str.strip()
+    if 'Cess' not in df.columns:
+        df['Cess'] = 0
+    df['GSTIN of supplier'] = fill_missing(df['GSTIN of supplier'], 'No GSTIN')
+    return df
+
+
+def consolidate_invoices(df):
+    """Sum amount columns per invoice"""
+    return df.groupby(INVOICE_KEY, observed=True).agg({col: 'sum' for col in AMOUNT_COLUMNS}).reset_index()
+
+
+def reconcile_invoices(df_gstr, df_tally, fixed_point=False, tolerance=None):
+    """Invoice-wise comparison of GSTR-2A and Tally with per-tax-head variances.
+
+    With fixed_point, sums and variances are computed in int64 paise and
+    converted back to rupees only for output, so they are exact. A
+    tolerance (in rupees) adds a 'Variance Flag' column.
+    """
+    if fixed_point:
+        df_gstr = amounts_to_paise(df_gstr, AMOUNT_COLUMNS)
+        df_tally = amounts_to_paise(df_tally, AMOUNT_COLUMNS)
+    gstr_grouped = consolidate_invoices(df_gstr)
+    tally_grouped = consolidate_invoices(df_tally)
+
+    df_combined = pd.merge(gstr_grouped, tally_grouped, on=INVOICE_KEY, how='outer',
+                           suffixes=('_GSTR', '_Tally')).fillna(0)
+    return invoice_variances(df_combined, fixed_point, tolerance)
+
+
+def invoice_variances(df_combined, fixed_point=False, tolerance=None):
+    """Add per-tax-head variances (and the tolerance flag) to joined invoice sums"""
+    amount_columns = [col + suffix for col in AMOUNT_COLUMNS for suffix in ('_GSTR', '_Tally')]
+    if fixed_point:
+        # The outer join leaves float columns; missing sides are exactly 0 paise
+        df_combined[amount_columns] = df_combined[amount_columns].astype('int64')
+    for col, variance in AMOUNT_COLUMNS.items():
+        df_combined[variance] = df_combined[col + '_GSTR'] - df_combined[col + '_Tally']
+
+    if tolerance is not None:
+        flag_variances(df_combined, AMOUNT_COLUMNS.values(), tolerance, fixed_point)
+    if fixed_point:
+        amounts_to_rupees(df_combined, amount_columns + list(AMOUNT_COLUMNS.values()))
+    return df_combined
+
+
+def gst_columns(df_tally, df_gstr):
+    """Resolve the supplier, tax and optional GSTIN columns used by GST reconciliation"""
+    cols = {
+        'name': get_column(df_tally, 'Supplier'),
+        'itax': get_column(df_tally, 'Integrated Tax'),
+        'ctax': get_column(df_tally, 'Central Tax'),
+        'stax': get_column(df_tally, 'State/UT tax')
+    }
+    try:
+        cols['gstin_tally'] = get_column(df_tally, 'GSTIN of supplier')
+        cols['gstin_gstr'] = get_column(df_gstr, 'GSTIN of supplier')
+    except KeyError:
+        cols['gstin_tally'] = cols['gstin_gstr'] = None
+    return cols
+
+
+def add_group_key(df, gstin_col, supplier_col):
+    """Add the Group_Key column: GSTIN where known, else the supplier name"""
+    if 'Cess' not in df.columns:
+        df['Cess'] = 0
+    if gstin_col is None:
+        df['Group_Key'] = fill_missing(df[supplier_col], 'UNKNOWN')
+        return df
+
+    # Keys are built once per distinct (GSTIN, supplier) pair and mapped back to the rows
+    pairs = df[[gstin_col, supplier_col]]
+    codes = pairs.groupby([gstin_col, supplier_col], observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    unique = pairs.drop_duplicates()
+    gstin = unique[gstin_col].astype(object).fillna('NO_GSTIN').astype(str).str.strip()
+    supplier = unique[supplier_col].astype(object).where(unique[supplier_col].notna(), '').astype(str).str.strip()
+    no_gstin = gstin.isin(NO_GSTIN_VALUES)
+    df['Group_Key'] = np.where(no_gstin, 'SUPPLIER_' + supplier, 'GSTIN_' + gstin)[codes]
+    return df
+
+
+def gst_rows(df, gstin_col, cols, fixed_point=False):
+    """Copy of one side keyed by Group_Key, with tax heads in paise under fixed_point"""
+    df = add_group_key(df.copy(), gstin_col, cols['name'])
+    if fixed_point:
+        df = amounts_to_paise(df, [cols['itax'], cols['ctax'], cols['stax'], 'Cess'])
+    return df
+
+
+def group_gst(df, cols):
+    """Sum tax heads per Group_Key"""
+    return df.groupby(['Group_Key'], observed=True).agg({
+        cols['name']: 'first',
+        cols['itax']: 'sum',
+        cols['ctax']: 'sum',
+        cols['stax']: 'sum',
+        'Cess': 'sum'
+    }).reset_index()
+
+
+def compare_gst_groups(df_gstr_grp, df_tally_grp, cols):
+    """Party-level comparison: (T_vs_G-2A, N_I_T_B_I_G, N_I_G_B_I_T)"""
+    col_itax, col_ctax, col_stax = cols['itax'], cols['ctax'], cols['stax']
+    # One outer join; parties on both sides are the inner join
+    df_combined_outer = pd.merge(df_gstr_grp, df_tally_grp, on=['Group_Key'], how='outer',
+                                 suffixes=('_GSTR', '_Tally'), indicator=True)
+    side = df_combined_outer.pop('_merge')
+    df_combined = df_combined_outer[side == 'both'].reset_index(drop=True)
+    df_combined['Integrated Tax Variance'] = df_combined[col_itax + '_GSTR'] - df_combined[col_itax + '_Tally']
+    df_combined['Central Tax Variance'] = df_combined[col_ctax + '_GSTR'] - df_combined[col_ctax + '_Tally']
+    df_combined['State/UT Tax Variance'] = df_combined[col_stax + '_GSTR'] - df_combined[col_stax + '_Tally']
+    df_combined['Cess Variance'] = df_combined['Cess_GSTR'] - df_combined['Cess_Tally']
+
+    # Find missing entries
+    not_in_tally = df_combined_outer[side == 'left_only']
+    not_in_gstr = df_combined_outer[side == 'right_only']
+    return df_combined, not_in_tally, not_in_gstr
+
+
+def gst_totals(df_grp, cols):
+    """Tax-head totals of a grouped frame, in summary column order"""
+    return [df_grp[cols['itax']].sum(), df_grp[cols['ctax']].sum(), df_grp[cols['stax']].sum(), df_grp['Cess'].sum()]
+
+
+def gst_summary(gstr_totals, tally_totals, tally_sheet_used):
+    """GST_Input_Summary sheet from GSTR and Tally tax-head totals"""
+    rows = [gstr_totals, tally_totals, [g - t for g, t in zip(gstr_totals, tally_totals)]]
+    return pd.DataFrame({
+        'Particulars': [
+            'GST Input as per GSTR-2A Sheet',
+            f'GST Input as per {tally_sheet_used}',
+            'Variance (1-2)'
+        ],
+        'Integrated Tax': [row[0] for row in rows],
+        'Central Tax': [row[1] for row in rows],
+        'State/UT Tax': [row[2] for row in rows],
+        'Cess': [row[3] for row in rows]
+    })
+
+
+def reconcile_gst(df_gstr, df_tally, tally_sheet_used, fixed_point=False, tolerance=None):
+    """Party-level GST reconciliation; returns the four result sheets by name.
+
+    fixed_point and tolerance work as in reconcile_invoices; the tolerance
+    flag is added to T_vs_G-2A.
+    """
+    cols = gst_columns(df_tally, df_gstr)
+    df_tally_grp = group_gst(gst_rows(df_tally, cols['gstin_tally'], cols, fixed_point), cols)
+    df_gstr_grp = group_gst(gst_rows(df_gstr, cols['gstin_gstr'], cols, fixed_point), cols)
+    return gst_results(df_gstr_grp, df_tally_grp, cols, tally_sheet_used, fixed_point, tolerance)
+
+
+def gst_results(df_gstr_grp, df_tally_grp, cols, tally_sheet_used, fixed_point=False, tolerance=None):
+    """The four GST result sheets from party-level sums of both sides"""
+    tax_columns = [cols['itax'], cols['ctax'], cols['stax'], 'Cess']
+    df_combined, not_in_tally, not_in_gstr = compare_gst_groups(df_gstr_grp, df_tally_grp, cols)
+    df_summary = gst_summary(gst_totals(df_gstr_grp, cols), gst_totals(df_tally_grp, cols), tally_sheet_used)
+
+    variance_columns = ['Integrated Tax Variance', 'Central Tax Variance', 'State/UT Tax Variance', 'Cess Variance']
+    if tolerance is not None:
+        flag_variances(df_combined, variance_columns, tolerance, fixed_point)
+    if fixed_point:
+        merged_columns = [col + suffix for col in tax_columns for suffix in ('_GSTR', '_Tally')]
+        amounts_to_rupees(df_combined, merged_columns + variance_columns)
+        not_in_tally = amounts_to_rupees(not_in_tally.copy(), merged_columns)
+        not_in_gstr = amounts_to_rupees(not_in_gstr.copy(), merged_columns)
+        amounts_to_rupees(df_summary, ['Integrated Tax', 'Central Tax', 'State/UT Tax', 'Cess'])
+    return {
+        'GST_Input_Summary': df_summary,
+        'T_vs_G-2A': df_combined,
+        'N_I_T_B_I_G': not_in_tally,
+        'N_I_G_B_I_T': not_in_gstr
+    }
+
+
+def rollup_parties(df_joined, side, cols):
+    """Party-level sums of one side of the joined invoice table.
+
+    The party name comes from the invoice with the earliest source row, so
+    it is the first name seen, as when grouping the raw rows.
+    """
+    suffix = '_' + side
+    rows = df_joined[df_joined['_row' + suffix].notna()]
+    named = rows[rows[cols['name']].notna()]
+    first = named.loc[named.groupby('Group_Key')['_row' + suffix].idxmin()].set_index('Group_Key')[cols['name']]
+    tax_columns = [cols['itax'], cols['ctax'], cols['stax'], 'Cess']
+    sums = rows.groupby('Group_Key')[[col + suffix for col in tax_columns]].sum()
+    sums.columns = tax_columns
+    sums.insert(0, cols['name'], first.reindex(sums.index))
+    return sums.reset_index()
+
+
+def reconcile_combined(df_gstr, df_tally, tally_sheet_used, fixed_point=False, tolerance=None):
+    """GST and invoice reconciliation in one pass; returns all five result sheets.
+
+    Each side is grouped once per invoice (keeping rows with blank keys for
+    the party totals) and the two are outer-joined once. Invoice_Recon is
+    the joined table; the party sheets and summary are roll-ups of it.
+    """
+    cols = {'name': 'Supplier', 'itax': 'Integrated Tax', 'ctax': 'Central Tax', 'stax': 'State/UT tax'}
+    invoices = {}
+    for side, df in (('GSTR', df_gstr), ('Tally', df_tally)):
+        df = clean_invoice_frame(df.copy())
+        if fixed_point:
+            df = amounts_to_paise(df, AMOUNT_COLUMNS)
+        df['_row'] = np.arange(len(df))
+        aggregations = {col: (col, 'sum') for col in AMOUNT_COLUMNS}
+        invoices[side] = df.groupby(INVOICE_KEY, observed=True, dropna=False).agg(
+            **aggregations, _row=('_row', 'min')).reset_index()
+
+    df_joined = pd.merge(invoices['GSTR'], invoices['Tally'], on=INVOICE_KEY, how='outer',
+                         suffixes=('_GSTR', '_Tally'))
+    df_joined = add_group_key(df_joined, 'GSTIN of supplier', 'Supplier')
+
+    gst_sheets = gst_results(rollup_parties(df_joined, 'GSTR', cols), rollup_parties(df_joined, 'Tally', cols),
+                             cols, tally_sheet_used, fixed_point, tolerance)
+
+    amount_columns = [col + suffix for suffix in ('_GSTR', '_Tally') for col in AMOUNT_COLUMNS]
+    keyed = df_joined[INVOICE_KEY].notna().all(axis=1)
+    df_invoices = df_joined.loc[keyed, INVOICE_KEY + amount_columns].reset_index(drop=True).fillna(0)
+    gst_sheets['Invoice_Recon'] = invoice_variances(df_invoices, fixed_point, tolerance)
+    return gst_sheets
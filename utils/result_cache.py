@@ -0,0 +1,104 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# Total size of cached results kept in memory before the least recently used are evicted
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(*parts):
+    """Content address of a computation from its input hashes and parameters"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def content_digest(data):
+    """sha256 of raw bytes, e.g. an uploaded workbook"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def result_size(value):
+    """Approximate in-memory size of a result in bytes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(result_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(result_size(item) for item in value)
+    return 64
+
+
+class ResultCache:
+    """Process-wide LRU cache of stage results, bounded by total bytes.
+
+    Keys are content addresses, so identical inputs and parameters hit the
+    same entry across reruns and sessions. Cached values are shared and
+    must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached result for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a result and evict the least recently used entries over the byte budget"""
+        size = result_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def get_or_compute(self, key, compute):
+        """Return (result, hit), computing and caching the result on a miss"""
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = compute()
+        self.put(key, value)
+        return value, False
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Entry count, size and hit counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# Global cache shared by every session served by this process
+result_cache = ResultCache()
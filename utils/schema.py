@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Numeric columns of the Tally and GSTR-2A sheets
+AMOUNT_COLUMNS = ['Invoice Value', 'Rate', 'Taxable Value', 'Integrated Tax',
+                  'Central Tax', 'State/UT tax', 'Cess']
+
+# Low-cardinality text columns stored as categoricals
+CATEGORY_COLUMNS = ['GSTIN of supplier', 'Supplier']
+
+DATE_COLUMNS = ['Invoice Date']
+
+# Text stripped from amounts before parsing, e.g. "₹ 1,234.00"
+AMOUNT_NOISE = r'[,₹\s]|Rs\.?|INR'
+
+PAISE_PER_RUPEE = 100
+
+
+def get_column(df, colname):
+    """FIXED: Handle integer column names properly"""
+    for col in df.columns:
+        col_str = str(col).strip().lower()
+        colname_str = str(colname).strip().lower()
+        if col_str == colname_str:
+            return col
+    raise KeyError(f"Column '{colname}' not found. Available columns: {df.columns.tolist()}")
+
+
+def parse_amounts(series):
+    """Amounts as float64; thousands separators and currency marks are stripped"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64').fillna(0.0)
+    text = series.astype(str).str.replace(AMOUNT_NOISE, '', regex=True)
+    # Accounting style negatives: (1234.00)
+    text = text.str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+    return pd.to_numeric(text, errors='coerce').fillna(0.0).astype('float64')
+
+
+def to_paise(series):
+    """Amounts as exact int64 paise"""
+    return np.rint(parse_amounts(series) * PAISE_PER_RUPEE).astype('int64')
+
+
+def to_rupees(series):
+    """Paise back to rupees for display and export"""
+    return series / PAISE_PER_RUPEE
+
+
+def parse_dates(series):
+    """Invoice dates as datetime64, read day-first as in the template"""
+    return pd.to_datetime(series, errors='coerce', dayfirst=True)
+
+
+def fill_missing(series, value):
+    """fillna that also works on categoricals missing the fill value"""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+
+def enforce_schema(df, categories=True):
+    """Coerce a Tally or GSTR-2A frame to its schema in one pass.
+
+    Column names are stripped, amount columns become float64, dates are
+    parsed once, and GSTIN and supplier names become categoricals unless
+    categories is False (e.g. for chunks concatenated later).
+    """
+    df.columns = [str(col).strip() for col in df.columns]
+    for name in AMOUNT_COLUMNS:
+        try:
+            col = get_column(df, name)
+        except KeyError:
+            continue
+        df[col] = parse_amounts(df[col])
+    for name in DATE_COLUMNS:
+        try:
+            col = get_column(df, name)
+        except KeyError:
+            continue
+        df[col] = parse_dates(df[col])
+    if categories:
+        for name in CATEGORY_COLUMNS:
+            try:
+                col = get_column(df, name)
+            except KeyError:
+                continue
+            values = df[col].where(df[col].isna(), df[col].astype(str).str.strip())
+            df[col] = values.astype('category')
+    return df
+
+
+def read_sheet(path, sheet_name, header):
+    """Read a sheet with pd.read_excel and enforce the schema"""
+    return enforce_schema(pd.read_excel(path, sheet_name=sheet_name, header=header))
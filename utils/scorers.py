@@ -0,0 +1,177 @@
+import numpy as np
+from fuzzywuzzy import fuzz, utils as fuzz_utils
+from utils import tfidf
+
+try:
+    import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+# Scorer used when none is chosen; matches the original fuzz.ratio behaviour
+DEFAULT_SCORER = "ratio"
+
+# Queries scored pair by pair per block, so progress is reported often
+PAIRWISE_BLOCK_ROWS = 32
+
+# Words too common in supplier names to say anything about phonetic similarity
+PHONETIC_STOPWORDS = {
+    "M", "S", "MS", "THE", "AND", "OF", "CO", "COMPANY", "CORP", "CORPORATION",
+    "PVT", "PRIVATE", "LTD", "LIMITED", "LLP", "INC", "INDIA", "ENTERPRISES",
+    "INDUSTRIES", "TRADERS", "TRADING", "AGENCIES", "SERVICES"
+}
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"), "L": "4", **dict.fromkeys("MN", "5"), "R": "6"
+}
+
+
+def soundex(word):
+    """American Soundex code of a single word"""
+    letters = [ch for ch in word.upper() if "A" <= ch <= "Z"]
+    if not letters:
+        return ""
+    code = [letters[0]]
+    last = SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        digit = SOUNDEX_CODES.get(ch, "")
+        if digit and digit != last:
+            code.append(digit)
+        if ch not in "HW":
+            last = digit
+    return ("".join(code) + "000")[:4]
+
+
+def phonetic_keys(name):
+    """Soundex codes of the distinctive words in a name"""
+    words = fuzz_utils.full_process(name, force_ascii=True).upper().split()
+    return {soundex(word) for word in words if word not in PHONETIC_STOPWORDS and len(word) > 1}
+
+
+class PairwiseScorer:
+    """Scorer built on a 0-100 string similarity function.
+
+    score_blocks is the batch API shared by all scorers: it yields
+    (start_row, block) pairs where block is an integer array holding the
+    scores of consecutive queries against every choice.
+    """
+
+    def __init__(self, name, label, similarity, force_ascii=False):
+        self.name = name
+        self.label = label
+        self.similarity = similarity
+        self.force_ascii = force_ascii
+
+    def prepare(self, names):
+        """Normalize names once before pairwise scoring"""
+        return [fuzz_utils.full_process(name, force_ascii=self.force_ascii) for name in names]
+
+    def score_blocks(self, queries, choices):
+        """Yield blocks of scores of each query against every choice"""
+        prepared_choices = self.prepare(choices)
+        prepared_queries = self.prepare(queries)
+        for start in range(0, len(prepared_queries), PAIRWISE_BLOCK_ROWS):
+            rows = [
+                [self.similarity(prepared_query, choice) for choice in prepared_choices]
+                for prepared_query in prepared_queries[start:start + PAIRWISE_BLOCK_ROWS]
+            ]
+            yield start, np.array(rows, dtype=np.int64).reshape(len(rows), len(prepared_choices))
+
+
+class TfidfCosineScorer:
+    """Cosine similarity of character-trigram TF-IDF vectors, scored in bulk"""
+
+    name = "tfidf"
+    label = "TF-IDF cosine (character trigrams)"
+
+    def __init__(self, max_block_cells=tfidf.MAX_BLOCK_CELLS):
+        self.max_block_cells = max_block_cells
+
+    def score_blocks(self, queries, choices):
+        """Yield blocks of scores straight from chunked sparse matrix products"""
+        prepared_queries = [fuzz_utils.full_process(name) for name in queries]
+        prepared_choices = [fuzz_utils.full_process(name) for name in choices]
+        query_matrix, choice_matrix = tfidf.vectorize_pair(prepared_queries, prepared_choices)
+        for start, block in tfidf.cosine_chunks(query_matrix, choice_matrix, self.max_block_cells):
+            yield start, np.rint(block * 100).astype(np.int64)
+
+
+class PhoneticPrefilter:
+    """Wrap a scorer so only choices sharing a phonetic key with the query are scored.
+
+    Choices that share no Soundex code with the query score 0; a query with
+    no distinctive words falls back to scoring every choice.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.name = f"phonetic+{base.name}"
+        self.label = f"{base.label} with phonetic prefilter"
+
+    def score_blocks(self, queries, choices):
+        """Yield blocks of scores, computing the base score only for phonetic candidates"""
+        if not isinstance(self.base, PairwiseScorer):
+            # Bulk scorers are cheaper to run in full than per candidate
+            yield from self.base.score_blocks(queries, choices)
+            return
+
+        index = {}
+        for i, choice in enumerate(choices):
+            for key in phonetic_keys(choice):
+                index.setdefault(key, []).append(i)
+
+        prepared_choices = self.base.prepare(choices)
+        prepared_queries = self.base.prepare(queries)
+        for start in range(0, len(queries), PAIRWISE_BLOCK_ROWS):
+            stop = min(start + PAIRWISE_BLOCK_ROWS, len(queries))
+            block = np.zeros((stop - start, len(choices)), dtype=np.int64)
+            for row in range(start, stop):
+                keys = phonetic_keys(queries[row])
+                if keys:
+                    candidate_ids = sorted({i for key in keys for i in index.get(key, ())})
+                else:
+                    candidate_ids = range(len(choices))
+                # Only the candidates are visited; every other choice keeps its 0
+                block[row - start, list(candidate_ids)] = [
+                    self.base.similarity(prepared_queries[row], prepared_choices[i]) for i in candidate_ids
+                ]
+            yield start, block
+
+
+def _build_registry():
+    registry = {
+        "ratio": PairwiseScorer("ratio", "Ratio (edit distance)", fuzz.ratio),
+        "token_sort": PairwiseScorer(
+            "token_sort", "Token sort ratio (ignores word order)",
+            lambda a, b: fuzz.token_sort_ratio(a, b, full_process=False), force_ascii=True
+        ),
+        "token_set": PairwiseScorer(
+            "token_set", "Token set ratio (ignores word order and repeats)",
+            lambda a, b: fuzz.token_set_ratio(a, b, full_process=False), force_ascii=True
+        ),
+    }
+    if Levenshtein is not None:
+        registry["jaro_winkler"] = PairwiseScorer(
+            "jaro_winkler", "Jaro-Winkler (prefix-weighted)",
+            lambda a, b: int(round(100 * Levenshtein.jaro_winkler(a, b)))
+        )
+    if tfidf.tfidf_available():
+        registry["tfidf"] = TfidfCosineScorer()
+    return registry
+
+
+# Scorers available in this environment, keyed by name
+SCORERS = _build_registry()
+
+
+def get_scorer(name=DEFAULT_SCORER, phonetic_prefilter=False, max_block_cells=None):
+    """Look up a registered scorer, optionally wrapped in the phonetic prefilter.
+
+    max_block_cells caps the dense blocks of bulk scorers for a memory budget.
+    """
+    if name not in SCORERS:
+        raise KeyError(f"Scorer '{name}' not available. Available scorers: {list(SCORERS)}")
+    scorer = SCORERS[name]
+    if max_block_cells is not None and isinstance(scorer, TfidfCosineScorer):
+        scorer = TfidfCosineScorer(max_block_cells)
+    return PhoneticPrefilter(scorer) if phonetic_prefilter else scorer
@@ -0,0 +1,107 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+# Sessions are considered active for 30 minutes after their last heartbeat
+SESSION_TTL_SECONDS = 30 * 60
+
+
+class SessionRegistry:
+    """Process-wide index of active sessions with lazy expiry.
+
+    Sessions live in a dict keyed by user_id, and a min-heap of
+    (expires_at, user_id) entries orders them by expiry. A heartbeat is an
+    O(1) dict update plus an O(log n) heap push; stale heap entries left
+    behind by newer heartbeats are discarded when they surface in a sweep.
+    """
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._sessions = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+
+    def heartbeat(self, user_id, session_id, start_time=None, now=None):
+        """Register activity for a session and push back its expiry"""
+        now = time.time() if now is None else now
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "start_time": (start_time or datetime.now()).isoformat(),
+                }
+                self._sessions[user_id] = session
+            session["last_activity"] = datetime.fromtimestamp(now).isoformat()
+            session["expires_at"] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, user_id))
+            self._compact_if_needed()
+
+    def restore(self, sessions, now=None):
+        """Seed the registry from persisted session records"""
+        now = time.time() if now is None else now
+        for session in sessions:
+            try:
+                last_activity = datetime.fromisoformat(session["last_activity"]).timestamp()
+                if last_activity + self.ttl_seconds <= now:
+                    continue
+                self.heartbeat(
+                    session["user_id"],
+                    session.get("session_id"),
+                    datetime.fromisoformat(session["start_time"]) if session.get("start_time") else None,
+                    now=last_activity,
+                )
+            except (KeyError, ValueError, TypeError) as e:
+                print(f"Skipping invalid session record: {e}")
+
+    def sweep(self, now=None):
+        """Drop expired sessions; amortized over the heartbeats that queued them"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sweep_locked(now)
+
+    def _sweep_locked(self, now):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(heap)
+            session = self._sessions.get(user_id)
+            # Only the newest heap entry for a user matches its stored expiry
+            if session is not None and session["expires_at"] == expires_at:
+                del self._sessions[user_id]
+
+    def _compact_if_needed(self):
+        """Rebuild the heap when stale entries outnumber live sessions"""
+        if len(self._expiry_heap) > 2 * len(self._sessions) + 64:
+            self._expiry_heap = [(s["expires_at"], uid) for uid, s in self._sessions.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def active_count(self, now=None):
+        """Number of sessions seen within the TTL"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sweep_locked(now)
+            return len(self._sessions)
+
+    def is_active(self, user_id, now=None):
+        """Check whether a user's session is still live"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sweep_locked(now)
+            return user_id in self._sessions
+
+    def snapshot(self, now=None):
+        """Return active sessions in the format stored in sessions.json"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sweep_locked(now)
+            return [
+                {k: v for k, v in session.items() if k != "expires_at"}
+                for session in self._sessions.values()
+            ]
+
+
+# Global registry shared by every session served by this process
+session_registry = SessionRegistry()
@@ -0,0 +1,109 @@
+import math
+import numpy as np
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+# Names are compared on padded character trigrams
+NGRAM_SIZE = 3
+
+
+def tfidf_available():
+    """TF-IDF scoring needs scipy for its sparse matrices"""
+    return sparse is not None
+
+
+def char_ngrams(name, n=NGRAM_SIZE):
+    """Character n-grams of a name, padded so short names still produce grams"""
+    padded = f" {name} "
+    if len(padded) < n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+class CharNgramTfidf:
+    """Character n-gram TF-IDF vectorizer producing L2-normalized sparse rows"""
+
+    def __init__(self, n=NGRAM_SIZE):
+        self.n = n
+        self.vocabulary = {}
+        self.idf = None
+
+    def fit(self, names):
+        """Learn the n-gram vocabulary and smoothed IDF weights from names"""
+        document_frequency = {}
+        for name in names:
+            for gram in set(char_ngrams(name, self.n)):
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+
+        self.vocabulary = {gram: i for i, gram in enumerate(document_frequency)}
+        total = len(names)
+        self.idf = np.array([
+            math.log((1 + total) / (1 + document_frequency[gram])) + 1
+            for gram in self.vocabulary
+        ])
+        return self
+
+    def transform(self, names):
+        """Vectorize names into a CSR matrix of L2-normalized TF-IDF rows"""
+        rows, cols, values = [], [], []
+        for row, name in enumerate(names):
+            counts = {}
+            for gram in char_ngrams(name, self.n):
+                col = self.vocabulary.get(gram)
+                if col is not None:
+                    counts[col] = counts.get(col, 0) + 1
+            weights = {col: count * self.idf[col] for col, count in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for col, weight in weights.items():
+                rows.append(row)
+                cols.append(col)
+                values.append(weight / norm)
+
+        return sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(names), len(self.vocabulary)), dtype=np.float32
+        )
+
+
+def vectorize_pair(queries, choices, n=NGRAM_SIZE):
+    """Vectorize two name lists against a vocabulary fitted on both"""
+    vectorizer = CharNgramTfidf(n).fit(list(queries) + list(choices))
+    return vectorizer.transform(queries), vectorizer.transform(choices)
+
+
+# Largest dense block materialized at once (rows x choices or rows x vocabulary)
+MAX_BLOCK_CELLS = 4_000_000
+
+
+def cosine_chunks(query_matrix, choice_matrix, max_block_cells=MAX_BLOCK_CELLS):
+    """Yield (start_row, dense cosine block) for query rows against all choices.
+
+    Similarity blocks between names are nearly dense, so each chunk of
+    queries is densified and multiplied by the sparse choice matrix, which
+    is much cheaper than a sparse-sparse product. Chunks are sized so no
+    dense block exceeds max_block_cells.
+    """
+    width = max(choice_matrix.shape[0], choice_matrix.shape[1], 1)
+    chunk_size = max(1, max_block_cells // width)
+    for start in range(0, query_matrix.shape[0], chunk_size):
+        dense_queries = query_matrix[start:start + chunk_size].toarray().T
+        yield start, np.asarray(choice_matrix @ dense_queries).T
+
+
+def nearest_neighbours(query_matrix, choice_matrix, k, max_block_cells=MAX_BLOCK_CELLS):
+    """Yield (start_row, neighbour indices) for chunks of query rows.
+
+    Each row of indices holds the k choices with the highest cosine
+    similarity, in no particular order.
+    """
+    n_choices = choice_matrix.shape[0]
+    k = min(k, n_choices)
+    for start, block in cosine_chunks(query_matrix, choice_matrix, max_block_cells):
+        if k == 0:
+            yield start, np.empty((block.shape[0], 0), dtype=np.intp)
+        elif k < n_choices:
+            yield start, np.argpartition(-block, k - 1, axis=1)[:, :k]
+        else:
+            yield start, np.tile(np.arange(n_choices), (block.shape[0], 1))
@@ -0,0 +1,212 @@
+import glob
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from utils.jobs import job_runner
+from utils.result_cache import content_digest
+from utils.session_registry import session_registry, SESSION_TTL_SECONDS
+
+# Directory holding every session's working workbooks
+UPLOAD_ROOT = os.path.join(tempfile.gettempdir(), "gst_reconciliation_uploads")
+
+# Total disk space uploads and their derived files may take before the least recently used are evicted
+MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+
+# How often the background sweeper looks for expired sessions
+SWEEP_INTERVAL_SECONDS = 5 * 60
+
+
+class UploadQuotaExceeded(Exception):
+    """Raised when an upload does not fit in the disk quota without evicting a workbook in use"""
+
+
+def has_running_jobs(owner):
+    """Check whether an owner has background jobs that may be reading its workbook"""
+    return any(not job.finished for job in job_runner.jobs_for(owner))
+
+
+def files_of(path):
+    """A working workbook and the files derived from it (manifest, reports, out-of-core results)"""
+    return [path] + glob.glob(f"{glob.escape(path)}.*")
+
+
+def disk_usage(path):
+    """Bytes taken by a working workbook and its derived files"""
+    total = 0
+    for file_path in files_of(path):
+        try:
+            total += os.path.getsize(file_path)
+        except OSError:
+            pass
+    return total
+
+
+def remove_files(path):
+    """Delete a working workbook and its derived files"""
+    for file_path in files_of(path):
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(f"Error removing upload file {file_path}: {e}")
+
+
+class UploadStore:
+    """Process-wide store of uploaded workbooks with a managed lifecycle.
+
+    Each session gets one working workbook per distinct upload, addressed
+    by the sha256 of its content, so reruns and repeated uploads of the
+    same file reuse it instead of writing a new temp file. Stages write
+    their results into the working workbook, so sessions never share one.
+
+    Workbooks of sessions that are no longer active are deleted by a
+    background sweeper, and the total size of all workbooks and their
+    derived files is kept under max_bytes by evicting the least recently
+    used ones. Only workbooks of owners that are idle, i.e. neither active
+    in the session registry nor seen by the store within ttl_seconds, and
+    have no running jobs are evicted; an upload that cannot fit otherwise
+    is rejected.
+    """
+
+    def __init__(self, root=UPLOAD_ROOT, max_bytes=MAX_UPLOAD_BYTES, ttl_seconds=SESSION_TTL_SECONDS,
+                 is_active=session_registry.is_active, is_busy=has_running_jobs):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.is_active = is_active
+        self.is_busy = is_busy
+        # path -> {"owner", "digest", "last_used"}, least recently used first
+        self._entries = OrderedDict()
+        # (owner, file_id) -> path of the upload already written for it
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def path_for(self, owner, digest):
+        """Working workbook path of an owner's upload"""
+        return os.path.join(self.root, str(owner), f"{digest}.xlsx")
+
+    def store(self, owner, file_id, read_bytes):
+        """Return (path, digest, written) of the working workbook for an uploaded file.
+
+        read_bytes is only called the first time a session presents a
+        file_id, so reruns while the uploader holds the file skip hashing
+        and writing. written is True when the workbook was (re)written from
+        the upload, e.g. after an eviction, so any stage results the session
+        kept for it are gone. Raises UploadQuotaExceeded when the upload
+        does not fit.
+        """
+        self.start_sweeper()
+        with self._lock:
+            path = self._uploads.get((owner, file_id))
+            if path is not None and path in self._entries and os.path.exists(path):
+                return path, self._touch_locked(path), False
+
+        data = read_bytes()
+        digest = content_digest(data)
+        path = self.path_for(owner, digest)
+        written = False
+        with self._lock:
+            if not os.path.exists(path):
+                self._entries.pop(path, None)
+                if not self._make_room_locked(len(data)):
+                    raise UploadQuotaExceeded(
+                        f"Upload storage is full ({self.max_bytes // (1024 * 1024)} MB); please try again later"
+                    )
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.upload"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                written = True
+            self._entries[path] = {"owner": owner, "digest": digest, "last_used": time.time()}
+            self._entries.move_to_end(path)
+            self._uploads[(owner, file_id)] = path
+        return path, digest, written
+
+    def _touch_locked(self, path):
+        entry = self._entries[path]
+        entry["last_used"] = time.time()
+        self._entries.move_to_end(path)
+        return entry["digest"]
+
+    def _remove_locked(self, path):
+        self._entries.pop(path, None)
+        for key in [key for key, upload_path in self._uploads.items() if upload_path == path]:
+            del self._uploads[key]
+        remove_files(path)
+
+    def _is_idle_locked(self, owner, now):
+        """An owner is idle once neither the registry nor its own uploads saw it within the TTL"""
+        if self.is_active(owner) or self.is_busy(owner):
+            return False
+        return all(entry["last_used"] + self.ttl_seconds <= now
+                   for entry in self._entries.values() if entry["owner"] == owner)
+
+    def _evictable_locked(self, path, now):
+        return self._is_idle_locked(self._entries[path]["owner"], now)
+
+    def _make_room_locked(self, needed=0, now=None):
+        """Evict least recently used idle workbooks until needed more bytes fit; returns whether they do"""
+        now = time.time() if now is None else now
+        usage = {path: disk_usage(path) for path in self._entries}
+        total = sum(usage.values())
+        for path in list(self._entries):
+            if total + needed <= self.max_bytes:
+                break
+            if not self._evictable_locked(path, now):
+                continue
+            total -= usage[path]
+            self._remove_locked(path)
+        return total + needed <= self.max_bytes
+
+    def sweep(self, now=None):
+        """Delete workbooks of expired sessions and leftovers no session knows about"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for path, entry in list(self._entries.items()):
+                if not self._is_idle_locked(entry["owner"], now):
+                    continue
+                self._remove_locked(path)
+            # Files left behind by an earlier process
+            for file_path in glob.glob(os.path.join(glob.escape(self.root), "*", "*")):
+                workbook_path = file_path.split(".xlsx", 1)[0] + ".xlsx"
+                if workbook_path in self._entries:
+                    continue
+                try:
+                    if os.path.getmtime(file_path) + self.ttl_seconds <= now:
+                        os.remove(file_path)
+                except OSError:
+                    pass
+            self._make_room_locked(now=now)
+
+    def start_sweeper(self, interval=SWEEP_INTERVAL_SECONDS):
+        """Start the background sweeper thread once per process"""
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, args=(interval,),
+                                             name="upload-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping uploads: {e}")
+
+    def stats(self):
+        """Workbook count and disk usage of the store"""
+        with self._lock:
+            return {
+                "workbooks": len(self._entries),
+                "bytes": sum(disk_usage(path) for path in self._entries),
+                "max_bytes": self.max_bytes
+            }
+
+
+# Global store shared by every session served by this process
+upload_store = UploadStore()